@@ -0,0 +1,87 @@
+// Подсказки для полей выбора пользователя (forms.UserAutocompleteWidget).
+// По мере ввода подсказки запрашиваются у сервера и выводятся в datalist;
+// выбранная подсказка записывает id пользователя в скрытое поле, а при
+// выборе нескольких пользователей добавляет метку со своим скрытым полем.
+document.addEventListener("DOMContentLoaded", function () {
+    document.querySelectorAll(".user-autocomplete").forEach(function (container) {
+        var multiple = container.dataset.multiple === "1";
+        var hidden = container.querySelector("input[type=hidden]");
+        var selected = container.querySelector(".user-autocomplete-selected");
+        var input = container.querySelector("input[type=text]");
+        var list = container.querySelector("datalist");
+        // подпись -> id пользователя из последнего ответа
+        var options = {};
+        var timer = null;
+
+        function load() {
+            var params = new URLSearchParams({q: input.value});
+            if (container.dataset.departament) {
+                params.set("departament", container.dataset.departament);
+            }
+            if (container.dataset.supervised) {
+                params.set("supervised", "1");
+            }
+            fetch(container.dataset.url + "?" + params, {credentials: "same-origin"})
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    options = {};
+                    list.innerHTML = "";
+                    data.results.forEach(function (item) {
+                        options[item.text] = item.id;
+                        var option = document.createElement("option");
+                        option.value = item.text;
+                        list.appendChild(option);
+                    });
+                });
+        }
+
+        function addTag(id, text) {
+            if (selected.querySelector("input[value='" + id + "']")) {
+                return;
+            }
+            var tag = document.createElement("span");
+            tag.className = "badge badge-secondary";
+            tag.textContent = text;
+            var value = document.createElement("input");
+            value.type = "hidden";
+            value.name = container.dataset.name;
+            value.value = id;
+            var remove = document.createElement("a");
+            remove.href = "#";
+            remove.className = "user-autocomplete-remove";
+            remove.innerHTML = "&times;";
+            tag.appendChild(value);
+            tag.appendChild(document.createTextNode(" "));
+            tag.appendChild(remove);
+            selected.appendChild(tag);
+        }
+
+        if (multiple) {
+            selected.addEventListener("click", function (event) {
+                if (event.target.classList.contains("user-autocomplete-remove")) {
+                    event.preventDefault();
+                    event.target.parentNode.remove();
+                }
+            });
+        }
+
+        input.addEventListener("focus", load);
+        input.addEventListener("input", function () {
+            if (input.value in options) {
+                if (multiple) {
+                    addTag(options[input.value], input.value);
+                    input.value = "";
+                } else {
+                    hidden.value = options[input.value];
+                }
+                return;
+            }
+            // пустое поле снимает выбор, иначе ждём выбора из подсказок
+            if (!multiple) {
+                hidden.value = "";
+            }
+            clearTimeout(timer);
+            timer = setTimeout(load, 200);
+        });
+    });
+});
@@ -77,20 +77,56 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "tickets.middleware.MetricsMiddleware",
+    "tickets.middleware.SamplingProfilerMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "tickets.middleware.ProfilingMiddleware",
+    "tickets.middleware.UserRolesMiddleware",
+    "tickets.middleware.TicketCountersMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# каталог, через который рабочие процессы делятся метриками;
+# без него /metrics показывает только свой процесс
+METRICS_DIR = settings.get("METRICS_DIR")
+# как часто процесс записывает свои метрики в METRICS_DIR, в секундах
+METRICS_FLUSH_INTERVAL = 5
+# файлы процессов, не обновлявшиеся дольше этого срока (в секундах), считаются
+# файлами завершившихся процессов и удаляются при сборе метрик
+METRICS_MAX_AGE = 3600
+# токен для сбора /metrics (заголовок "Authorization: Bearer <токен>");
+# без него метрики доступны только сотрудникам с правом входа в админку
+METRICS_TOKEN = settings.get("METRICS_TOKEN")
+
+# куда сохраняются профили запросов, снятые по ?profile=1
+PROFILE_DIR = settings.get("PROFILE_DIR", os.path.join(BASE_DIR, "profiles"))
+
+# частота снимков стеков фоновым профилировщиком, раз в секунду; 0 - выключен
+SAMPLING_PROFILER_RATE = settings.get("SAMPLING_PROFILER_RATE", 0)
+# куда и как часто профилировщик записывает свёрнутые стеки, в секундах
+SAMPLING_PROFILER_DIR = settings.get("SAMPLING_PROFILER_DIR", os.path.join(BASE_DIR, "profiles", "samples"))
+SAMPLING_PROFILER_FLUSH_INTERVAL = 60
+
+# запросы к БД дольше порога (в секундах) попадают в журнал медленных запросов;
+# процесс хранит последние SLOW_QUERY_LOG_SIZE записей
+SLOW_QUERY_THRESHOLD = settings.get("SLOW_QUERY_THRESHOLD", 0.1)
+SLOW_QUERY_LOG_SIZE = 500
+SLOW_QUERY_DIR = settings.get("SLOW_QUERY_DIR", os.path.join(BASE_DIR, "profiles", "slow_queries"))
+
+# как долго процесс может держать справочник пользователей для подсказок,
+# если изменения сделаны в другом процессе, в секундах
+USER_DIRECTORY_MAX_AGE = 60
+
 ROOT_URLCONF = "ticket_system.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "tickets.metrics.DjangoTemplates",
         "DIRS": [],
         "APP_DIRS": True,
         "OPTIONS": {
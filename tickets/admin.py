@@ -1,7 +1,26 @@
 from django.contrib import admin
-from .models import Departament, UserProfile, Attachment, Ticket
+from .models import Departament, UserProfile, Attachment, Ticket, TicketEvent
  
 admin.site.register(Departament)
 admin.site.register(UserProfile)
 admin.site.register(Attachment)
 admin.site.register(Ticket)
+
+
+@admin.register(TicketEvent)
+class TicketEventAdmin(admin.ModelAdmin):
+    """
+    Журнал изменений заявок только для просмотра: записи в нём
+    создаются через tickets.history и не изменяются.
+    """
+    list_display = ("ticket", "from_status", "to_status", "executor", "actor", "date")
+    list_select_related = ("ticket", "executor", "actor")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -3,3 +3,11 @@ from django.apps import AppConfig
 
 class TicketsConfig(AppConfig):
     name = 'tickets'
+
+    def ready(self):
+        # обработчики сигналов, поддерживающие таблицу полнотекстового поиска
+        from tickets import search  # noqa: F401
+        # обёртка подключений к БД, записывающая медленные запросы
+        from tickets import slowlog  # noqa: F401
+        # сброс справочника пользователей при их изменении
+        from tickets import directory  # noqa: F401
@@ -0,0 +1,351 @@
+"""
+Инструменты для замеров производительности на синтетических данных.
+
+Все замеры выполняются во временной тестовой базе, рабочая база не затрагивается.
+Рабочую базу синтетическими данными заполняет только команда seed_benchmark.
+"""
+import random
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.http import QueryDict
+from django.test import RequestFactory
+from tickets import directory, logic, models, projection
+from tickets.roles import get_user_roles
+
+BATCH_SIZE = 10000
+
+
+@contextmanager
+def temporary_database(verbosity=0, name=None):
+    """
+    Создаёт чистую тестовую базу со всеми миграциями и удаляет её по выходу.
+    name - имя базы вместо имени тестовой базы по умолчанию; для SQLite
+    это файл, с которым, в отличие от базы в памяти, могут одновременно
+    работать несколько потоков.
+    """
+    test_settings = connection.settings_dict.setdefault("TEST", {})
+    old_test_name = test_settings.get("NAME")
+    if name:
+        test_settings["NAME"] = name
+    try:
+        old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True)
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+    finally:
+        test_settings["NAME"] = old_test_name
+
+
+# доли статусов и приоритетов среди заявок: большая часть заявок
+# давно закрыта, в работе и на контроле - заметно меньше
+STATUS_WEIGHTS = {
+    models.Ticket.STATUS_NEW: 8,
+    models.Ticket.STATUS_DELAYED: 4,
+    models.Ticket.STATUS_DENIED: 6,
+    models.Ticket.STATUS_IN_WORK: 14,
+    models.Ticket.STATUS_CONTROL: 5,
+    models.Ticket.STATUS_COMPLETE: 55,
+    models.Ticket.STATUS_CANCELED: 8,
+}
+PRIORITY_WEIGHTS = {
+    models.Ticket.ORDINARY: 50,
+    models.Ticket.MEDIUM: 25,
+    models.Ticket.HIGH: 15,
+    models.Ticket.URGENT: 7,
+    models.Ticket.CRITICAL: 3,
+}
+# доля заявок без срока
+NO_DEADLINE_SHARE = 0.3
+CLOSED_STATUSES = (models.Ticket.STATUS_DENIED, models.Ticket.STATUS_COMPLETE, models.Ticket.STATUS_CANCELED)
+
+
+def _skewed_weights(count):
+    """
+    Веса по закону Ципфа: немногие пользователи и подразделения
+    дают большую часть заявок.
+    """
+    return [1 / (rank + 1) for rank in range(count)]
+
+
+def seed_tickets(tickets, departaments=50, users=2000, supervisors=1, seed=0, password=None):
+    """
+    Быстро заполняет базу заявками. Каждый пользователь - сотрудник одного
+    подразделения, руководители подразделения - первые supervisors его
+    сотрудников. Статусы и приоритеты распределены по STATUS_WEIGHTS
+    и PRIORITY_WEIGHTS, создатели и подразделения - неравномерно;
+    у открытых заявок срок вокруг сегодняшнего дня, у закрытых - в прошлом.
+    При одном и том же seed база получается одинаковой. Если задан
+    password, под ним можно войти любым пользователем.
+    Счётчики и таблица поиска не заполняются.
+    """
+    rng = random.Random(seed)
+    password_hash = make_password(password) if password else make_password(None)
+    with transaction.atomic():
+        models.Departament.objects.bulk_create([
+            models.Departament(name=f"Подразделение {i}") for i in range(departaments)
+        ])
+        User.objects.bulk_create([
+            User(username=f"user{i}", first_name=f"Имя{i}", last_name=f"Фамилия{i}", password=password_hash)
+            for i in range(users)
+        ])
+        departament_ids = list(models.Departament.objects.filter(
+            name__in=[f"Подразделение {i}" for i in range(departaments)]
+        ).order_by("id").values_list("id", flat=True))
+        user_ids = list(User.objects.filter(
+            username__in=[f"user{i}" for i in range(users)]
+        ).order_by("id").values_list("id", flat=True))
+        models.UserProfile.objects.bulk_create([
+            models.UserProfile(user_id=user_id, is_executor=True) for user_id in user_ids
+        ])
+        # сотрудники подразделения - каждый departaments-й пользователь
+        employees = {departament_id: user_ids[i::departaments] for i, departament_id in enumerate(departament_ids)}
+        Employees = models.Departament.employees.through
+        Supervisors = models.Departament.supervisors.through
+        Employees.objects.bulk_create([
+            Employees(departament_id=departament_id, user_id=user_id)
+            for departament_id, members in employees.items()
+            for user_id in members
+        ])
+        Supervisors.objects.bulk_create([
+            Supervisors(departament_id=departament_id, user_id=user_id)
+            for departament_id, members in employees.items()
+            for user_id in members[:supervisors]
+        ])
+    # bulk_create не отправляет сигналов, справочник сбрасывается явно
+    directory.invalidate()
+    statuses, status_weights = zip(*STATUS_WEIGHTS.items())
+    priorities, priority_weights = zip(*PRIORITY_WEIGHTS.items())
+    creator_weights = _skewed_weights(len(user_ids))
+    departament_weights = _skewed_weights(len(departament_ids))
+    today = date.today()
+    created = 0
+    while created < tickets:
+        size = min(BATCH_SIZE, tickets - created)
+        batch = []
+        for status, priority, creator_id, departament_id in zip(
+            rng.choices(statuses, status_weights, k=size),
+            rng.choices(priorities, priority_weights, k=size),
+            rng.choices(user_ids, creator_weights, k=size),
+            rng.choices(departament_ids, departament_weights, k=size),
+        ):
+            if rng.random() < NO_DEADLINE_SHARE:
+                deadline = None
+            elif status in CLOSED_STATUSES:
+                deadline = today - timedelta(days=rng.randint(0, 180))
+            else:
+                deadline = today + timedelta(days=rng.randint(-15, 45))
+            batch.append(models.Ticket(
+                departament_id=departament_id,
+                title=f"Заявка {created + len(batch)}",
+                description="Описание проблемы",
+                creator_id=creator_id,
+                # исполнитель заявки - сотрудник её подразделения
+                executor_id=None if status == models.Ticket.STATUS_NEW else rng.choice(employees[departament_id]),
+                status=status,
+                priority=priority,
+                deadline=deadline
+            ))
+        with transaction.atomic():
+            models.Ticket.objects.bulk_create(batch)
+        created += len(batch)
+    analyze()
+
+
+def analyze():
+    """
+    Обновляет статистику планировщика запросов.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+
+def summarize(timings):
+    """
+    Медиана, минимум и максимум замеров в миллисекундах.
+    """
+    if not timings:
+        return {"runs": 0}
+    return {
+        "runs": len(timings),
+        "median_ms": statistics.median(timings),
+        "min_ms": min(timings),
+        "max_ms": max(timings),
+    }
+
+
+def measure(function, repeat=5, number=1):
+    """
+    Время одного вызова функции: repeat замеров по number вызовов.
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        timings.append((time.perf_counter() - started) * 1000 / number)
+    return summarize(timings)
+
+
+def timed(function, repeat=5):
+    """
+    Медиана времени выполнения функции в миллисекундах.
+    """
+    return measure(function, repeat)["median_ms"]
+
+
+def get_list_users():
+    """
+    Пользователи, от имени которых открываются списки: исполнитель
+    с заявками в работе, создатель заявок и руководитель подразделения.
+    """
+    return {
+        "inbox": User.objects.filter(
+            tickets_in_work__status=models.Ticket.STATUS_IN_WORK
+        ).order_by("id").first(),
+        "outbox": User.objects.filter(created_tickets__isnull=False).order_by("id").first(),
+        "supervision": User.objects.filter(supervised_departaments__isnull=False).order_by("id").first(),
+    }
+
+
+def get_list_filterset(list_name, user):
+    """
+    Набор фильтров списка с фильтрами по умолчанию, как на странице списка.
+    """
+    request = RequestFactory().get(f"/{list_name}/")
+    request.user = user
+    context = logic.get_ticket_list_context(url_name=list_name, current_user=user)
+    return context["filterset_class"](QueryDict(), request=request, queryset=context["ticket_list"])
+
+
+def get_list_querysets():
+    """
+    Запросы списков в том виде, в каком их выполняют страницы:
+    базовая выборка, фильтр по умолчанию и порядок вывода.
+    """
+    return {
+        list_name: get_list_filterset(list_name, user).qs.order_by(*logic.TICKET_LIST_ORDERING)
+        for list_name, user in get_list_users().items()
+    }
+
+
+# переходы для замера: функция logic, исходный статус и кто выполняет
+TRANSITIONS = {
+    "assign_executor": (logic.assign_executor_for_ticket, models.Ticket.STATUS_NEW, "supervisor"),
+    "delay": (logic.delay_ticket, models.Ticket.STATUS_IN_WORK, "supervisor"),
+    "deny": (logic.deny_ticket, models.Ticket.STATUS_NEW, "supervisor"),
+    "refresh": (logic.refresh_ticket, models.Ticket.STATUS_DELAYED, "supervisor"),
+    "complete": (logic.complete_ticket, models.Ticket.STATUS_CONTROL, "supervisor"),
+    "set_done": (logic.set_ticket_done, models.Ticket.STATUS_IN_WORK, "executor"),
+    "cancel": (logic.cancel_ticket, models.Ticket.STATUS_NEW, "creator"),
+}
+# поля заявки, которые читают страницы действий перед переходом
+TICKET_PERMISSION_FIELDS = ("id", "departament_id", "creator_id", "executor_id", "status")
+
+
+def benchmark_lists(repeat=5, page_size=100):
+    """
+    Контекст списка, фильтры по умолчанию, первая страница строк и
+    общее количество - для каждого типа списка.
+    """
+    results = {}
+    for list_name, user in get_list_users().items():
+        def run(list_name=list_name, user=user):
+            filterset = get_list_filterset(list_name, user)
+            list(projection.project_rows(filterset.qs).order_by(*logic.TICKET_LIST_ORDERING)[:page_size])
+            filterset.qs.count()
+
+        results[list_name] = measure(run, repeat)
+    return results
+
+
+def benchmark_actions(repeat=5, number=100):
+    """
+    get_available_actions_for_ticket для руководителя, создателя и
+    исполнителя заявки. Пользователь каждый раз новый, как request.user,
+    поэтому в замер входит и загрузка ролей.
+    """
+    supervisor = get_list_users()["supervision"]
+    ticket = models.Ticket.objects.filter(
+        departament_id__in=sorted(get_user_roles(supervisor).supervised),
+        status=models.Ticket.STATUS_IN_WORK
+    ).only(*TICKET_PERMISSION_FIELDS).order_by("id").first()
+    users = {"supervisor": supervisor.id, "creator": ticket.creator_id, "executor": ticket.executor_id}
+    return {
+        role: measure(
+            lambda user_id=user_id: logic.get_available_actions_for_ticket(ticket=ticket, current_user=User(id=user_id)),
+            repeat, number
+        )
+        for role, user_id in users.items()
+    }
+
+
+def benchmark_transitions(repeat=5):
+    """
+    Каждый переход из TRANSITIONS на repeat разных заявках
+    в подходящем статусе.
+    """
+    supervisor = get_list_users()["supervision"]
+    supervised = sorted(get_user_roles(supervisor).supervised)
+    executors = {}
+    for departament_id, user_id in models.Departament.employees.through.objects.filter(
+        departament_id__in=supervised
+    ).order_by("user_id").values_list("departament_id", "user_id"):
+        executors.setdefault(departament_id, User(id=user_id))
+    results = {}
+    for name, (function, from_status, role) in TRANSITIONS.items():
+        tickets = models.Ticket.objects.filter(status=from_status).only(*TICKET_PERMISSION_FIELDS).order_by("id")
+        if role == "supervisor":
+            tickets = tickets.filter(departament_id__in=supervised)
+        timings = []
+        for ticket in tickets[:repeat]:
+            user_id = {"supervisor": supervisor.id, "creator": ticket.creator_id, "executor": ticket.executor_id}[role]
+            args = (executors[ticket.departament_id],) if name == "assign_executor" else ()
+            started = time.perf_counter()
+            applied = function(ticket, User(id=user_id), *args)
+            timings.append((time.perf_counter() - started) * 1000)
+            if not applied:
+                raise RuntimeError(f"Переход {name} не применён к заявке {ticket.id}")
+        results[name] = summarize(timings)
+    return results
+
+
+def run_suite(repeat=5, page_size=100):
+    analyze()
+    return {
+        "lists": benchmark_lists(repeat, page_size),
+        "actions": benchmark_actions(repeat),
+        "transitions": benchmark_transitions(repeat),
+    }
+
+
+def compare_reports(old, new, path=()):
+    """
+    Пары медиан (старая, новая) для замеров, которые есть в обоих отчётах.
+    """
+    for key, value in new.items():
+        if key not in old or not isinstance(value, dict):
+            continue
+        if "median_ms" in value and "median_ms" in old[key]:
+            yield "/".join(path + (key,)), old[key]["median_ms"], value["median_ms"]
+        else:
+            yield from compare_reports(old[key], value, path + (key,))
+
+
+def drop_indexes(model):
+    with connection.schema_editor() as editor:
+        for index in model._meta.indexes:
+            editor.remove_index(model, index)
+    analyze()
+
+
+def create_indexes(model):
+    with connection.schema_editor() as editor:
+        for index in model._meta.indexes:
+            editor.add_index(model, index)
+    analyze()
@@ -0,0 +1,193 @@
+"""
+Счётчики заявок для навигации.
+
+Вместо COUNT(*) по заявкам при каждом выводе страницы количество заявок
+каждого создателя, исполнителя и подразделения в каждом статусе хранится
+в таблице TicketCounter. Изменения накапливаются в history.collect()
+и применяются при его завершении одним INSERT ... ON CONFLICT DO UPDATE
+через executemany (на других СУБД - UPDATE пачками, см. apply()).
+"""
+from collections import Counter
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Sum, Value, When
+from tickets import models
+
+Ticket = models.Ticket
+TicketCounter = models.TicketCounter
+
+# только для СУБД без INSERT ... ON CONFLICT: сколько счётчиков изменяется
+# одним UPDATE, условие по ключам в нём - цепочка OR
+APPLY_BATCH_SIZE = 200
+
+
+def get_ticket_deltas(ticket, from_status, to_status, executor_id):
+    """
+    Изменения счётчиков при переходе заявки из from_status в to_status.
+
+    ticket - заявка с прежними creator_id, departament_id и executor_id,
+    executor_id - исполнитель после перехода. from_status=None означает
+    новую заявку.
+    """
+    deltas = Counter()
+    owners = [
+        (TicketCounter.KIND_CREATOR, ticket.creator_id, ticket.creator_id),
+        (TicketCounter.KIND_DEPARTAMENT, ticket.departament_id, ticket.departament_id),
+        (TicketCounter.KIND_EXECUTOR, ticket.executor_id, executor_id),
+    ]
+    for kind, old_owner, new_owner in owners:
+        if from_status is not None and old_owner is not None:
+            deltas[kind, old_owner, from_status] -= 1
+        if new_owner is not None:
+            deltas[kind, new_owner, to_status] += 1
+    return deltas
+
+
+def get_new_tickets_deltas(tickets):
+    """
+    Изменения счётчиков при добавлении заявок в обход history.record()
+    (массовая загрузка). tickets - последовательность кортежей
+    (creator_id, departament_id, executor_id, status).
+    """
+    deltas = Counter()
+    for creator_id, departament_id, executor_id, status in tickets:
+        deltas[TicketCounter.KIND_CREATOR, creator_id, status] += 1
+        deltas[TicketCounter.KIND_DEPARTAMENT, departament_id, status] += 1
+        if executor_id is not None:
+            deltas[TicketCounter.KIND_EXECUTOR, executor_id, status] += 1
+    return deltas
+
+
+def apply(deltas):
+    """
+    Прибавляет изменения к счётчикам.
+
+    В SQLite и PostgreSQL - одним INSERT ... ON CONFLICT DO UPDATE
+    через executemany. На остальных СУБД существующие счётчики изменяются
+    одним UPDATE на каждые APPLY_BATCH_SIZE ключей, недостающие создаются.
+    """
+    deltas = [(key, delta) for key, delta in deltas.items() if delta]
+    if not deltas:
+        return
+    if connection.vendor in ("sqlite", "postgresql"):
+        _upsert(deltas)
+        return
+    for start in range(0, len(deltas), APPLY_BATCH_SIZE):
+        _apply_batch(dict(deltas[start:start + APPLY_BATCH_SIZE]))
+
+
+def _upsert(deltas):
+    quote = connection.ops.quote_name
+    table = quote(TicketCounter._meta.db_table)
+    value = quote("value")
+    key_columns = ", ".join(quote(column) for column in ("kind", "owner_id", "status"))
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {table} ({key_columns}, {value}) VALUES (%s, %s, %s, %s) "
+            f"ON CONFLICT ({key_columns}) DO UPDATE SET {value} = {table}.{value} + excluded.{value}",
+            [(kind, owner_id, status, delta) for (kind, owner_id, status), delta in deltas]
+        )
+
+
+def _apply_batch(deltas):
+    keys = Q()
+    increments = []
+    for (kind, owner_id, status), delta in deltas.items():
+        key = Q(kind=kind, owner_id=owner_id, status=status)
+        keys |= key
+        increments.append(When(key, then=Value(delta)))
+    updated = TicketCounter.objects.filter(keys).update(
+        value=F("value") + Case(*increments, default=Value(0), output_field=IntegerField())
+    )
+    if updated == len(deltas):
+        return
+    existing = set(TicketCounter.objects.filter(keys).values_list("kind", "owner_id", "status"))
+    missing = {key: delta for key, delta in deltas.items() if key not in existing}
+    try:
+        with transaction.atomic():
+            TicketCounter.objects.bulk_create([
+                TicketCounter(kind=kind, owner_id=owner_id, status=status, value=delta)
+                for (kind, owner_id, status), delta in missing.items()
+            ])
+    except IntegrityError:
+        # счётчик успели создать в параллельном запросе - прибавляем к нему
+        _apply_batch(missing)
+
+
+def compute():
+    """
+    Значения всех счётчиков, посчитанные заново по таблице заявок.
+    """
+    values = Counter()
+    owners = [
+        (TicketCounter.KIND_CREATOR, "creator_id"),
+        (TicketCounter.KIND_DEPARTAMENT, "departament_id"),
+        (TicketCounter.KIND_EXECUTOR, "executor_id"),
+    ]
+    for kind, field in owners:
+        rows = Ticket.objects.filter(**{f"{field}__isnull": False}).order_by().values_list(
+            field, "status"
+        ).annotate(count=Count("id"))
+        for owner_id, status, count in rows:
+            values[kind, owner_id, status] = count
+    return values
+
+
+def get_stored():
+    return Counter({
+        (kind, owner_id, status): value
+        for kind, owner_id, status, value in TicketCounter.objects.values_list(
+            "kind", "owner_id", "status", "value"
+        )
+        if value
+    })
+
+
+def rebuild():
+    """
+    Пересоздаёт таблицу счётчиков по заявкам.
+    """
+    with transaction.atomic():
+        TicketCounter.objects.all().delete()
+        # размер пачки выбирает Django: в SQLite вставка идёт через
+        # составной SELECT, в котором не больше 500 частей
+        TicketCounter.objects.bulk_create([
+            TicketCounter(kind=kind, owner_id=owner_id, status=status, value=value)
+            for (kind, owner_id, status), value in compute().items()
+        ])
+
+
+def get_user_counters(user, roles):
+    """
+    Значения для навигации: заявки в работе у пользователя, его открытые
+    заявки и открытые заявки подразделений, которыми он руководит.
+    Читается одним запросом по таблице счётчиков.
+    """
+    counters = {"inbox": 0, "outbox": 0, "supervision": 0}
+    if not user.is_authenticated:
+        return counters
+    kinds = {
+        "inbox": Q(
+            kind=TicketCounter.KIND_EXECUTOR,
+            owner_id=user.id,
+            status=Ticket.STATUS_IN_WORK
+        ),
+        "outbox": Q(
+            kind=TicketCounter.KIND_CREATOR,
+            owner_id=user.id,
+            status__in=Ticket.CREATOR_OPEN_STATUSES
+        ),
+    }
+    if roles.supervised:
+        kinds["supervision"] = Q(
+            kind=TicketCounter.KIND_DEPARTAMENT,
+            owner_id__in=sorted(roles.supervised),
+            status__in=Ticket.SUPERVISOR_OPEN_STATUSES
+        )
+    condition = Q()
+    for kind_condition in kinds.values():
+        condition |= kind_condition
+    values = TicketCounter.objects.filter(condition).aggregate(**{
+        name: Sum("value", filter=kind_condition) for name, kind_condition in kinds.items()
+    })
+    counters.update({name: value or 0 for name, value in values.items()})
+    return counters
@@ -0,0 +1,105 @@
+"""
+Сводка руководителя по нагрузке подразделений.
+
+Все показатели считаются в БД одним запросом с группировкой по
+подразделению и исполнителю и условными агрегатами; итоги по
+подразделению складываются из сгруппированных строк.
+"""
+from datetime import datetime
+from django.contrib.auth.models import User
+from django.db.models import Count, Min, Q
+from tickets import models
+from tickets.roles import get_user_roles
+
+Ticket = models.Ticket
+
+STATUSES = [status for status, _ in Ticket.status.field.choices]
+PRIORITIES = [priority for priority, _ in Ticket.priority.field.choices]
+# заголовки колонок сводки в том же порядке
+STATUS_TITLES = [models.STATUS_LABELS[status] for status in STATUSES]
+PRIORITY_TITLES = [models.PRIORITY_LABELS[priority] for priority in PRIORITIES]
+
+
+class DashboardRow:
+    """
+    Показатели группы заявок: по статусам, по приоритетам открытых заявок,
+    просроченные и дата создания самой старой открытой заявки.
+    """
+
+    def __init__(self, name, values=None):
+        self.name = name
+        values = values or {}
+        self.total = values.get("total", 0)
+        self.statuses = [values.get(f"status_{status}", 0) for status in STATUSES]
+        self.priorities = [values.get(f"priority_{priority}", 0) for priority in PRIORITIES]
+        self.overdue = values.get("overdue", 0)
+        self.oldest_open = values.get("oldest_open")
+
+    def add(self, other):
+        self.total += other.total
+        self.statuses = [a + b for a, b in zip(self.statuses, other.statuses)]
+        self.priorities = [a + b for a, b in zip(self.priorities, other.priorities)]
+        self.overdue += other.overdue
+        if other.oldest_open and (not self.oldest_open or other.oldest_open < self.oldest_open):
+            self.oldest_open = other.oldest_open
+
+
+class DepartamentDashboard:
+
+    def __init__(self, departament):
+        self.departament = departament
+        self.summary = DashboardRow("Итого")
+        self.executors = []
+
+
+def get_aggregates(today=None):
+    """
+    Условные агрегаты сводки для values().annotate().
+    """
+    today = today or datetime.now().date()
+    open_tickets = Q(status__in=Ticket.SUPERVISOR_OPEN_STATUSES)
+    aggregates = {"total": Count("id")}
+    for status in STATUSES:
+        aggregates[f"status_{status}"] = Count("id", filter=Q(status=status))
+    for priority in PRIORITIES:
+        aggregates[f"priority_{priority}"] = Count("id", filter=open_tickets & Q(priority=priority))
+    aggregates["overdue"] = Count("id", filter=Ticket.overdue_condition(today))
+    aggregates["oldest_open"] = Min("date_create", filter=open_tickets)
+    return aggregates
+
+
+def _get_executor_name(executor):
+    if executor is None:
+        return "Не назначен"
+    return f"{executor.last_name} {executor.first_name}".strip() or executor.username
+
+
+def get_supervisor_dashboard(current_user, today=None):
+    """
+    Сводка по подразделениям, которыми руководит пользователь:
+    итог по подразделению и строка на каждого исполнителя
+    (заявки без исполнителя - отдельной строкой).
+    """
+    supervised = sorted(get_user_roles(current_user).supervised)
+    if not supervised:
+        return []
+    rows = list(Ticket.objects.filter(
+        departament_id__in=supervised
+    ).order_by().values(
+        "departament_id", "executor_id"
+    ).annotate(**get_aggregates(today)))
+
+    executor_ids = {row["executor_id"] for row in rows if row["executor_id"] is not None}
+    executors = {user.id: user for user in User.objects.filter(id__in=sorted(executor_ids))}
+    dashboards = {
+        departament.id: DepartamentDashboard(departament)
+        for departament in models.Departament.objects.filter(id__in=supervised).order_by("name")
+    }
+    for row in rows:
+        executor_row = DashboardRow(_get_executor_name(executors.get(row["executor_id"])), row)
+        dashboard = dashboards[row["departament_id"]]
+        dashboard.executors.append(executor_row)
+        dashboard.summary.add(executor_row)
+    for dashboard in dashboards.values():
+        dashboard.executors.sort(key=lambda executor_row: (-executor_row.total, executor_row.name))
+    return list(dashboards.values())
@@ -0,0 +1,144 @@
+"""
+Серверная обработка списков заявок для DataTables
+(https://datatables.net/manual/server-side).
+
+Сортировка, поиск и разбиение на страницы выполняются в БД,
+браузеру отдаётся только видимая страница. В порядке списка по умолчанию
+следующая страница выбирается по курсору (tickets.pagination), который
+клиент получает в поле cursor ответа и передаёт в параметре cursor
+вместе со start следующей страницы. Без курсора (переход сразу на
+дальнюю страницу, сортировка по колонке, результаты поиска) страница
+выбирается через OFFSET.
+"""
+from django.db.models import F
+from django.template.defaultfilters import date as date_filter
+from django.utils.html import escape, format_html
+from tickets import logic, projection, search
+from tickets.pagination import InvalidCursor, KeysetPaginator
+
+# максимальное количество строк, которое можно запросить за один раз
+MAX_PAGE_LENGTH = 500
+DEFAULT_PAGE_LENGTH = 25
+
+# имя колонки в таблице -> поля, по которым она сортируется
+COLUMN_ORDERING = {
+    "title": ("title",),
+    "dateCreate": ("date_create",),
+    "priority": ("priority",),
+    "deadline": ("deadline",),
+    "daysLeft": ("deadline",),
+    "status": ("status",),
+    "creator": ("creator__username",),
+    "executors": ("executor__username",),
+}
+
+# колонки, где пустое значение при сортировке по возрастанию идёт первым
+NULLS_FIRST_COLUMNS = ("executors",)
+
+
+def _get_int(params, key, default):
+    try:
+        return int(params.get(key, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def get_ordering(params, default=logic.TICKET_LIST_ORDERING):
+    """
+    Разбирает параметры order[i][column] / order[i][dir] в список выражений
+    для order_by; неизвестные колонки игнорируются.
+    Без сортировки от клиента заявки выводятся в порядке default.
+    Уникальный id в конце делает порядок строк между страницами стабильным.
+    """
+    ordering = []
+    i = 0
+    while f"order[{i}][column]" in params:
+        column_index = params.get(f"order[{i}][column]")
+        name = params.get(f"columns[{column_index}][name]")
+        descending = params.get(f"order[{i}][dir]") == "desc"
+        for field in COLUMN_ORDERING.get(name, ()):
+            if name in NULLS_FIRST_COLUMNS:
+                expression = F(field).desc(nulls_last=True) if descending else F(field).asc(nulls_first=True)
+            else:
+                expression = F(field).desc() if descending else F(field).asc()
+            ordering.append(expression)
+        i += 1
+    if not ordering:
+        return list(default)
+    ordering.append(F("id").asc())
+    return ordering
+
+
+def get_page_bounds(params):
+    start = max(_get_int(params, "start", 0), 0)
+    length = _get_int(params, "length", DEFAULT_PAGE_LENGTH)
+    if length <= 0 or length > MAX_PAGE_LENGTH:
+        length = MAX_PAGE_LENGTH
+    return start, start + length
+
+
+def ticket_to_row(ticket):
+    """
+    Ячейки строки таблицы в том же виде, что и в шаблоне списка.
+    ticket - строка projection.TicketRow.
+    """
+    executor = escape(ticket.executor) if ticket.executor else "<b>Не заданы</b>"
+    days_left = ticket.days_left
+    return {
+        "DT_RowData": {"descriptionUrl": ticket.description_url},
+        "Noname": "",
+        "title": format_html('<a href="{}">{}</a>', ticket.get_absolute_url(), ticket.title),
+        "creator": escape(ticket.creator),
+        "dateCreate": date_filter(ticket.date_create, "d.m.y"),
+        "priority": format_html('<span class="{}">{}</span>', ticket.priority_css, ticket.priority_text),
+        "deadline": format_html('<span class="{}">{}</span>', ticket.deadline_css, ticket.verbose_deadline_status),
+        "status": format_html('<span class="{}">{}</span>', ticket.status_css, ticket.status_text),
+        "daysLeft": "" if days_left is None else days_left,
+        "executors": executor,
+    }
+
+
+def get_response_data(params, total_queryset, filtered_queryset):
+    """
+    Формирует ответ DataTables по параметрам запроса.
+
+    total_queryset - все заявки списка, filtered_queryset - заявки после
+    применения фильтров; поиск накладывается поверх него. Поиск идёт через
+    tickets.search: LIKE в SQLite не различает регистр только у латиницы.
+    """
+    text = params.get("search[value]", "").strip()
+    if text:
+        filtered_queryset = search.search_tickets(filtered_queryset, text)
+    start, stop = get_page_bounds(params)
+    # найденные полнотекстовым поиском заявки по умолчанию идут по релевантности
+    ordering = get_ordering(params, logic.get_list_ordering(filtered_queryset))
+    rows = projection.project_rows(filtered_queryset)
+    page = None
+    next_cursor = None
+    if ordering == list(logic.TICKET_LIST_ORDERING):
+        page, next_cursor = get_keyset_page(rows, start, stop, params.get("cursor"))
+    if page is None:
+        page = rows.order_by(*ordering)[start:stop]
+    return {
+        "draw": _get_int(params, "draw", 0),
+        "recordsTotal": total_queryset.count(),
+        "recordsFiltered": filtered_queryset.count(),
+        "data": [ticket_to_row(ticket) for ticket in page],
+        "cursor": next_cursor,
+    }
+
+
+def get_keyset_page(rows, start, stop, cursor):
+    """
+    Страница в порядке списка по умолчанию, выбранная по курсору, и курсор
+    следующей страницы. Для первой страницы курсор не нужен; для
+    остальных без курсора или с неверным курсором возвращает (None, None).
+    """
+    if start and not cursor:
+        return None, None
+    paginator = KeysetPaginator(rows, logic.TICKET_LIST_ORDERING, stop - start)
+    try:
+        page = paginator.get_page(cursor if start else None)
+    except InvalidCursor:
+        return None, None
+    return page.object_list, page.next_cursor
@@ -0,0 +1,162 @@
+"""
+Справочник пользователей для подсказок при вводе.
+
+Все пользователи загружаются в память процесса одним запросом: подпись,
+подразделения, в которых пользователь работает, и отсортированный список
+слов (фамилия, имя, логин) для поиска по началу слова делением пополам,
+поэтому индексы по именам в БД для поиска не нужны. Справочник
+сбрасывается при создании и удалении User и UserProfile, при изменении
+их полей из USER_FIELDS и PROFILE_FIELDS (вход пользователя, сохраняющий
+last_login и профиль, его не сбрасывает) и при изменении сотрудников
+подразделения; другие рабочие процессы перечитывают его не реже раза
+в USER_DIRECTORY_MAX_AGE секунд.
+"""
+from bisect import bisect_left
+from collections import defaultdict
+import threading
+import time
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from tickets import models
+
+# сколько подсказок отдаётся по умолчанию и самое большее
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 50
+
+# поля User и UserProfile, при изменении которых справочник сбрасывается
+USER_FIELDS = ("username", "last_name", "first_name", "is_active")
+PROFILE_FIELDS = ("last_name", "first_name")
+
+_lock = threading.Lock()
+_directory = None
+_loaded_at = 0.0
+
+
+def _normalize(text):
+    return text.lower().replace("ё", "е")
+
+
+class UserDirectory:
+
+    def __init__(self, users, memberships):
+        """
+        users - id, значения USER_FIELDS и PROFILE_FIELDS пользователя;
+        memberships - пары (id подразделения, id пользователя).
+        """
+        self.labels = {}
+        self.tokens = {}
+        # значения полей, по которым построен справочник, - для проверки при сохранении
+        self.users = {}
+        self.profiles = {}
+        for user_id, username, last_name, first_name, is_active, profile_last_name, profile_first_name in users:
+            self.users[user_id] = (username, last_name, first_name, is_active)
+            self.profiles[user_id] = (profile_last_name, profile_first_name)
+            # имена в профиле - для пользователей, у которых они не заполнены в User
+            last_name = last_name or profile_last_name or ""
+            first_name = first_name or profile_first_name or ""
+            # логин в подписи различает однофамильцев
+            full_name = f"{last_name} {first_name}".strip()
+            self.labels[user_id] = f"{full_name} ({username})" if full_name else username
+            self.tokens[user_id] = tuple(
+                {_normalize(word): None for word in (last_name, first_name, username) if word}
+            )
+        # id пользователей в порядке подписи
+        self.ordered = sorted(self.labels, key=lambda user_id: (_normalize(self.labels[user_id]), user_id))
+        self.positions = {user_id: position for position, user_id in enumerate(self.ordered)}
+        # (слово, место в порядке подписи, id) - для поиска по началу слова
+        self.keys = sorted(
+            (token, self.positions[user_id], user_id)
+            for user_id, tokens in self.tokens.items()
+            for token in tokens
+        )
+        self.departaments = defaultdict(set)
+        for departament_id, user_id in memberships:
+            self.departaments[user_id].add(departament_id)
+
+    def is_stale(self, instance, update_fields):
+        """
+        Изменились ли при сохранении User или UserProfile поля, по которым
+        построен справочник.
+        """
+        if isinstance(instance, User):
+            fields, user_id, stored = USER_FIELDS, instance.id, self.users
+        else:
+            fields, user_id, stored = PROFILE_FIELDS, instance.user_id, self.profiles
+        if update_fields is not None and not set(fields) & set(update_fields):
+            return False
+        return stored.get(user_id) != tuple(getattr(instance, field) for field in fields)
+
+    def get_label(self, user_id):
+        return self.labels.get(user_id)
+
+    def search(self, text, departament_ids=None, limit=DEFAULT_LIMIT):
+        """
+        Пользователи, у которых каждое слово запроса - начало фамилии,
+        имени или логина, в порядке подписи: список пар (id, подпись).
+        departament_ids ограничивает поиск сотрудниками этих подразделений.
+        """
+        words = _normalize(text).split()
+        if words:
+            first, rest = words[0], words[1:]
+            found = set()
+            for token, _, user_id in self.keys[bisect_left(self.keys, (first,)):]:
+                if not token.startswith(first):
+                    break
+                found.add(user_id)
+            if rest:
+                found = {
+                    user_id for user_id in found
+                    if all(any(token.startswith(word) for token in self.tokens[user_id]) for word in rest)
+                }
+            candidates = sorted(found, key=self.positions.__getitem__)
+        else:
+            candidates = self.ordered
+        results = []
+        for user_id in candidates:
+            if departament_ids is None or not self.departaments[user_id].isdisjoint(departament_ids):
+                results.append((user_id, self.labels[user_id]))
+                if len(results) == limit:
+                    break
+        return results
+
+
+def load():
+    users = User.objects.order_by("last_name", "first_name", "id").values_list(
+        "id", *USER_FIELDS, *(f"userprofile__{field}" for field in PROFILE_FIELDS)
+    )
+    memberships = models.Departament.employees.through.objects.values_list("departament_id", "user_id")
+    return UserDirectory(users, memberships)
+
+
+def get_directory():
+    """
+    Справочник процесса; загружается при первом обращении после сброса
+    или по истечении USER_DIRECTORY_MAX_AGE.
+    """
+    global _directory, _loaded_at
+    directory = _directory
+    if directory is not None and time.monotonic() - _loaded_at < settings.USER_DIRECTORY_MAX_AGE:
+        return directory
+    with _lock:
+        if _directory is None or time.monotonic() - _loaded_at >= settings.USER_DIRECTORY_MAX_AGE:
+            _directory = load()
+            _loaded_at = time.monotonic()
+        return _directory
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=models.UserProfile)
+@receiver(m2m_changed, sender=models.Departament.employees.through)
+def invalidate(**kwargs):
+    global _directory
+    _directory = None
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=models.UserProfile)
+def invalidate_changed(instance, created, update_fields, **kwargs):
+    directory = _directory
+    if directory is not None and (created or directory.is_stale(instance, update_fields)):
+        invalidate()
@@ -0,0 +1,194 @@
+"""
+Выгрузка списков заявок в CSV и XLSX.
+
+Строки читаются из БД через iterator() порциями по CHUNK_SIZE и сразу
+превращаются в байты ответа, поэтому расход памяти не зависит от длины
+списка. XLSX пишется как zip-архив в поток: лист - одна запись архива,
+ячейки - строки inline, без таблицы общих строк.
+"""
+import csv
+import re
+import zipfile
+from django.template.defaultfilters import date as date_filter
+from django.utils.html import escape
+
+CHUNK_SIZE = 2000
+
+# заголовок колонки -> значение из строки projection.TicketRow
+COLUMNS = (
+    ("Номер", lambda row: row.id),
+    ("Заголовок", lambda row: row.title),
+    ("От кого", lambda row: row.creator),
+    ("Дата создания", lambda row: date_filter(row.date_create, "d.m.Y")),
+    ("Приоритет", lambda row: row.priority_text),
+    ("Срок", lambda row: date_filter(row.deadline, "d.m.Y") if row.deadline else ""),
+    ("Статус", lambda row: row.status_text),
+    ("Осталось дней", lambda row: row.days_left),
+    ("Исполнитель", lambda row: row.executor or ""),
+)
+
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def get_values(row):
+    return [getter(row) for _, getter in COLUMNS]
+
+
+class _Buffer:
+    """
+    Файлоподобный объект, из которого генератор забирает накопленные байты.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class _TextWriter:
+    """
+    Текстовая обёртка над _Buffer для csv.writer.
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+    def write(self, text):
+        return self.buffer.write(text.encode())
+
+
+def _iter_rows(rows):
+    return rows.iterator(chunk_size=CHUNK_SIZE)
+
+
+# начало ячейки, с которого Excel читает её как формулу
+CSV_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _csv_cell(value):
+    """
+    Текст, введённый пользователями, с "'" перед началом формулы:
+    иначе формула выполнится при открытии файла.
+    """
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream_csv(rows):
+    """
+    CSV с разделителем ";" и меткой UTF-8 в начале - в таком виде
+    файл без настройки открывается в Excel с русской локалью.
+    """
+    buffer = _Buffer()
+    writer = csv.writer(_TextWriter(buffer), delimiter=";")
+    buffer.write("\ufeff".encode())
+    writer.writerow([title for title, _ in COLUMNS])
+    for i, row in enumerate(_iter_rows(rows), 1):
+        writer.writerow([_csv_cell(value) for value in get_values(row)])
+        if i % CHUNK_SIZE == 0:
+            yield buffer.pop()
+    yield buffer.pop()
+
+
+XLSX_STATIC_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Заявки" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+# символы, недопустимые в XML 1.0: управляющие, кроме \t, \n и \r,
+# и суррогаты; с ними книга не открывается
+XML_INVALID_CHARACTERS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]")
+
+
+def _xlsx_cell(value):
+    if value is None or value == "":
+        return "<c/>"
+    if isinstance(value, int):
+        return f"<c t=\"n\"><v>{value}</v></c>"
+    text = XML_INVALID_CHARACTERS.sub("", str(value))
+    return f"<c t=\"inlineStr\"><is><t>{escape(text)}</t></is></c>"
+
+
+def _xlsx_row(values):
+    return "<row>" + "".join(_xlsx_cell(value) for value in values) + "</row>"
+
+
+def stream_xlsx(rows):
+    """
+    Минимальная книга XLSX из одного листа.
+    """
+    buffer = _Buffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_STATIC_PARTS.items():
+            archive.writestr(name, content)
+        yield buffer.pop()
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xlsx_row([title for title, _ in COLUMNS]).encode())
+            for i, row in enumerate(_iter_rows(rows), 1):
+                sheet.write(_xlsx_row(get_values(row)).encode())
+                if i % CHUNK_SIZE == 0:
+                    yield buffer.pop()
+            sheet.write(b"</sheetData></worksheet>")
+    yield buffer.pop()
+
+
+WRITERS = {
+    "csv": stream_csv,
+    "xlsx": stream_xlsx,
+}
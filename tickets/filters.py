@@ -1,17 +1,19 @@
 import django_filters
-from tickets import models
+from tickets import models, search
+from tickets.forms import UserAutocompleteWidget, UserMultipleAutocompleteWidget
+from tickets.roles import get_user_roles
 
 
 def user_departaments(request):
     if request is None:
         return models.Departament.objects.none()
-    return request.user.supervised_departaments.all()
+    return models.Departament.objects.filter(id__in=get_user_roles(request.user).supervised)
 
 def user_supervised_executors(request):
     if request is None:
         return models.User.objects.none()
     return models.User.objects.filter(
-        departaments__in=request.user.supervised_departaments.all()
+        departaments__in=get_user_roles(request.user).supervised
     )
 
 
@@ -21,16 +23,57 @@ class TicketFilter(django_filters.FilterSet):
     Фильтрует по создателю заявки и приоритету.
     """
     priority = django_filters.ChoiceFilter(choices= models.Ticket.priority.field.choices)
+    search = django_filters.CharFilter(label="Поиск по тексту заявки", method="filter_search")
 
     class Meta:
         model = models.Ticket
         fields = ["priority"]
 
+    def filter_search(self, queryset, name, value):
+        """
+        Полнотекстовый поиск по заголовку и описанию; к заявкам добавляется
+        релевантность search_rank, по ней по умолчанию сортируются таблица,
+        полный список и выгрузка (logic.get_list_ordering).
+        """
+        return search.search_tickets(queryset, value)
+
+    def filter_status(self, queryset, name, value):
+        """
+        Отбор по набору статусов одним условием IN вместо цепочки OR -
+        такое условие планировщик проверяет прямо по индексу списка.
+        """
+        if not value:
+            return queryset
+        return queryset.filter(**{f"{name}__in": sorted(int(status) for status in value)})
+
+
+class DeadlineFilterMixin(django_filters.FilterSet):
+    """
+    Отбор по срокам исполнения: просроченные и истекающие в ближайшие дни.
+    """
+    overdue = django_filters.BooleanFilter(label="Просроченные", method="filter_overdue")
+    due_within = django_filters.NumberFilter(
+        label="Срок истекает в течение, дней",
+        method="filter_due_within",
+        min_value=0
+    )
+
+    def filter_overdue(self, queryset, name, value):
+        condition = models.Ticket.overdue_condition()
+        return queryset.filter(condition) if value else queryset.exclude(condition)
+
+    def filter_due_within(self, queryset, name, value):
+        return queryset.due_within(int(value))
+
+
 class CreatorTicketFilter(TicketFilter):
     """
     Фильтр заявок для отправителя.
     """
-    status = django_filters.MultipleChoiceFilter(choices= models.Ticket.status.field.choices)
+    status = django_filters.MultipleChoiceFilter(
+        choices=models.Ticket.status.field.choices,
+        method="filter_status"
+    )
 
     class Meta:
         model = models.Ticket
@@ -39,52 +82,49 @@ class CreatorTicketFilter(TicketFilter):
     def __init__(self, data, *args, **kwargs):
         if data is not None:
             data = data.copy()
-            data.setlistdefault(
-                "status",
-                [
-                    models.Ticket.STATUS_NEW,
-                    models.Ticket.STATUS_IN_WORK,
-                    models.Ticket.STATUS_DELAYED,
-                ]
-            )
+            data.setlistdefault("status", list(models.Ticket.CREATOR_OPEN_STATUSES))
         super().__init__(data, *args, **kwargs)
 
 
-class ExecutorTicketFilter(TicketFilter):
+class ExecutorTicketFilter(DeadlineFilterMixin, TicketFilter):
     """
     Фильтр заявок для исполнителя.
     """
-    creator = django_filters.ModelChoiceFilter(queryset=models.User.objects.all())
+    creator = django_filters.ModelChoiceFilter(
+        queryset=models.User.objects.all(),
+        widget=UserAutocompleteWidget
+    )
     class Meta:
         model = models.Ticket
-        fields = ["priority", "creator"]
+        fields = ["priority", "creator", "overdue", "due_within"]
 
 
-class SupervisorTicketFilter(TicketFilter):
+class SupervisorTicketFilter(DeadlineFilterMixin, TicketFilter):
     """
     Фильтр списка заявок для руководителя.
     По умолчанию показывает следующие заявки: новые, в работе, отложенные, выполненные
     """
     departament = django_filters.ModelChoiceFilter(queryset=user_departaments)
-    status = django_filters.MultipleChoiceFilter(choices= models.Ticket.status.field.choices)
-    creator = django_filters.ModelChoiceFilter(queryset=models.User.objects.all())
-    executor = django_filters.ModelMultipleChoiceFilter(queryset=user_supervised_executors)
+    status = django_filters.MultipleChoiceFilter(
+        choices=models.Ticket.status.field.choices,
+        method="filter_status"
+    )
+    creator = django_filters.ModelChoiceFilter(
+        queryset=models.User.objects.all(),
+        widget=UserAutocompleteWidget
+    )
+    executor = django_filters.ModelMultipleChoiceFilter(
+        queryset=user_supervised_executors,
+        widget=UserMultipleAutocompleteWidget(supervised=True)
+    )
     
     def __init__(self, data, *args, **kwargs):
         if data is not None:
             data = data.copy()
-            data.setlistdefault(
-                "status",
-                [
-                    models.Ticket.STATUS_NEW,
-                    models.Ticket.STATUS_IN_WORK,
-                    models.Ticket.STATUS_DELAYED,
-                    models.Ticket.STATUS_CONTROL
-                ]
-            )
+            data.setlistdefault("status", list(models.Ticket.SUPERVISOR_OPEN_STATUSES))
         super().__init__(data, *args, **kwargs)
     
 
     class Meta:
         model = models.Ticket
-        fields = ["departament", "priority", "creator", "status", "executor"]
+        fields = ["departament", "priority", "creator", "status", "executor", "overdue", "due_within"]
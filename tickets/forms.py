@@ -2,7 +2,80 @@ from django import forms
 from django.contrib.auth.forms import AuthenticationForm
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Fieldset, ButtonHolder, Submit
-from . import models
+from django.urls import reverse
+from . import directory, models
+
+
+class UserAutocompleteWidget(forms.Widget):
+    """
+    Выбор пользователя с подсказками при вводе вместо списка всех
+    пользователей: скрытое поле с id и текстовое поле, по которому
+    подсказки запрашиваются у user-autocomplete. departament_id
+    ограничивает подсказки сотрудниками подразделения, supervised -
+    сотрудниками подразделений текущего руководителя.
+    """
+    template_name = "tickets/widgets/user_autocomplete.html"
+    allow_multiple_selected = False
+
+    class Media:
+        js = ("autocomplete.js",)
+
+    def __init__(self, attrs=None, departament_id=None, supervised=False):
+        super().__init__(attrs)
+        self.departament_id = departament_id
+        self.supervised = supervised
+
+    def get_selected(self, values):
+        """
+        Выбранные пользователи с подписями из справочника.
+        """
+        user_directory = directory.get_directory()
+        selected = []
+        for value in values:
+            try:
+                user_id = int(value)
+            except (TypeError, ValueError):
+                continue
+            selected.append({"id": user_id, "label": user_directory.get_label(user_id) or value})
+        return selected
+
+    def format_value(self, value):
+        if value is None or value == "":
+            return []
+        return [str(value)]
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        values = context["widget"]["value"]
+        context["widget"].update({
+            "selected": self.get_selected(values) if values else [],
+            "multiple": self.allow_multiple_selected,
+            "url": reverse("user-autocomplete"),
+            "departament_id": self.departament_id,
+            "supervised": self.supervised,
+        })
+        return context
+
+
+class UserMultipleAutocompleteWidget(UserAutocompleteWidget):
+    """
+    Выбор нескольких пользователей: выбранные выводятся метками,
+    у каждой своё скрытое поле.
+    """
+    allow_multiple_selected = True
+
+    def format_value(self, value):
+        if value is None:
+            return []
+        if not isinstance(value, (tuple, list)):
+            value = [value]
+        return [str(item) for item in value if item not in (None, "")]
+
+    def value_from_datadict(self, data, files, name):
+        try:
+            return data.getlist(name)
+        except AttributeError:
+            return data.get(name)
 
 
 class LoginForm(AuthenticationForm):
@@ -55,17 +128,20 @@ class TicketCreateForm(forms.ModelForm):
 
 
 class ExecutorAssignmentForm(forms.Form):
-    executor = forms.ModelChoiceField(label="Исполнитель", queryset=models.User.objects.all(), to_field_name="id")
+    executor = forms.ModelChoiceField(
+        label="Исполнитель",
+        queryset=models.User.objects.all(),
+        to_field_name="id",
+        widget=UserAutocompleteWidget
+    )
 
     def __init__(self, *args, **kwargs):
-        qs = kwargs.pop("queryset") if "queryset" in kwargs else None
+        departament = kwargs.pop("departament", None)
         super().__init__(*args, **kwargs)
-        if qs:
-            self.fields["executor"].queryset = qs
-        # ToDo узнать, почему переопределение метода не сработало
-        # https://docs.djangoproject.com/en/3.0/ref/forms/fields/#modelchoicefield
-        self.fields["executor"].label_from_instance = lambda obj: f"{obj.last_name} {obj.first_name}"
-        # ----------------------------------------------------------
+        if departament is not None:
+            # подсказки и проверка - только среди сотрудников подразделения
+            self.fields["executor"].queryset = departament.employees.all()
+            self.fields["executor"].widget.departament_id = departament.id
         self.helper = FormHelper()
         self.helper.form_method = "post"
         self.helper.form_action = "----calculated dynamically----"
@@ -156,3 +232,52 @@ class CancelTicketForm(SimpleInlineForm):
                 Submit("submit", "Отменить", css_class="btn btn-danger")
             )
         )
+
+
+class TicketIdListField(forms.Field):
+    """
+    Список id заявок: повторяющийся параметр или id через запятую.
+    """
+    widget = forms.MultipleHiddenInput
+
+    def __init__(self, *args, max_length=None, **kwargs):
+        self.max_length = max_length
+        super().__init__(*args, **kwargs)
+
+    def to_python(self, value):
+        if not value:
+            return []
+        if isinstance(value, str):
+            value = [value]
+        try:
+            return [int(item) for chunk in value for item in chunk.split(",") if item.strip()]
+        except ValueError:
+            raise forms.ValidationError("Некорректный список заявок")
+
+    def validate(self, value):
+        super().validate(value)
+        if self.max_length is not None and len(value) > self.max_length:
+            raise forms.ValidationError(f"Можно выбрать не более {self.max_length} заявок")
+
+
+class BulkTicketActionForm(forms.Form):
+    # не больше заявок за один запрос
+    MAX_TICKETS = 1000
+
+    action = forms.ChoiceField(
+        label="Действие",
+        choices=[
+            ("can_assign_executor", "Назначить исполнителя"),
+            ("can_deny", "Отклонить"),
+            ("can_delay", "Отложить"),
+            ("can_set_complete", "Проверено"),
+        ]
+    )
+    tickets = TicketIdListField(label="Заявки", max_length=MAX_TICKETS)
+    executor = forms.ModelChoiceField(label="Исполнитель", queryset=models.User.objects.all(), required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get("action") == "can_assign_executor" and not cleaned_data.get("executor"):
+            self.add_error("executor", "Не выбран исполнитель")
+        return cleaned_data
@@ -0,0 +1,90 @@
+"""
+Журнал изменений заявок.
+
+События и изменения счётчиков (tickets.counters) копятся в буфере
+и записываются при завершении collect(): события - одним bulk_create,
+счётчики - через counters.apply(), в той же транзакции, что и сами
+изменения заявок. Без collect() всё записывается сразу.
+"""
+from collections import Counter
+from contextlib import contextmanager
+import threading
+from django.db import transaction
+from tickets import counters, models
+
+_state = threading.local()
+
+
+class _Buffer:
+
+    def __init__(self):
+        self.events = []
+        self.counter_deltas = Counter()
+
+    def flush(self):
+        if self.events:
+            models.TicketEvent.objects.bulk_create(self.events)
+        counters.apply(self.counter_deltas)
+
+
+def _get_buffers():
+    if not hasattr(_state, "buffers"):
+        _state.buffers = []
+    return _state.buffers
+
+
+@contextmanager
+def collect():
+    """
+    Транзакция, в которой события журнала и изменения счётчиков
+    собираются в буфер и записываются при выходе.
+    Вложенные collect() пишут в буфер внешнего.
+    """
+    buffers = _get_buffers()
+    if buffers:
+        with transaction.atomic():
+            yield buffers[-1]
+        return
+    with transaction.atomic():
+        buffer = _Buffer()
+        buffers.append(buffer)
+        try:
+            yield buffer
+        finally:
+            buffers.pop()
+        buffer.flush()
+
+
+def record(ticket, actor, from_status, to_status, executor=None):
+    """
+    Добавляет событие в журнал: заявка перешла из from_status в to_status
+    по действию actor; executor - назначенный при этом исполнитель.
+    ticket должен содержать значения creator_id, departament_id
+    и executor_id до перехода.
+    """
+    event = models.TicketEvent(
+        ticket_id=ticket.id,
+        actor_id=actor.id if actor else None,
+        from_status=from_status,
+        to_status=to_status,
+        executor_id=executor.id if executor else None
+    )
+    executor_id = executor.id if executor else ticket.executor_id
+    deltas = counters.get_ticket_deltas(ticket, from_status, to_status, executor_id)
+    buffers = _get_buffers()
+    if buffers:
+        buffers[-1].events.append(event)
+        buffers[-1].counter_deltas.update(deltas)
+    else:
+        with transaction.atomic():
+            event.save()
+            counters.apply(deltas)
+    return event
+
+
+def get_ticket_history(ticket_id):
+    return models.TicketEvent.objects.filter(ticket_id=ticket_id).order_by("date", "id")
+
+
+def get_events_since(moment):
+    return models.TicketEvent.objects.filter(date__gte=moment).order_by("date", "id")
@@ -0,0 +1,321 @@
+"""
+Массовая загрузка заявок из CSV и JSONL.
+
+Подразделения и пользователи ищутся по названию и имени пользователя
+в словарях, загруженных один раз до начала загрузки. Колонки файла
+сопоставляются с полями заявки один раз на файл, читатели отдают строки
+кортежами значений в порядке IMPORT_FIELDS. Строки проверяются
+по ограничениям полей Ticket; пакет вставляется через bulk_create
+в своей транзакции, вместе с ним обновляются счётчики и таблица поиска.
+Таблице поиска SQLite нужны id новых заявок, а bulk_create в Django 3.0
+возвращает их только на PostgreSQL, поэтому на SQLite пакет вставляется
+запросами INSERT ... RETURNING (нужен SQLite 3.35+) по INSERT_BATCH_SIZE строк.
+
+События создания в журнал не пишутся: история загружаемых заявок
+осталась в системе, из которой они переносятся.
+"""
+import csv
+from datetime import date, datetime
+import json
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+from tickets import counters, models, search
+
+Ticket = models.Ticket
+
+# поля заявки в порядке значений разобранной строки
+IMPORT_FIELDS = ("departament", "title", "description", "creator", "executor", "status", "priority", "deadline")
+REQUIRED_FIELDS = ("departament", "title", "description", "creator")
+VERBOSE_NAMES = {name: str(Ticket._meta.get_field(name).verbose_name) for name in IMPORT_FIELDS}
+# колонка файла -> поле заявки; кроме имён полей, принимаются их подписи
+COLUMN_FIELDS = {}
+for _name in IMPORT_FIELDS:
+    COLUMN_FIELDS[_name] = _name
+    COLUMN_FIELDS[VERBOSE_NAMES[_name].lower()] = _name
+
+# поля заявки в порядке значений разобранной строки, как атрибуты модели
+IMPORT_ATTNAMES = tuple(Ticket._meta.get_field(name).attname for name in IMPORT_FIELDS)
+
+DATE_FORMATS = ("%Y-%m-%d", "%d.%m.%Y")
+# заявок в пакете (одной транзакции) и в одном INSERT
+BATCH_SIZE = 5000
+INSERT_BATCH_SIZE = 1000
+
+
+class RowError(ValueError):
+    pass
+
+
+def _clean(value):
+    """
+    Значение колонки без пробелов по краям; пустое значение - None.
+    """
+    if isinstance(value, str):
+        return value.strip() or None
+    return value
+
+
+def read_csv(file):
+    """
+    Строки CSV-файла с заголовком как пары (номер строки, значения полей
+    в порядке IMPORT_FIELDS). Колонки сопоставляются с полями один раз
+    по заголовку. Разделитель - запятая или точка с запятой (как в выгрузке
+    списков).
+    """
+    header = file.readline()
+    delimiter = ";" if header.count(";") > header.count(",") else ","
+    fields = [COLUMN_FIELDS.get(column.strip().lower()) for column in next(csv.reader([header], delimiter=delimiter))]
+    width = len(fields)
+    # номер колонки каждого поля; отсутствующее поле читается из пустой
+    # колонки, добавленной в конец строки
+    indexes = [fields.index(name) if name in fields else width for name in IMPORT_FIELDS]
+    padding = [""] * (width + 1)
+    for line_number, values in enumerate(csv.reader(file, delimiter=delimiter), 2):
+        if values:
+            values += padding[len(values):]
+            yield line_number, tuple([values[index].strip() or None for index in indexes])
+
+
+def read_jsonl(file):
+    """
+    Строки JSONL-файла как пары (номер строки, значения полей в порядке
+    IMPORT_FIELDS); вместо значений нечитаемой строки - RowError.
+    """
+    # ключ объекта -> номер поля в IMPORT_FIELDS или None
+    positions = {}
+    for line_number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            yield line_number, RowError(f"Неверный JSON: {error}")
+            continue
+        if not isinstance(row, dict):
+            yield line_number, RowError("Строка должна быть объектом JSON")
+            continue
+        values = [None] * len(IMPORT_FIELDS)
+        for key, value in row.items():
+            if key not in positions:
+                field_name = COLUMN_FIELDS.get(key.strip().lower())
+                positions[key] = None if field_name is None else IMPORT_FIELDS.index(field_name)
+            if positions[key] is not None:
+                values[positions[key]] = _clean(value)
+        yield line_number, tuple(values)
+
+
+READERS = {
+    "csv": read_csv,
+    "jsonl": read_jsonl,
+}
+
+
+def _name_lookup(pairs):
+    """
+    Словарь имя -> id; у неоднозначных имён значение None.
+    """
+    lookup = {}
+    for name, object_id in pairs:
+        lookup[name] = None if name in lookup else object_id
+    return lookup
+
+
+def _choice_lookup(field_name):
+    """
+    Словарь значение или подпись (в нижнем регистре) -> значение поля.
+    """
+    lookup = {}
+    for value, label in Ticket._meta.get_field(field_name).choices:
+        lookup[str(value)] = value
+        lookup[str(label).lower()] = value
+    return lookup
+
+
+class TicketImporter:
+    """
+    Проверяет строки и загружает заявки пакетами по batch_size.
+    При dry_run строки только проверяются.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, dry_run=False):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.departaments = _name_lookup(models.Departament.objects.values_list("name", "id"))
+        self.users = _name_lookup(User.objects.values_list("username", "id"))
+        self.statuses = _choice_lookup("status")
+        self.priorities = _choice_lookup("priority")
+        self.default_priority = Ticket._meta.get_field("priority").default
+        self.title_length = Ticket._meta.get_field("title").max_length
+        # разобранные сроки
+        self.deadlines = {}
+        if not dry_run and uses_insert_returning() and connection.Database.sqlite_version_info < (3, 35):
+            raise ValueError(
+                "Для загрузки нужен SQLite 3.35 или новее (INSERT ... RETURNING), "
+                f"установлен {connection.Database.sqlite_version}"
+            )
+
+    def parse_row(self, row):
+        """
+        Значения колонок заявки в порядке IMPORT_FIELDS по значениям полей
+        строки в том же порядке. Все ошибки строки собираются в один RowError.
+        """
+        if isinstance(row, RowError):
+            raise row
+        departament, title, description, creator, executor, status, priority, deadline = row
+        departament_id = None if departament is None else self.departaments.get(str(departament))
+        creator_id = None if creator is None else self.users.get(str(creator))
+        executor_id = None if executor is None else self.users.get(str(executor))
+        status = Ticket.STATUS_NEW if status is None else self.statuses.get(str(status).lower())
+        priority = self.default_priority if priority is None else self.priorities.get(str(priority).lower())
+        try:
+            deadline = None if deadline is None else self.parse_deadline(deadline)
+        except RowError:
+            raise RowError(self.get_errors(row))
+        if (
+            departament_id is None or creator_id is None or title is None or description is None
+            or executor_id is None and executor is not None or status is None or priority is None
+            or len(str(title)) > self.title_length
+        ):
+            raise RowError(self.get_errors(row))
+        return departament_id, str(title), str(description), creator_id, executor_id, status, priority, deadline
+
+    def get_errors(self, row):
+        """
+        Сообщения обо всех ошибках строки через "; ".
+        """
+        values = dict(zip(IMPORT_FIELDS, row))
+        errors = [f"{VERBOSE_NAMES[name]}: обязательное поле" for name in REQUIRED_FIELDS if values[name] is None]
+        for field_name, mapping, missing_message, ignore_case in (
+            ("departament", self.departaments, "не найдено", False),
+            ("creator", self.users, "не найден", False),
+            ("executor", self.users, "не найден", False),
+            ("status", self.statuses, "- неизвестное значение", True),
+            ("priority", self.priorities, "- неизвестное значение", True),
+        ):
+            value = values[field_name]
+            if value is None:
+                continue
+            key = str(value).lower() if ignore_case else str(value)
+            if mapping.get(key) is None:
+                message = missing_message if key not in mapping else "встречается несколько раз"
+                errors.append(f"{VERBOSE_NAMES[field_name]}: «{value}» {message}")
+        if values["deadline"] is not None:
+            try:
+                self.parse_deadline(values["deadline"])
+            except RowError as error:
+                errors.append(str(error))
+        if values["title"] is not None and len(str(values["title"])) > self.title_length:
+            errors.append(f"{VERBOSE_NAMES['title']}: длиннее {self.title_length} символов")
+        return "; ".join(errors)
+
+    def parse_deadline(self, value):
+        key = str(value)
+        if key not in self.deadlines:
+            if isinstance(value, date):
+                parsed = value
+            else:
+                for date_format in DATE_FORMATS:
+                    try:
+                        parsed = datetime.strptime(key, date_format).date()
+                        break
+                    except ValueError:
+                        pass
+                else:
+                    raise RowError(f"{VERBOSE_NAMES['deadline']}: неверная дата «{value}»")
+            self.deadlines[key] = parsed
+        return self.deadlines[key]
+
+    def import_rows(self, rows):
+        """
+        Загружает строки (номер строки, значения полей) пакетами.
+        После каждого пакета выдаёт пару (загруженные строки, отклонённые
+        строки), отклонённая строка - (номер строки, словарь поле -> значение
+        или None для нечитаемой строки, ошибка).
+        """
+        tickets, rejected = [], []
+        for line_number, row in rows:
+            try:
+                tickets.append(self.parse_row(row))
+            except RowError as error:
+                values = None if isinstance(row, RowError) else dict(zip(IMPORT_FIELDS, row))
+                rejected.append((line_number, values, str(error)))
+            if len(tickets) == self.batch_size:
+                self.save(tickets)
+                yield tickets, rejected
+                tickets, rejected = [], []
+        if tickets or rejected:
+            self.save(tickets)
+            yield tickets, rejected
+
+    def save(self, tickets):
+        if self.dry_run or not tickets:
+            return
+        date_create = timezone.now()
+        with transaction.atomic():
+            if uses_insert_returning():
+                search.index_tickets(_insert_returning(tickets, date_create))
+            else:
+                objects = [
+                    Ticket(date_create=date_create, **dict(zip(IMPORT_ATTNAMES, ticket))) for ticket in tickets
+                ]
+                Ticket.objects.bulk_create(objects, batch_size=INSERT_BATCH_SIZE)
+                if search.uses_fts():
+                    search.index_tickets([(ticket.id, ticket.title, ticket.description) for ticket in objects])
+            counters.apply(counters.get_new_tickets_deltas(
+                (ticket[3], ticket[0], ticket[4], ticket[5]) for ticket in tickets
+            ))
+
+
+def uses_insert_returning():
+    """
+    Вставляются ли заявки запросами INSERT ... RETURNING: id нужны таблице
+    поиска SQLite, а bulk_create их здесь не возвращает.
+    """
+    return search.uses_fts() and not connection.features.can_return_rows_from_bulk_insert
+
+
+def _get_max_query_params():
+    """
+    Наибольшее число параметров в запросе. Для SQLite Django 3.0 считает
+    999 (ограничение SQLite до 3.32), настоящее значение берётся из лимитов
+    подключения (Python 3.11+).
+    """
+    if connection.vendor == "sqlite" and hasattr(connection.connection, "getlimit"):
+        return connection.connection.getlimit(connection.Database.SQLITE_LIMIT_VARIABLE_NUMBER)
+    return connection.features.max_query_params
+
+
+def _insert_returning(tickets, date_create):
+    """
+    Вставляет заявки запросами INSERT ... RETURNING и возвращает
+    (id, title, description) вставленных строк - в произвольном порядке,
+    поэтому вместе с id возвращается и текст для таблицы поиска.
+    """
+    quote = connection.ops.quote_name
+    fields = [Ticket._meta.get_field(name) for name in IMPORT_FIELDS + ("date_create",)]
+    # значения строки уже проверены и готовы для БД, кроме дат
+    date_create = connection.ops.adapt_datetimefield_value(date_create)
+    adapt_deadline = connection.ops.adapt_datefield_value
+    columns = ", ".join(quote(field.column) for field in fields)
+    returning = ", ".join(quote(Ticket._meta.get_field(name).column) for name in ("id", "title", "description"))
+    placeholder = f"({', '.join(['%s'] * len(fields))})"
+    inserted = []
+    with connection.cursor() as cursor:
+        # число параметров запроса ограничено
+        rows_per_insert = min(INSERT_BATCH_SIZE, _get_max_query_params() // len(fields))
+        for start in range(0, len(tickets), rows_per_insert):
+            batch = tickets[start:start + rows_per_insert]
+            params = []
+            for ticket in batch:
+                # срок - последнее из IMPORT_FIELDS
+                params.extend(ticket[:-1])
+                params.append(adapt_deadline(ticket[-1]))
+                params.append(date_create)
+            cursor.execute(
+                f"INSERT INTO {quote(Ticket._meta.db_table)} ({columns}) "
+                f"VALUES {', '.join([placeholder] * len(batch))} RETURNING {returning}",
+                params
+            )
+            inserted.extend(cursor.fetchall())
+    return inserted
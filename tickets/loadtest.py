@@ -0,0 +1,305 @@
+"""
+Нагрузочный прогон представлений заявок без сети и внешних инструментов.
+
+Запросы подаются прямо в WSGI-приложение ticket_system.wsgi.application
+из пула потоков. Каждый поток от имени своих виртуальных пользователей
+выполняет сценарии: исполнитель читает входящие, создатель заводит
+заявку, руководитель назначает исполнителя. Сессии создаются заранее,
+токен CSRF виртуальный пользователь получает из cookie, как браузер.
+Для каждого имени адреса считаются пропускная способность и перцентили
+времени ответа.
+"""
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from io import BytesIO
+import random
+import sys
+import threading
+import time
+from urllib.parse import urlencode
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.db import connections
+from django.urls import resolve, reverse
+from tickets import models
+from tickets.roles import get_user_roles
+from ticket_system.wsgi import application
+
+SCENARIOS = ("executor", "creator", "supervisor")
+DEFAULT_MIX = {"executor": 6, "creator": 2, "supervisor": 2}
+PERCENTILES = (50, 95, 99)
+# сколько пользователей каждой роли и заявок для назначения готовится заранее
+USERS_PER_ROLE = 50
+ASSIGNABLE_TICKETS = 1000
+
+
+def parse_mix(value):
+    """
+    Доли сценариев из строки вида "executor=6,creator=2,supervisor=2".
+    """
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Неизвестный сценарий: {name}")
+        mix[name] = int(weight)
+    if not any(mix.values()):
+        raise ValueError("Хотя бы у одного сценария доля должна быть больше нуля")
+    return mix
+
+
+def percentile(values, rank):
+    """
+    Перцентиль отсортированного списка методом ближайшего ранга.
+    """
+    index = max(0, -(-len(values) * rank // 100) - 1)
+    return values[index]
+
+
+class VirtualUser:
+    """
+    Пользователь с собственными cookie, который отправляет запросы
+    в WSGI-приложение.
+    """
+
+    def __init__(self, user, session_key, recorder):
+        self.user = user
+        self.cookies = SimpleCookie()
+        self.cookies[settings.SESSION_COOKIE_NAME] = session_key
+        self.recorder = recorder
+
+    def request(self, method, path, data=None):
+        body = urlencode(data or {}, doseq=True).encode() if method == "POST" else b""
+        path, _, query = path.partition("?")
+        if method == "GET" and data:
+            query = urlencode(data, doseq=True)
+        environ = {
+            "REQUEST_METHOD": method,
+            "PATH_INFO": path,
+            "QUERY_STRING": query,
+            "SERVER_NAME": "testserver",
+            "SERVER_PORT": "80",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "HTTP_HOST": "testserver",
+            "HTTP_COOKIE": "; ".join(f"{name}={morsel.value}" for name, morsel in self.cookies.items()),
+            "CONTENT_TYPE": "application/x-www-form-urlencoded",
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.input": BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = headers
+
+        url_name = resolve(path).url_name
+        started = time.perf_counter()
+        try:
+            result = application(environ, start_response)
+            try:
+                content = b"".join(result)
+            finally:
+                if hasattr(result, "close"):
+                    result.close()
+        except Exception as error:
+            self.recorder.add(url_name, time.perf_counter() - started, None, error)
+            raise
+        self.recorder.add(url_name, time.perf_counter() - started, response["status"])
+        for name, value in response["headers"]:
+            if name.lower() == "set-cookie":
+                self.cookies.load(value)
+        return response["status"], content
+
+    def get(self, path, data=None):
+        return self.request("GET", path, data)
+
+    def post(self, path, data):
+        if settings.CSRF_COOKIE_NAME not in self.cookies:
+            # токен выдаётся вместе с любой страницей, где есть форма
+            self.get(reverse("new_ticket"))
+        data = dict(data, csrfmiddlewaretoken=self.cookies[settings.CSRF_COOKIE_NAME].value)
+        return self.request("POST", path, data)
+
+
+class Recorder:
+    """
+    Время ответа и коды статусов по именам адресов, общие для всех потоков.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timings = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.errors = defaultdict(int)
+        self.failed_scenarios = defaultdict(int)
+
+    def add_failed_scenario(self, name):
+        with self.lock:
+            self.failed_scenarios[name] += 1
+
+    def add(self, url_name, seconds, status, error=None):
+        with self.lock:
+            self.timings[url_name].append(seconds * 1000)
+            self.statuses[url_name][str(status) if status is not None else type(error).__name__] += 1
+            if error is not None or status >= 400:
+                self.errors[url_name] += 1
+
+    def report(self, elapsed):
+        urls = {}
+        for url_name, timings in sorted(self.timings.items()):
+            timings = sorted(timings)
+            result = {
+                "requests": len(timings),
+                "errors": self.errors[url_name],
+                "statuses": dict(self.statuses[url_name]),
+                "throughput_rps": len(timings) / elapsed,
+                "max_ms": timings[-1],
+            }
+            for rank in PERCENTILES:
+                result[f"p{rank}_ms"] = percentile(timings, rank)
+            urls[url_name] = result
+        requests = sum(result["requests"] for result in urls.values())
+        return {
+            "elapsed_s": elapsed,
+            "requests": requests,
+            "errors": sum(result["errors"] for result in urls.values()),
+            "throughput_rps": requests / elapsed,
+            "failed_scenarios": dict(self.failed_scenarios),
+            "urls": urls,
+        }
+
+
+def executor_scenario(client, plan, rng):
+    client.get(reverse("inbox"))
+    client.get(reverse("inbox-data"), {"draw": 1, "start": 0, "length": 25})
+
+
+def creator_scenario(client, plan, rng):
+    client.get(reverse("new_ticket"))
+    client.post(reverse("new_ticket"), {
+        "departament": rng.choice(plan.departament_ids),
+        "title": f"Нагрузочная заявка {rng.randrange(10 ** 6)}",
+        "description": "Создана нагрузочным прогоном",
+    })
+
+
+def supervisor_scenario(client, plan, rng):
+    ticket_id, executor_id = rng.choice(plan.assignable[client.user.id])
+    client.get(reverse("ticket-detail", args=[ticket_id]))
+    client.post(reverse("ticket-assign", args=[ticket_id]), {"executor": executor_id})
+
+
+SCENARIO_FUNCTIONS = {
+    "executor": executor_scenario,
+    "creator": creator_scenario,
+    "supervisor": supervisor_scenario,
+}
+
+
+class LoadPlan:
+    """
+    Пользователи каждой роли с готовыми сессиями и заявки, которые
+    руководители могут переназначать.
+    """
+
+    def __init__(self, users_per_role=USERS_PER_ROLE, seed=0):
+        rng = random.Random(seed)
+        self.departament_ids = list(models.Departament.objects.order_by("id").values_list("id", flat=True))
+        executors = User.objects.filter(
+            tickets_in_work__status=models.Ticket.STATUS_IN_WORK
+        ).distinct().order_by("id")[:users_per_role]
+        creators = User.objects.filter(is_active=True).order_by("id")[:users_per_role]
+        supervisors = User.objects.filter(supervised_departaments__isnull=False).distinct().order_by("id")
+        self.users = {"executor": list(executors), "creator": list(creators), "supervisor": []}
+        self.assignable = {}
+        for supervisor in supervisors[:users_per_role]:
+            tickets = self.get_assignable(supervisor, rng)
+            if tickets:
+                self.users["supervisor"].append(supervisor)
+                self.assignable[supervisor.id] = tickets
+        self.session_keys = {}
+
+    def get_assignable(self, supervisor, rng):
+        supervised = sorted(get_user_roles(supervisor).supervised)
+        employees = defaultdict(list)
+        for departament_id, user_id in models.Departament.employees.through.objects.filter(
+            departament_id__in=supervised
+        ).values_list("departament_id", "user_id"):
+            employees[departament_id].append(user_id)
+        tickets = models.Ticket.objects.filter(
+            departament_id__in=supervised,
+            status__in=(models.Ticket.STATUS_NEW, models.Ticket.STATUS_IN_WORK)
+        ).order_by("id").values_list("id", "departament_id")[:ASSIGNABLE_TICKETS]
+        return [
+            (ticket_id, rng.choice(employees[departament_id]))
+            for ticket_id, departament_id in tickets
+            if employees[departament_id]
+        ]
+
+    def get_session_key(self, user):
+        """
+        Сессия вошедшего пользователя, как после входа через форму.
+        """
+        if user.id not in self.session_keys:
+            session = SessionStore()
+            session[SESSION_KEY] = str(user.pk)
+            session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+            session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+            session.create()
+            self.session_keys[user.id] = session.session_key
+        return self.session_keys[user.id]
+
+    def delete_sessions(self):
+        SessionStore.get_model_class().objects.filter(session_key__in=list(self.session_keys.values())).delete()
+
+
+def run(mix=None, threads=8, duration=10.0, seed=0, users_per_role=USERS_PER_ROLE):
+    """
+    Выполняет сценарии в threads потоках в течение duration секунд.
+    mix - доли сценариев; сценарии без пользователей пропускаются.
+    Возвращает отчёт: общие показатели и показатели по именам адресов.
+    """
+    plan = LoadPlan(users_per_role, seed)
+    mix = {name: weight for name, weight in (mix or DEFAULT_MIX).items() if weight and plan.users[name]}
+    if not mix:
+        raise ValueError("Для сценариев нет пользователей - база не заполнена")
+    recorder = Recorder()
+    scenarios, weights = zip(*mix.items())
+    session_keys = {user.id: plan.get_session_key(user) for name in scenarios for user in plan.users[name]}
+    deadline = time.perf_counter() + duration
+
+    def worker(number):
+        rng = random.Random(seed * 1000 + number)
+        # у каждого потока свои виртуальные пользователи: cookie не делятся между потоками
+        clients = {
+            name: [VirtualUser(user, session_keys[user.id], recorder) for user in plan.users[name]]
+            for name in scenarios
+        }
+        try:
+            while time.perf_counter() < deadline:
+                name = rng.choices(scenarios, weights)[0]
+                try:
+                    SCENARIO_FUNCTIONS[name](rng.choice(clients[name]), plan, rng)
+                except Exception:
+                    # сценарий прерван, следующая итерация начинается заново
+                    recorder.add_failed_scenario(name)
+        finally:
+            connections.close_all()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, range(threads)))
+    report = recorder.report(time.perf_counter() - started)
+    report["scenarios"] = dict(mix)
+    plan.delete_sessions()
+    return report
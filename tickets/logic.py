@@ -1,5 +1,7 @@
+from django.db.models import Q
 from django.urls import reverse
-from tickets import filters, forms, models
+from tickets import filters, forms, history, models
+from tickets.roles import get_user_roles
 
 # таблица переходов статусов заявки
 # ключ - доступное пользователю действие
@@ -45,6 +47,35 @@ EXECUTOR_TRANSITION_TABLE = {
     )
 }
 
+# действия руководителя над группой заявок -> изменения, которые они вносят
+# (для назначения исполнителя к изменениям добавляется сам исполнитель)
+SUPERVISOR_BULK_ACTIONS = {
+    "can_assign_executor": {"status": models.Ticket.STATUS_IN_WORK},
+    "can_deny": {"status": models.Ticket.STATUS_DENIED},
+    "can_delay": {"status": models.Ticket.STATUS_DELAYED},
+    "can_set_complete": {"status": models.Ticket.STATUS_COMPLETE},
+}
+
+# сколько заявок изменяется одним UPDATE при групповых действиях
+BULK_UPDATE_BATCH_SIZE = 500
+
+# порядок вывода заявок в списках; последнее поле уникально,
+# поэтому по нему можно листать список курсором
+TICKET_LIST_ORDERING = ("-priority", "deadline", "id")
+# порядок заявок, найденных полнотекстовым поиском: по релевантности
+SEARCH_ORDERING = ("-search_rank", "id")
+
+
+def get_list_ordering(queryset):
+    """
+    Порядок вывода заявок списка по умолчанию: найденные полнотекстовым
+    поиском (с аннотацией search_rank) - по релевантности, остальные -
+    TICKET_LIST_ORDERING. Одинаков для таблицы, полного списка и выгрузки.
+    """
+    if "search_rank" in queryset.query.annotations:
+        return SEARCH_ORDERING
+    return TICKET_LIST_ORDERING
+
 
 def get_ticket_list_context(**kwargs):
     """
@@ -75,10 +106,15 @@ def get_ticket_list_context(**kwargs):
     elif url_name == "supervision":
         filterset_class = filters.SupervisorTicketFilter
         column_list.extend(['creator', 'status', 'executors'])
+        # список id вместо подзапроса: так планировщик видит конкретные
+        # подразделения и выбирает индекс по подразделению и статусу
         ticket_list = models.Ticket.objects.filter(
-            departament__in=current_user.supervised_departaments.all()
+            departament__in=sorted(get_user_roles(current_user).supervised)
         )
 
+    # всё, что выводится в строке списка, загружаем одним запросом
+    ticket_list = ticket_list.select_related("creator", "executor")
+
     context = {
         "filterset_class": filterset_class,
         "column_list": column_list,
@@ -116,10 +152,10 @@ def get_management_forms_for_ticket(**kwargs):
     management_forms = {}
 
     if actions.get("can_assign_executor"):
-        # ToDo должен стоять текущий исполнитель, если он есть
+        # выбран текущий исполнитель, у новой заявки его нет
         executor_form = forms.ExecutorAssignmentForm(
-            initial={"executor": ticket.executor.id},
-            queryset=ticket.departament.employees.all()
+            initial={"executor": ticket.executor_id},
+            departament=ticket.departament
         )
         executor_form.helper.form_action = reverse("ticket-assign", kwargs={"pk": ticket.id})
         management_forms["executor_assignment_form"] = executor_form
@@ -157,56 +193,144 @@ def get_management_forms_for_ticket(**kwargs):
     return management_forms
 
 
-def set_ticket_done(ticket):
-    ticket.status = models.Ticket.STATUS_CONTROL
-    ticket.save()
+def get_transition_condition(action, current_user):
+    """
+    Условие, при котором пользователь может выполнить действие над заявкой.
+
+    Объединяет по ролям пользователя статусы из таблиц переходов:
+    руководитель - заявки своих подразделений, создатель - свои заявки,
+    исполнитель - назначенные ему.
+    """
+    # пустое условие: без подходящей роли действие не применится ни к одной заявке
+    condition = Q(pk__in=[])
+    supervised = get_user_roles(current_user).supervised
+    if supervised and action in SUPERVISOR_TRANSITION_TABLE:
+        condition |= Q(
+            departament_id__in=sorted(supervised),
+            status__in=SUPERVISOR_TRANSITION_TABLE[action]
+        )
+    if action in CREATOR_TRANSITION_TABLE:
+        condition |= Q(creator_id=current_user.id, status__in=CREATOR_TRANSITION_TABLE[action])
+    if action in EXECUTOR_TRANSITION_TABLE:
+        condition |= Q(executor_id=current_user.id, status__in=EXECUTOR_TRANSITION_TABLE[action])
+    return condition
+
+
+def change_ticket(ticket, current_user, action, **changes):
+    """
+    Выполняет действие над заявкой одним условным UPDATE.
+
+    Статус и права проверяются в самом запросе, вдобавок статус,
+    исполнитель, создатель и подразделение должны совпадать с прочитанными
+    в ticket, поэтому из двух одновременных действий над заявкой (в том
+    числе двух переназначений заявки в работе) применится только одно,
+    а журнал и счётчики получат точные прежние значения.
+    Обновляются только изменяемые колонки. Возвращает True, если
+    изменение применено, и False, если заявка уже изменилась.
+    """
+    condition = get_transition_condition(action, current_user)
+    from_status = ticket.status
+    with history.collect():
+        updated = models.Ticket.objects.filter(
+            condition,
+            id=ticket.id,
+            status=from_status,
+            executor_id=ticket.executor_id,
+            creator_id=ticket.creator_id,
+            departament_id=ticket.departament_id
+        ).update(**changes)
+        if not updated:
+            return False
+        history.record(ticket, current_user, from_status, changes["status"], changes.get("executor"))
+    for field, value in changes.items():
+        setattr(ticket, field, value)
+    return True
+
+
+def bulk_change_tickets(ticket_ids, current_user, action, executor=None):
+    """
+    Выполняет действие руководителя над группой заявок.
+
+    Одним запросом выбирает из переданных id заявки подразделений
+    руководителя в статусах, допустимых по SUPERVISOR_TRANSITION_TABLE,
+    блокирует их до конца транзакции и изменяет пачками по
+    BULK_UPDATE_BATCH_SIZE. Исполнитель назначается только на заявки
+    подразделений, в которых он работает.
+    Возвращает отсортированные списки применённых и отклонённых id.
+    """
+    ticket_ids = set(ticket_ids)
+    changes = dict(SUPERVISOR_BULK_ACTIONS[action])
+    condition = Q(
+        departament_id__in=sorted(get_user_roles(current_user).supervised),
+        status__in=SUPERVISOR_TRANSITION_TABLE[action]
+    )
+    if action == "can_assign_executor":
+        changes["executor"] = executor
+        condition &= Q(departament_id__in=sorted(get_user_roles(executor).member))
+    with history.collect():
+        # блокировки берутся в порядке id, чтобы встречные групповые действия
+        # не ждали друг друга по кругу
+        selected = list(
+            models.Ticket.objects.select_for_update().filter(
+                condition, id__in=sorted(ticket_ids)
+            ).order_by("id").only("id", "status", "creator_id", "departament_id", "executor_id")
+        )
+        applied = [ticket.id for ticket in selected]
+        for start in range(0, len(applied), BULK_UPDATE_BATCH_SIZE):
+            batch = applied[start:start + BULK_UPDATE_BATCH_SIZE]
+            models.Ticket.objects.filter(id__in=batch).update(**changes)
+        for ticket in selected:
+            history.record(ticket, current_user, ticket.status, changes["status"], changes.get("executor"))
+    rejected = sorted(ticket_ids.difference(applied))
+    return applied, rejected
+
+
+def set_ticket_done(ticket, current_user):
+    return change_ticket(ticket, current_user, "can_set_done", status=models.Ticket.STATUS_CONTROL)
 
 
-def cancel_ticket(ticket):
-    ticket.status = models.Ticket.STATUS_CANCELED
-    ticket.save()
+def cancel_ticket(ticket, current_user):
+    return change_ticket(ticket, current_user, "can_cancel", status=models.Ticket.STATUS_CANCELED)
 
 
-def refresh_ticket(ticket):
-    ticket.status = models.Ticket.STATUS_NEW
-    ticket.save()
+def refresh_ticket(ticket, current_user):
+    return change_ticket(ticket, current_user, "can_refresh", status=models.Ticket.STATUS_NEW)
 
 
-def delay_ticket(ticket):
-    ticket.status = models.Ticket.STATUS_DELAYED
-    ticket.save()
+def delay_ticket(ticket, current_user):
+    return change_ticket(ticket, current_user, "can_delay", status=models.Ticket.STATUS_DELAYED)
 
 
-def deny_ticket(ticket):
-    ticket.status = models.Ticket.STATUS_DENIED
-    ticket.save()
+def deny_ticket(ticket, current_user):
+    return change_ticket(ticket, current_user, "can_deny", status=models.Ticket.STATUS_DENIED)
 
 
-def assign_executor_for_ticket(ticket, executor):
-    ticket.status = models.Ticket.STATUS_IN_WORK
-    ticket.executor = executor
-    ticket.save()
+def assign_executor_for_ticket(ticket, current_user, executor):
+    return change_ticket(
+        ticket, current_user, "can_assign_executor",
+        status=models.Ticket.STATUS_IN_WORK,
+        executor=executor
+    )
 
 
-def complete_ticket(ticket):
-    ticket.status = models.Ticket.STATUS_COMPLETE
-    ticket.save()
+def complete_ticket(ticket, current_user):
+    return change_ticket(ticket, current_user, "can_set_complete", status=models.Ticket.STATUS_COMPLETE)
 
 
 def check_user_is_ticket_creator(ticket, current_user):
-    return (ticket.creator == current_user)
+    return (ticket.creator_id == current_user.id)
 
 
 def check_user_is_ticket_executor(ticket, current_user):
-    return (ticket.executor == current_user)
+    return (ticket.executor_id is not None and ticket.executor_id == current_user.id)
 
 
 def check_user_can_refresh_ticket(ticket, current_user):
     return (
-        ticket.creator == current_user
-        or ticket.departament in current_user.supervised_departaments.all()
+        check_user_is_ticket_creator(ticket, current_user)
+        or check_user_is_ticket_supervisor(ticket, current_user)
     )
 
 
 def check_user_is_ticket_supervisor(ticket, current_user):
-    return (ticket.departament in current_user.supervised_departaments.all())
+    return get_user_roles(current_user).supervises(ticket.departament_id)
@@ -0,0 +1,60 @@
+import json
+from django.core.management.base import BaseCommand
+from tickets import benchmark, models
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает планы и время выполнения запросов списков заявок "
+        "без индексов Ticket.Meta.indexes и с ними на синтетической базе"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tickets", type=int, default=1000000, help="Количество заявок")
+        parser.add_argument("--departaments", type=int, default=50)
+        parser.add_argument("--users", type=int, default=2000)
+        parser.add_argument("--repeat", type=int, default=5, help="Повторов каждого замера")
+        parser.add_argument("--page-size", type=int, default=100)
+        parser.add_argument("--json", action="store_true", help="Вывести отчёт в JSON")
+
+    def handle(self, *args, **options):
+        with benchmark.temporary_database():
+            self.stderr.write(f"Заполнение базы: {options['tickets']} заявок...")
+            benchmark.seed_tickets(
+                options["tickets"],
+                departaments=options["departaments"],
+                users=options["users"]
+            )
+            benchmark.drop_indexes(models.Ticket)
+            before = self.measure(options)
+            benchmark.create_indexes(models.Ticket)
+            after = self.measure(options)
+
+        report = {
+            list_name: {"before": before[list_name], "after": after[list_name]}
+            for list_name in before
+        }
+        if options["json"]:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+        for list_name, result in report.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(list_name))
+            for stage in ("before", "after"):
+                measurement = result[stage]
+                self.stdout.write(
+                    f"  {stage}: страница {measurement['page_ms']:.2f} мс, "
+                    f"количество {measurement['count_ms']:.2f} мс"
+                )
+                for line in measurement["plan"].splitlines():
+                    self.stdout.write(f"    {line}")
+
+    def measure(self, options):
+        results = {}
+        for list_name, queryset in benchmark.get_list_querysets().items():
+            page = queryset[:options["page_size"]]
+            results[list_name] = {
+                "plan": page.explain(),
+                "page_ms": benchmark.timed(lambda: list(page.all()), options["repeat"]),
+                "count_ms": benchmark.timed(queryset.count, options["repeat"]),
+            }
+        return results
@@ -0,0 +1,74 @@
+import json
+import tracemalloc
+from django.core.management.base import BaseCommand
+from tickets import benchmark, models, projection
+
+
+def render_cells(ticket):
+    """
+    Те же обращения к атрибутам, что делает строка шаблона списка.
+    """
+    return (
+        ticket.get_absolute_url(),
+        ticket.title,
+        str(ticket.creator),
+        ticket.date_create,
+        ticket.priority_css,
+        ticket.priority_text,
+        ticket.deadline_css,
+        ticket.verbose_deadline_status,
+        ticket.status_css,
+        ticket.status_text,
+        ticket.days_left,
+        str(ticket.executor or ""),
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает время и память на вывод строк списка заявок: "
+        "полные экземпляры Ticket против строк projection.TicketRow"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000, help="Количество заявок")
+        parser.add_argument("--repeat", type=int, default=5, help="Повторов каждого замера")
+        parser.add_argument("--json", action="store_true", help="Вывести отчёт в JSON")
+
+    def handle(self, *args, **options):
+        with benchmark.temporary_database():
+            benchmark.seed_tickets(options["rows"], departaments=10, users=200)
+            queryset = models.Ticket.objects.order_by("id")
+            variants = {
+                "models": lambda: queryset.select_related("creator", "executor").with_deadline_info(),
+                "rows": lambda: projection.project_rows(queryset),
+            }
+            report = {
+                name: self.measure(make_queryset, options["repeat"])
+                for name, make_queryset in variants.items()
+            }
+
+        rows = options["rows"]
+        for result in report.values():
+            result["us_per_row"] = result["ms"] * 1000 / rows
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        for name, result in report.items():
+            self.stdout.write(
+                f"{name:>7}: {result['ms']:.1f} мс на {rows} строк "
+                f"({result['us_per_row']:.1f} мкс/строка), "
+                f"пик памяти {result['peak_kb']:.0f} КБ"
+            )
+
+    def measure(self, make_queryset, repeat):
+        def run():
+            return [render_cells(ticket) for ticket in make_queryset()]
+
+        run()
+        milliseconds = benchmark.timed(run, repeat)
+        tracemalloc.start()
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {"ms": milliseconds, "peak_kb": peak / 1024}
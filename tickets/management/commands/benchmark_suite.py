@@ -0,0 +1,59 @@
+import json
+import platform
+import django
+from django.core.management.base import BaseCommand
+from django.db import connection
+from tickets import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет списки заявок, доступные действия и переходы статусов "
+        "на синтетической базе и выводит отчёт в JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tickets", type=int, default=100000, help="Количество заявок")
+        parser.add_argument("--departaments", type=int, default=50)
+        parser.add_argument("--users", type=int, default=2000)
+        parser.add_argument("--supervisors", type=int, default=1)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--repeat", type=int, default=5, help="Повторов каждого замера")
+        parser.add_argument("--page-size", type=int, default=100)
+        parser.add_argument("--output", help="Записать отчёт в файл вместо вывода")
+        parser.add_argument("--compare", help="Отчёт прошлого запуска для сравнения медиан")
+
+    def handle(self, *args, **options):
+        parameters = {
+            name: options[name]
+            for name in ("tickets", "departaments", "users", "supervisors", "seed", "repeat", "page_size")
+        }
+        with benchmark.temporary_database():
+            self.stderr.write(f"Заполнение базы: {options['tickets']} заявок...")
+            benchmark.seed_tickets(
+                options["tickets"],
+                departaments=options["departaments"],
+                users=options["users"],
+                supervisors=options["supervisors"],
+                seed=options["seed"]
+            )
+            report = benchmark.run_suite(options["repeat"], options["page_size"])
+            report["environment"] = {
+                "database": connection.vendor,
+                "django": django.get_version(),
+                "python": platform.python_version(),
+                "parameters": parameters,
+            }
+
+        content = json.dumps(report, ensure_ascii=False, indent=2, sort_keys=True)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                file.write(content + "\n")
+        else:
+            self.stdout.write(content)
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as file:
+                previous = json.load(file)
+            for name, old, new in benchmark.compare_reports(previous, report):
+                change = (new - old) / old * 100 if old else 0
+                self.stderr.write(f"{name}: {old:.2f} -> {new:.2f} мс ({change:+.0f}%)")
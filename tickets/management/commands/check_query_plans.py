@@ -0,0 +1,37 @@
+import difflib
+from django.core.management.base import BaseCommand, CommandError
+from tickets import benchmark, queryplans
+
+
+class Command(BaseCommand):
+    help = (
+        "Снимает планы запросов списков заявок на синтетической базе, проверяет, "
+        "что в них нет полного просмотра заявок и сортировки, и сравнивает их "
+        "с сохранёнными в tickets/query_plans"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--update", action="store_true", help="Сохранить текущие планы")
+
+    def handle(self, *args, **options):
+        with benchmark.temporary_database():
+            queryplans.seed()
+            plans, errors = queryplans.check_plans()
+            current = queryplans.format_snapshot(plans)
+            snapshot = queryplans.read_snapshot()
+            path = queryplans.get_snapshot_path()
+
+        if options["update"]:
+            queryplans.write_snapshot(plans)
+            self.stdout.write(f"Планы сохранены в {path}")
+        elif snapshot is None:
+            self.stdout.write(f"Сохранённых планов для {queryplans.get_version()} нет, сравнение пропущено")
+        elif snapshot != current:
+            self.stdout.writelines(difflib.unified_diff(
+                snapshot.splitlines(keepends=True), current.splitlines(keepends=True), path, "текущие планы"
+            ), ending="")
+        if errors:
+            raise CommandError("Недопустимые планы:\n" + "\n".join(errors))
+        if not options["update"] and snapshot is not None and snapshot != current:
+            raise CommandError("Планы изменились; если так и задумано, запустите команду с --update")
+        self.stdout.write(self.style.SUCCESS(f"Проверено планов: {len(plans)}"))
@@ -0,0 +1,33 @@
+import json
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from tickets import slowlog
+
+
+class Command(BaseCommand):
+    help = (
+        "Выводит журнал медленных SQL-запросов всех процессов, сначала новые"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=settings.SLOW_QUERY_LOG_SIZE, help="Сколько записей вывести")
+        parser.add_argument("--json", action="store_true", help="Вывести записи в JSON")
+        parser.add_argument("--clear", action="store_true", help="После вывода очистить журнал")
+
+    def handle(self, *args, **options):
+        entries = slowlog.get_entries(options["limit"])
+        if options["json"]:
+            self.stdout.write(json.dumps(entries, ensure_ascii=False, indent=2))
+        else:
+            for entry in entries:
+                self.stdout.write(
+                    f"{entry['time']} {entry['duration_ms']:.1f} мс "
+                    f"{entry['view'] or '-'} {entry['frame'] or '-'}"
+                )
+                for frame in entry["stack"][1:]:
+                    self.stdout.write(f"    из {frame}")
+                self.stdout.write(f"    {entry['sql']}")
+                self.stdout.write(f"    {entry['params']}")
+            self.stdout.write(f"Записей: {len(entries)}")
+        if options["clear"]:
+            slowlog.clear()
@@ -0,0 +1,62 @@
+import json
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from tickets import importer
+
+
+class Command(BaseCommand):
+    help = (
+        "Загружает заявки из CSV или JSONL. Подразделения указываются по названию, "
+        "пользователи - по имени пользователя"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Файл с заявками")
+        parser.add_argument(
+            "--format", choices=sorted(importer.READERS),
+            help="Формат файла; по умолчанию определяется по расширению"
+        )
+        parser.add_argument("--batch-size", type=int, default=importer.BATCH_SIZE, help="Заявок в пакете")
+        parser.add_argument("--dry-run", action="store_true", help="Только проверить строки, ничего не записывая")
+        parser.add_argument("--rejected", help="Файл JSONL для отклонённых строк")
+
+    def handle(self, *args, **options):
+        file_format = options["format"] or os.path.splitext(options["path"])[1].lstrip(".").lower()
+        if file_format not in importer.READERS:
+            raise CommandError(f"Неизвестный формат файла: {file_format}")
+        if options["batch_size"] < 1:
+            raise CommandError("Размер пакета должен быть больше нуля")
+        try:
+            ticket_importer = importer.TicketImporter(options["batch_size"], options["dry_run"])
+        except ValueError as error:
+            raise CommandError(error)
+        rejected_file = open(options["rejected"], "w", encoding="utf-8") if options["rejected"] else None
+        imported = rejected = 0
+        started = time.perf_counter()
+        try:
+            with open(options["path"], encoding="utf-8-sig", newline="") as file:
+                rows = importer.READERS[file_format](file)
+                for number, (tickets, rejected_rows) in enumerate(ticket_importer.import_rows(rows), 1):
+                    imported += len(tickets)
+                    rejected += len(rejected_rows)
+                    for line_number, row, error in rejected_rows:
+                        if rejected_file:
+                            rejected_file.write(json.dumps(
+                                {"line": line_number, "error": error, "row": row}, ensure_ascii=False, default=str
+                            ) + "\n")
+                        if options["verbosity"] > 1:
+                            self.stderr.write(f"Строка {line_number}: {error}")
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(
+                        f"Пакет {number}: загружено {imported}, отклонено {rejected}, "
+                        f"{imported / elapsed if elapsed else 0:.0f} строк/с"
+                    )
+        finally:
+            if rejected_file:
+                rejected_file.close()
+        action = "Проверено" if options["dry_run"] else "Загружено"
+        self.stdout.write(
+            f"{action} заявок: {imported}, отклонено строк: {rejected}, "
+            f"за {time.perf_counter() - started:.1f} с"
+        )
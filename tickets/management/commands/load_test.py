@@ -0,0 +1,79 @@
+import json
+import os
+import tempfile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from tickets import benchmark, counters, loadtest
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный прогон представлений заявок: запросы подаются в WSGI-приложение "
+        "из пула потоков, отчёт с пропускной способностью и перцентилями - в JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--duration", type=float, default=10, help="Длительность прогона, секунд")
+        parser.add_argument(
+            "--mix", default="executor=6,creator=2,supervisor=2",
+            help="Доли сценариев: executor - входящие, creator - новая заявка, supervisor - назначение"
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--existing", action="store_true",
+            help="Нагружать рабочую базу (например, заполненную seed_benchmark) вместо временной"
+        )
+        parser.add_argument("--tickets", type=int, default=100000, help="Заявок во временной базе")
+        parser.add_argument("--departaments", type=int, default=50)
+        parser.add_argument("--users", type=int, default=2000)
+        parser.add_argument("--output", help="Записать отчёт в файл вместо вывода")
+
+    def handle(self, *args, **options):
+        try:
+            mix = loadtest.parse_mix(options["mix"])
+        except ValueError as error:
+            raise CommandError(error)
+        if options["existing"]:
+            report = self.run(mix, options)
+        else:
+            with tempfile.TemporaryDirectory() as directory:
+                # потоки работают с одной базой, поэтому SQLite - в файле, а не в памяти
+                name = os.path.join(directory, "load_test.sqlite3") if connection.vendor == "sqlite" else None
+                with benchmark.temporary_database(name=name):
+                    self.stderr.write(f"Заполнение базы: {options['tickets']} заявок...")
+                    benchmark.seed_tickets(
+                        options["tickets"],
+                        departaments=options["departaments"],
+                        users=options["users"],
+                        seed=options["seed"]
+                    )
+                    counters.rebuild()
+                    report = self.run(mix, options)
+
+        content = json.dumps(report, ensure_ascii=False, indent=2, sort_keys=True)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                file.write(content + "\n")
+        else:
+            self.stdout.write(content)
+        for url_name, result in report["urls"].items():
+            self.stderr.write(
+                f"{url_name:>16}: {result['requests']} запросов, {result['throughput_rps']:.1f}/с, "
+                f"p50 {result['p50_ms']:.1f} мс, p95 {result['p95_ms']:.1f} мс, "
+                f"p99 {result['p99_ms']:.1f} мс, ошибок {result['errors']}"
+            )
+
+    def run(self, mix, options):
+        try:
+            report = loadtest.run(mix, options["threads"], options["duration"], options["seed"])
+        except ValueError as error:
+            raise CommandError(error)
+        report["environment"] = {
+            "database": connection.vendor,
+            "parameters": {
+                name: options[name]
+                for name in ("threads", "duration", "mix", "seed", "existing", "tickets", "departaments", "users")
+            },
+        }
+        return report
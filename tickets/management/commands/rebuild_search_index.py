@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from tickets import search
+
+
+class Command(BaseCommand):
+    help = (
+        "Заново заполняет таблицу полнотекстового поиска заявок (SQLite). "
+        "Нужна после изменения стеммера (tickets.stemming) и после загрузки "
+        "заявок в обход save()"
+    )
+
+    def handle(self, *args, **options):
+        search.rebuild_index()
+        self.stdout.write("Индекс поиска перестроен")
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from tickets import counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает счётчики заявок для навигации по таблице заявок. "
+        "С --check только сверяет их и сообщает о расхождениях"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Только сверить счётчики, не изменяя их")
+
+    def handle(self, *args, **options):
+        expected = counters.compute()
+        stored = counters.get_stored()
+        mismatches = sorted(
+            (key, stored.get(key, 0), expected.get(key, 0))
+            for key in set(expected) | set(stored)
+            if stored.get(key, 0) != expected.get(key, 0)
+        )
+        for (kind, owner_id, status), stored_value, expected_value in mismatches:
+            self.stdout.write(
+                f"{kind} {owner_id}, статус {status}: {stored_value} вместо {expected_value}"
+            )
+        if options["check"]:
+            if mismatches:
+                raise CommandError(f"Расхождений в счётчиках: {len(mismatches)}")
+            self.stdout.write("Счётчики совпадают с заявками")
+            return
+        counters.rebuild()
+        self.stdout.write(f"Счётчики пересчитаны, исправлено расхождений: {len(mismatches)}")
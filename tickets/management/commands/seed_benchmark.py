@@ -0,0 +1,43 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from tickets import benchmark, counters, search
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет рабочую базу синтетическими подразделениями, пользователями "
+        "и заявками. При одном и том же --seed данные одинаковы"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tickets", type=int, default=100000, help="Количество заявок")
+        parser.add_argument("--departaments", type=int, default=50)
+        parser.add_argument("--users", type=int, default=2000, help="Количество сотрудников")
+        parser.add_argument("--supervisors", type=int, default=1, help="Руководителей в подразделении")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--password", default="benchmark",
+            help="Пароль всех созданных пользователей (user0, user1, ...)"
+        )
+
+    def handle(self, *args, **options):
+        if options["departaments"] < 1 or options["users"] < options["departaments"]:
+            raise CommandError("Нужно хотя бы одно подразделение и по сотруднику на каждое")
+        if User.objects.filter(username__in=[f"user{i}" for i in range(options["users"])]).exists():
+            raise CommandError("Пользователи user0, user1, ... уже есть в базе")
+        self.stdout.write(f"Заполнение базы: {options['tickets']} заявок...")
+        benchmark.seed_tickets(
+            options["tickets"],
+            departaments=options["departaments"],
+            users=options["users"],
+            supervisors=options["supervisors"],
+            seed=options["seed"],
+            password=options["password"]
+        )
+        # заявки вставлены через bulk_create, в обход счётчиков и поиска
+        counters.rebuild()
+        search.rebuild_index()
+        self.stdout.write(
+            f"Создано подразделений: {options['departaments']}, пользователей: {options['users']}, "
+            f"заявок: {options['tickets']}"
+        )
@@ -0,0 +1,281 @@
+"""
+Метрики запросов по именам адресов в текстовом формате Prometheus.
+
+MetricsMiddleware замеряет каждый запрос: время ответа, число и время
+SQL-запросов, время отрисовки шаблонов. Замеры складываются в памяти
+процесса под блокировкой. Если задан каталог METRICS_DIR, процесс не чаще
+раза в METRICS_FLUSH_INTERVAL секунд записывает свои суммы в собственный
+файл, а /metrics складывает файлы всех процессов - так при нескольких
+рабочих процессах видны общие значения. Имя файла содержит pid и случайный
+идентификатор запуска, поэтому новый процесс с тем же pid не затирает
+чужие суммы. Файлы, не обновлявшиеся дольше METRICS_MAX_AGE секунд,
+удаляются при сборе: их процессы завершились (или давно простаивают,
+тогда их суммы вернутся со следующим запросом).
+
+Для потоковых ответов время ответа считается до начала передачи.
+"""
+import atexit
+from contextlib import ExitStack, contextmanager
+import hmac
+import json
+import os
+import threading
+import time
+import uuid
+from django.conf import settings
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+# границы корзин гистограммы времени ответа, в секундах
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# имя для запросов, которые не сопоставились ни с одним адресом
+UNRESOLVED = "unresolved"
+
+_local = threading.local()
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_stats = {}
+_last_flush = time.monotonic()
+# (pid, идентификатор запуска) - для имени файла процесса
+_process_id = None
+
+
+class RequestMeasure:
+    """
+    Замеры одного запроса. Экземпляр служит и обёрткой выполнения
+    SQL-запросов (connection.execute_wrapper).
+    """
+
+    def __init__(self):
+        # имя адреса, известно после сопоставления адреса с представлением
+        self.view = None
+        self.duration = 0.0
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql_time += time.perf_counter() - started
+
+
+def get_current_measure():
+    """
+    Замеры запроса, который обрабатывает текущий поток, или None.
+    """
+    return getattr(_local, "measure", None)
+
+
+@contextmanager
+def measure_request():
+    measure = RequestMeasure()
+    _local.measure = measure
+    started = time.perf_counter()
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(measure))
+            yield measure
+    finally:
+        measure.duration = time.perf_counter() - started
+        _local.measure = None
+
+
+def _empty_stats():
+    return {
+        "requests": {},
+        "buckets": [0] * len(BUCKETS),
+        "duration": 0.0,
+        "queries": 0,
+        "sql_time": 0.0,
+        "template_time": 0.0,
+    }
+
+
+def record(view, status_code, measure):
+    """
+    Добавляет замеры запроса к суммам процесса.
+    """
+    status = f"{status_code // 100}xx"
+    with _lock:
+        stats = _stats.get(view)
+        if stats is None:
+            stats = _stats[view] = _empty_stats()
+        stats["requests"][status] = stats["requests"].get(status, 0) + 1
+        for i, bound in enumerate(BUCKETS):
+            if measure.duration <= bound:
+                stats["buckets"][i] += 1
+                break
+        stats["duration"] += measure.duration
+        stats["queries"] += measure.queries
+        stats["sql_time"] += measure.sql_time
+        stats["template_time"] += measure.template_time
+    if time.monotonic() - _last_flush >= settings.METRICS_FLUSH_INTERVAL:
+        flush()
+
+
+def get_process_stats():
+    with _lock:
+        return json.loads(json.dumps(_stats))
+
+
+def _get_process_path():
+    global _process_id
+    # после fork у рабочего процесса свой pid и свой идентификатор
+    if _process_id is None or _process_id[0] != os.getpid():
+        _process_id = (os.getpid(), uuid.uuid4().hex[:12])
+    return os.path.join(settings.METRICS_DIR, "%d-%s.json" % _process_id)
+
+
+def flush():
+    """
+    Записывает суммы процесса в его файл в METRICS_DIR. Если файл уже
+    пишет другой поток, ничего не делает.
+    """
+    global _last_flush
+    if not settings.METRICS_DIR or not _flush_lock.acquire(blocking=False):
+        return
+    try:
+        _last_flush = time.monotonic()
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        path = _get_process_path()
+        with open(path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(get_process_stats(), file)
+        # замена атомарна: читатель видит либо старый, либо новый файл
+        os.replace(path + ".tmp", path)
+    finally:
+        _flush_lock.release()
+
+
+atexit.register(flush)
+
+
+def _merge(total, stats):
+    for view, values in stats.items():
+        merged = total.setdefault(view, _empty_stats())
+        for status, count in values["requests"].items():
+            merged["requests"][status] = merged["requests"].get(status, 0) + count
+        merged["buckets"] = [a + b for a, b in zip(merged["buckets"], values["buckets"])]
+        for name in ("duration", "queries", "sql_time", "template_time"):
+            merged[name] += values[name]
+
+
+def collect():
+    """
+    Суммы всех процессов: из файлов METRICS_DIR, а без него - текущего процесса.
+    """
+    if not settings.METRICS_DIR:
+        return get_process_stats()
+    flush()
+    total = {}
+    expired = time.time() - settings.METRICS_MAX_AGE
+    for name in sorted(os.listdir(settings.METRICS_DIR)):
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(settings.METRICS_DIR, name)
+        try:
+            if os.path.getmtime(path) < expired:
+                os.remove(path)
+                continue
+            with open(path, encoding="utf-8") as file:
+                _merge(total, json.load(file))
+        except (OSError, ValueError):
+            # файл удалён или записан не этим кодом - пропускаем
+            continue
+    return total
+
+
+def is_authorized(request):
+    """
+    Передан ли в запросе токен METRICS_TOKEN.
+    """
+    token = settings.METRICS_TOKEN
+    if not token:
+        return False
+    return hmac.compare_digest(
+        request.META.get("HTTP_AUTHORIZATION", "").encode(), f"Bearer {token}".encode()
+    )
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render(stats):
+    """
+    Текстовый формат Prometheus (версия 0.0.4).
+    """
+    lines = []
+
+    def header(name, metric_type, help_text):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+
+    views = sorted(stats)
+    header("tickets_requests_total", "counter", "Запросы по имени адреса и классу кода ответа")
+    for view in views:
+        for status, count in sorted(stats[view]["requests"].items()):
+            lines.append(f'tickets_requests_total{{view="{_label(view)}",status="{status}"}} {count}')
+
+    header("tickets_request_duration_seconds", "histogram", "Время ответа")
+    for view in views:
+        values = stats[view]
+        label = _label(view)
+        count = sum(values["requests"].values())
+        cumulative = 0
+        for bound, bucket in zip(BUCKETS, values["buckets"]):
+            cumulative += bucket
+            lines.append(f'tickets_request_duration_seconds_bucket{{view="{label}",le="{bound}"}} {cumulative}')
+        lines.append(f'tickets_request_duration_seconds_bucket{{view="{label}",le="+Inf"}} {count}')
+        lines.append(f'tickets_request_duration_seconds_sum{{view="{label}"}} {values["duration"]:.6f}')
+        lines.append(f'tickets_request_duration_seconds_count{{view="{label}"}} {count}')
+
+    for name, key, help_text, number_format in (
+        ("tickets_db_queries_total", "queries", "SQL-запросы", "d"),
+        ("tickets_db_query_seconds_total", "sql_time", "Время выполнения SQL-запросов", ".6f"),
+        ("tickets_template_render_seconds_total", "template_time", "Время отрисовки шаблонов", ".6f"),
+    ):
+        header(name, "counter", help_text)
+        for view in views:
+            lines.append(f'{name}{{view="{_label(view)}"}} {stats[view][key]:{number_format}}')
+    return "\n".join(lines) + "\n"
+
+
+class Template(django_backend.Template):
+    """
+    Шаблон, время отрисовки которого учитывается в замерах запроса.
+    Вложенные шаблоны (формы crispy, include) входят во время внешнего.
+    """
+
+    def render(self, context=None, request=None):
+        measure = get_current_measure()
+        if measure is None or measure.template_depth:
+            return super().render(context, request)
+        measure.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            measure.template_time += time.perf_counter() - started
+            measure.template_depth -= 1
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """
+    Стандартный движок шаблонов Django, отдающий шаблоны с замером времени.
+    """
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
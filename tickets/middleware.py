@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.functional import SimpleLazyObject
+from tickets import counters, metrics, profiling, roles, sampling
+
+
+class UserRolesMiddleware:
+    """
+    Добавляет в запрос request.user_roles - роли текущего пользователя.
+    Роли загружаются при первом обращении и дальше берутся из памяти.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.user_roles = SimpleLazyObject(lambda: roles.get_user_roles(request.user))
+        return self.get_response(request)
+
+
+class TicketCountersMiddleware:
+    """
+    Добавляет в запрос request.ticket_counters - количество заявок
+    для пунктов навигации. Читается из таблицы счётчиков при первом обращении.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.ticket_counters = SimpleLazyObject(
+            lambda: counters.get_user_counters(request.user, request.user_roles)
+        )
+        return self.get_response(request)
+
+
+class MetricsMiddleware:
+    """
+    Замеряет запрос и добавляет замеры к метрикам его адреса
+    (см. tickets.metrics). Стоит первым, чтобы учитывать остальные
+    промежуточные слои.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with metrics.measure_request() as measure:
+            response = self.get_response(request)
+        match = request.resolver_match
+        metrics.record(match.view_name if match else metrics.UNRESOLVED, response.status_code, measure)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics.get_current_measure().view = request.resolver_match.view_name
+
+
+class ProfilingMiddleware:
+    """
+    Выполняет запрос под cProfile, если сотрудник попросил об этом
+    (см. tickets.profiling). Стоит после AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if profiling.is_requested(request):
+            return profiling.profile_request(self.get_response, request)
+        return self.get_response(request)
+
+
+class SamplingProfilerMiddleware:
+    """
+    Отмечает для фонового профилировщика, какой адрес обрабатывает поток
+    (см. tickets.sampling). При SAMPLING_PROFILER_RATE = 0 Django
+    исключает этот слой из цепочки.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SAMPLING_PROFILER_RATE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sampling.ensure_started()
+        sampling.begin()
+        try:
+            return self.get_response(request)
+        finally:
+            sampling.end()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        sampling.begin(request.resolver_match.view_name)
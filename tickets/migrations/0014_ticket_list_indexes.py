@@ -0,0 +1,25 @@
+# Generated by Django 3.0.5 on 2026-10-18 16:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0013_auto_20200524_1421'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(status=3), fields=['executor', '-priority', 'deadline', 'id'], name='ticket_inbox_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['creator', '-priority', 'deadline', 'id', 'status'], name='ticket_outbox_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['departament', '-priority', 'deadline', 'id', 'status'], name='ticket_supervision_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.0.5 on 2026-10-18 16:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tickets', '0014_ticket_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.PositiveSmallIntegerField(blank=True, choices=[(0, 'Новая'), (1, 'Отложена'), (2, 'Отклонена'), (3, 'В работе'), (4, 'Контроль'), (5, 'Завершена'), (6, 'Отменена пользователем')], null=True, verbose_name='Прежний статус')),
+                ('to_status', models.PositiveSmallIntegerField(choices=[(0, 'Новая'), (1, 'Отложена'), (2, 'Отклонена'), (3, 'В работе'), (4, 'Контроль'), (5, 'Завершена'), (6, 'Отменена пользователем')], verbose_name='Новый статус')),
+                ('date', models.DateTimeField(auto_now_add=True, verbose_name='Дата')),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Кто изменил')),
+                ('executor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Назначенный исполнитель')),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='events', to='tickets.Ticket', verbose_name='Заявка')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='ticketevent',
+            index=models.Index(fields=['ticket', 'date'], name='ticket_event_ticket_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticketevent',
+            index=models.Index(fields=['date'], name='ticket_event_date_idx'),
+        ),
+    ]
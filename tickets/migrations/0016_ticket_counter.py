@@ -0,0 +1,46 @@
+# Generated by Django 3.0.5 on 2026-10-18 17:01
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_counters(apps, schema_editor):
+    Ticket = apps.get_model("tickets", "Ticket")
+    TicketCounter = apps.get_model("tickets", "TicketCounter")
+    counters = []
+    for kind, field in (("creator", "creator_id"), ("departament", "departament_id"), ("executor", "executor_id")):
+        rows = Ticket.objects.filter(**{f"{field}__isnull": False}).order_by().values_list(
+            field, "status"
+        ).annotate(count=Count("id"))
+        counters.extend(
+            TicketCounter(kind=kind, owner_id=owner_id, status=status, value=count)
+            for owner_id, status, count in rows
+        )
+    # размер пачки выбирает Django: в SQLite вставка идёт через составной
+    # SELECT, в котором не больше 500 частей
+    TicketCounter.objects.bulk_create(counters)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0015_ticket_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketCounter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('creator', 'Создатель'), ('executor', 'Исполнитель'), ('departament', 'Подразделение')], max_length=20, verbose_name='Владелец')),
+                ('owner_id', models.PositiveIntegerField(verbose_name='id владельца')),
+                ('status', models.PositiveSmallIntegerField(choices=[(0, 'Новая'), (1, 'Отложена'), (2, 'Отклонена'), (3, 'В работе'), (4, 'Контроль'), (5, 'Завершена'), (6, 'Отменена пользователем')], verbose_name='Статус')),
+                ('value', models.IntegerField(default=0, verbose_name='Количество заявок')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='ticketcounter',
+            constraint=models.UniqueConstraint(fields=('kind', 'owner_id', 'status'), name='ticket_counter_key'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.0.5 on 2026-10-18 17:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0016_ticket_counter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['departament', 'executor', 'status', 'priority', 'deadline', 'date_create'], name='ticket_dashboard_idx'),
+        ),
+    ]
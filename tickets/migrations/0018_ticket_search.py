@@ -0,0 +1,164 @@
+import re
+from django.db import migrations
+
+SQLITE_CREATE = (
+    "CREATE VIRTUAL TABLE tickets_ticket_search USING fts5("
+    "title, description, tokenize = 'unicode61 remove_diacritics 0')"
+)
+SQLITE_DROP = "DROP TABLE tickets_ticket_search"
+
+# выражение должно совпадать с SearchVector("title", "description", config="russian"),
+# иначе планировщик не станет использовать индекс
+POSTGRESQL_CREATE = (
+    "CREATE INDEX ticket_search_idx ON tickets_ticket USING GIN ("
+    "to_tsvector('russian'::regconfig, "
+    "COALESCE((title)::text, '') || ' ' || COALESCE((description)::text, '')))"
+)
+POSTGRESQL_DROP = "DROP INDEX ticket_search_idx"
+
+# сколько заявок за раз переносится в таблицу поиска
+FILL_BATCH_SIZE = 5000
+
+# Копия стеммера tickets.stemming на момент миграции: миграция не должна
+# зависеть от кода приложения, который может измениться или исчезнуть.
+# Если стеммер изменится, основы всех заявок пересчитывает команда
+# rebuild_search_index.
+VOWELS = "аеиоуыэюя"
+ENDINGS = {
+    "perfective_gerund": (("в", "вши", "вшись"), ("ив", "ивши", "ившись", "ыв", "ывши", "ывшись")),
+    "adjective": ((), (
+        "ее", "ие", "ые", "ое", "ими", "ыми", "ей", "ий", "ый", "ой", "ем", "им", "ым", "ом",
+        "его", "ого", "ему", "ому", "их", "ых", "ую", "юю", "ая", "яя", "ою", "ею",
+    )),
+    "participle": (("ем", "нн", "вш", "ющ", "щ"), ("ивш", "ывш", "ующ")),
+    "reflexive": ((), ("ся", "сь")),
+    "verb": (
+        ("ла", "на", "ете", "йте", "ли", "й", "л", "ем", "н", "ло", "но", "ет", "ют", "ны", "ть", "ешь", "нно"),
+        (
+            "ила", "ыла", "ена", "ейте", "уйте", "ите", "или", "ыли", "ей", "уй", "ил", "ыл", "им", "ым",
+            "ен", "ило", "ыло", "ено", "ят", "ует", "уют", "ит", "ыт", "ены", "ить", "ыть", "ишь", "ую", "ю",
+        ),
+    ),
+    "noun": ((), (
+        "а", "ев", "ов", "ие", "ье", "е", "иями", "ями", "ами", "еи", "ии", "и", "ией", "ей", "ой",
+        "ий", "й", "иям", "ям", "ием", "ем", "ам", "ом", "о", "у", "ах", "иях", "ях", "ы", "ь", "ию",
+        "ью", "ю", "ия", "ья", "я",
+    )),
+    "superlative": ((), ("ейш", "ейше")),
+    "derivational": ((), ("ост", "ость")),
+}
+# окончания по убыванию длины с признаком "только после а или я"
+GROUPS = {
+    name: sorted(
+        [(ending, True) for ending in after_a] + [(ending, False) for ending in plain],
+        key=lambda item: -len(item[0])
+    )
+    for name, (after_a, plain) in ENDINGS.items()
+}
+WORD_RE = re.compile(r"\w+")
+
+
+def _remove_ending(rv, group):
+    for ending, after_a in GROUPS[group]:
+        if rv.endswith(ending):
+            if after_a and rv[-len(ending) - 1:-len(ending)] not in ("а", "я"):
+                return rv, False
+            return rv[:-len(ending)], True
+    return rv, False
+
+
+def _region_start(word, start=0):
+    for i in range(start + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            return i + 1
+    return len(word)
+
+
+def _stem(word):
+    word = word.lower().replace("ё", "е")
+    rv_start = next((i + 1 for i, letter in enumerate(word) if letter in VOWELS), len(word))
+    if rv_start == len(word):
+        return word
+    r2_start = _region_start(word, _region_start(word))
+    prefix, rv = word[:rv_start], word[rv_start:]
+    rv, removed = _remove_ending(rv, "perfective_gerund")
+    if not removed:
+        rv, _ = _remove_ending(rv, "reflexive")
+        rv, removed = _remove_ending(rv, "adjective")
+        if removed:
+            rv, _ = _remove_ending(rv, "participle")
+        else:
+            rv, removed = _remove_ending(rv, "verb")
+            if not removed:
+                rv, _ = _remove_ending(rv, "noun")
+    if rv.endswith("и"):
+        rv = rv[:-1]
+    r2 = rv[max(r2_start - rv_start, 0):]
+    stripped, removed = _remove_ending(r2, "derivational")
+    if removed:
+        rv = rv[:len(rv) - (len(r2) - len(stripped))]
+    if rv.endswith("нн"):
+        rv = rv[:-1]
+    else:
+        rv, removed = _remove_ending(rv, "superlative")
+        if removed and rv.endswith("нн"):
+            rv = rv[:-1]
+        elif rv.endswith("ь"):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+def _stem_text(text, stems):
+    words = WORD_RE.findall(text or "")
+    for word in words:
+        if word not in stems:
+            stems[word] = _stem(word)
+    return " ".join(stems[word] for word in words)
+
+
+def fill_search_table(apps, connection):
+    """
+    Переносит имеющиеся заявки в таблицу поиска SQLite.
+    """
+    Ticket = apps.get_model("tickets", "Ticket")
+    tickets = Ticket.objects.using(connection.alias).order_by("id").values_list(
+        "id", "title", "description"
+    )
+    insert = "INSERT INTO tickets_ticket_search (rowid, title, description) VALUES (%s, %s, %s)"
+    stems = {}
+    batch = []
+    with connection.cursor() as cursor:
+        for ticket_id, title, description in tickets.iterator(chunk_size=FILL_BATCH_SIZE):
+            batch.append((ticket_id, _stem_text(title, stems), _stem_text(description, stems)))
+            if len(batch) == FILL_BATCH_SIZE:
+                cursor.executemany(insert, batch)
+                batch = []
+        cursor.executemany(insert, batch)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(POSTGRESQL_CREATE)
+    elif vendor == "sqlite":
+        schema_editor.execute(SQLITE_CREATE)
+        fill_search_table(apps, schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(POSTGRESQL_DROP)
+    elif vendor == "sqlite":
+        schema_editor.execute(SQLITE_DROP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0017_ticket_dashboard_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from enum import IntEnum
 from django.contrib.auth.models import User
 from django.db import models
@@ -81,6 +81,72 @@ def create_user_profile(sender, instance, created, **kwargs):
         UserProfile.objects.create(user=instance)
     instance.userprofile.save()
 
+class DaysUntil(models.Func):
+    """
+    Количество дней от даты today до значения выражения (дата в БД).
+    """
+    output_field = models.IntegerField()
+
+    def __init__(self, expression, today, **extra):
+        super().__init__(expression, models.Value(today, output_field=models.DateField()), **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        # PostgreSQL и Oracle: разность дат - целое число дней
+        return super().as_sql(compiler, connection, template="(%(expressions)s)", arg_joiner=" - ")
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection,
+            template="CAST(julianday(%(expressions)s) AS INTEGER)",
+            arg_joiner=") - julianday("
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, function="DATEDIFF")
+
+
+class TicketQuerySet(models.QuerySet):
+
+    def with_deadline_info(self, today=None):
+        """
+        Добавляет к заявкам вычисленные в БД days_left и deadline_bucket
+        с тем же смыслом, что и одноимённые свойства модели.
+        """
+        today = today or datetime.now().date()
+        no_deadline = models.Q(status__in=Ticket.DEADLINE_IRRELEVANT_STATUSES) | models.Q(deadline__isnull=True)
+        return self.annotate(
+            days_left=models.Case(
+                models.When(no_deadline, then=models.Value(None)),
+                default=DaysUntil("deadline", today),
+                output_field=models.IntegerField()
+            ),
+            deadline_bucket=models.Case(
+                models.When(no_deadline, then=models.Value("")),
+                models.When(deadline__gt=today + timedelta(days=1), then=models.Value(Ticket.DEADLINE_OK)),
+                models.When(deadline=today + timedelta(days=1), then=models.Value(Ticket.DEADLINE_LAST_DAY)),
+                models.When(deadline=today, then=models.Value(Ticket.DEADLINE_CRITICAL)),
+                default=models.Value(Ticket.DEADLINE_EXPIRED),
+                output_field=models.CharField()
+            )
+        )
+
+    def overdue(self, today=None):
+        """
+        Заявки, срок которых истёк.
+        """
+        return self.filter(Ticket.overdue_condition(today))
+
+    def due_within(self, days, today=None):
+        """
+        Заявки, срок которых истекает не позже чем через days дней (сегодня включительно).
+        """
+        today = today or datetime.now().date()
+        return self.filter(
+            deadline__gte=today,
+            deadline__lte=today + timedelta(days=days)
+        ).exclude(status__in=Ticket.DEADLINE_IRRELEVANT_STATUSES)
+
+
 class Attachment(models.Model):
     name = models.CharField(verbose_name="Имя вложения", max_length=100)
 
@@ -102,6 +168,19 @@ class Ticket(models.Model):
     URGENT = 400
     CRITICAL = 500
 
+    # для отклонённых и завершённых заявок срок не имеет значения
+    DEADLINE_IRRELEVANT_STATUSES = (STATUS_DENIED, STATUS_COMPLETE)
+
+    # положение заявки относительно срока
+    DEADLINE_OK = "ok"
+    DEADLINE_LAST_DAY = "last_day"
+    DEADLINE_CRITICAL = "critical"
+    DEADLINE_EXPIRED = "expired"
+
+    # статусы, которые списки отправителя и руководителя показывают по умолчанию
+    CREATOR_OPEN_STATUSES = (STATUS_NEW, STATUS_DELAYED, STATUS_IN_WORK)
+    SUPERVISOR_OPEN_STATUSES = (STATUS_NEW, STATUS_DELAYED, STATUS_IN_WORK, STATUS_CONTROL)
+
     date_create = models.DateTimeField(
         auto_now_add=True,
         verbose_name="Дата создания"
@@ -161,13 +240,50 @@ class Ticket(models.Model):
         verbose_name="Приоритет"
     )
 
+    objects = TicketQuerySet.as_manager()
+
+    class Meta:
+        # индексы под выборки списков: равенство по владельцу списка, затем
+        # порядок вывода (-priority, deadline, id), поэтому первая страница
+        # читается из индекса без сортировки всех заявок владельца;
+        # статус в конце индекса проверяется без обращения к таблице
+        indexes = [
+            models.Index(
+                fields=["executor", "-priority", "deadline", "id"],
+                condition=models.Q(status=3),  # STATUS_IN_WORK
+                name="ticket_inbox_idx"
+            ),
+            models.Index(
+                fields=["creator", "-priority", "deadline", "id", "status"],
+                name="ticket_outbox_idx"
+            ),
+            models.Index(
+                fields=["departament", "-priority", "deadline", "id", "status"],
+                name="ticket_supervision_idx"
+            ),
+            # сводка руководителя: группировка по подразделению и исполнителю,
+            # остальные поля сводки читаются из индекса без обращения к таблице
+            models.Index(
+                fields=["departament", "executor", "status", "priority", "deadline", "date_create"],
+                name="ticket_dashboard_idx"
+            ),
+        ]
+
     @property
     def status_text(self):
-        return [item for item in Ticket.status.field.choices if item[0] == self.status][0][1]
+        return STATUS_LABELS[self.status]
 
     @property
     def priority_text(self):
-        return [item for item in Ticket.priority.field.choices if item[0] == self.priority][0][1]
+        return PRIORITY_LABELS[self.priority]
+
+    @classmethod
+    def overdue_condition(cls, today=None):
+        """
+        Условие "срок заявки истёк" для фильтрации в БД.
+        """
+        today = today or datetime.now().date()
+        return models.Q(deadline__lt=today) & ~models.Q(status__in=cls.DEADLINE_IRRELEVANT_STATUSES)
 
     @property
     def days_left(self):
@@ -176,93 +292,221 @@ class Ticket(models.Model):
         Если заявка отклонена или выполнена, то дедлайн не имеет значения;
         Если срок не указан, вернёт None, если заявка просрочена,
         то вернёт отрицательное число.
+        Если заявка получена через with_deadline_info, берётся значение из БД.
         """
-        if self.status in (Ticket.STATUS_DENIED, Ticket.STATUS_COMPLETE):
+        if "_days_left" in self.__dict__:
+            return self._days_left
+        if self.status in Ticket.DEADLINE_IRRELEVANT_STATUSES:
             return None
         if self.deadline is None:
             return None
         return (self.deadline - datetime.now().date()).days
 
+    @days_left.setter
+    def days_left(self, value):
+        self._days_left = value
+
+    @property
+    def deadline_bucket(self):
+        """
+        Положение заявки относительно срока: одна из констант DEADLINE_*
+        или пустая строка, если срок не имеет значения.
+        """
+        if "_deadline_bucket" in self.__dict__:
+            return self._deadline_bucket
+        return get_deadline_bucket(self.days_left)
+
+    @deadline_bucket.setter
+    def deadline_bucket(self, value):
+        self._deadline_bucket = value
+
     @property
     def verbose_deadline_status(self):
         """
         Возвращает словесное описание статуса заявки по срокам исполнения
         """
-        if self.days_left is None:
-            return ""
-        if self.days_left > 0:
-            days_between = self.days_left - 1
-            if days_between == 0:
-                return "Остался последний день"
-            # склоняем слова "Осталось" и "дней"
-            days_reminder = days_between % 10
-            left_plural = "Остался" if days_reminder == 1 else "Осталось"
-            days_plural_declension = {
-                (1,): "день",
-                (2, 3, 4,): "дня",
-                (5, 6, 7, 8, 9, 0): "дней"
-            }
-            days_plural = ""
-            for remainders in days_plural_declension:
-                if days_reminder in remainders:
-                    days_plural = days_plural_declension[remainders]
-                    break
-            # ------------------------------------------------------
-            return f"{left_plural} {days_between} {days_plural}"
-        elif self.days_left == 0:
-            return "Крайний срок"
-        else:
-            formatted_deadline = datetime.strftime(self.deadline, helpers.RUSSIAN_DATE_FORMAT)
-            return f"Просрочено с {formatted_deadline}"
+        return describe_deadline(self.days_left, self.deadline)
 
     @property
     def deadline_css(self):
         """
         Класс CSS для отображения дедлайна
         """
-        if self.days_left is None:
-            return ""
-        if self.days_left > 1:
-            return "ticket_deadline_ok"
-        elif self.days_left == 1:
-            return "ticket_deadline_last_day"
-        elif self.days_left == 0:
-            return "ticket_deadline_critical"
-        else:
-            return "ticket_deadline_expired"
+        return DEADLINE_CSS_CLASSES.get(self.deadline_bucket, "")
 
     @property
     def status_css(self):
         """
         Класс CSS для отображения статуса
         """
-        status_classes = {
-            Ticket.STATUS_NEW: "ticket_status_new",
-            Ticket.STATUS_DELAYED: "ticket_status_delayed",
-            Ticket.STATUS_DENIED: "ticket_status_denied",
-            Ticket.STATUS_IN_WORK: "ticket_status_in_work",
-            Ticket.STATUS_CONTROL: "ticket_status_control",
-            Ticket.STATUS_COMPLETE: "ticket_status_complete",
-            Ticket.STATUS_CANCELED: "ticket_status_canceled",
-        }
-        return status_classes[self.status]
+        return STATUS_CSS_CLASSES[self.status]
 
     @property
     def priority_css(self):
         """
         Класс CSS для отображения приоритета
         """
-        priority_classes = {
-            Ticket.ORDINARY: "ticket_priority_ordinary",
-            Ticket.MEDIUM: "ticket_priority_medium",
-            Ticket.HIGH: "ticket_priority_high",
-            Ticket.URGENT: "ticket_priority_urgent",
-            Ticket.CRITICAL: "ticket_priority_critical",
-        }
-        return priority_classes[self.priority]
+        return PRIORITY_CSS_CLASSES[self.priority]
 
     def get_absolute_url(self):
         return reverse("ticket-detail", args=[str(self.id)])
 
     def __str__(self):
         return self.title
+
+
+class TicketEvent(models.Model):
+    """
+    Запись журнала изменений заявки. Журнал только дополняется;
+    записи создаются пачками через tickets.history.
+    """
+    ticket = models.ForeignKey(
+        Ticket,
+        related_name="events",
+        on_delete=models.PROTECT,
+        verbose_name="Заявка"
+    )
+    actor = models.ForeignKey(
+        User,
+        related_name="+",
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        verbose_name="Кто изменил"
+    )
+    from_status = models.PositiveSmallIntegerField(
+        choices=Ticket.status.field.choices,
+        null=True,
+        blank=True,
+        verbose_name="Прежний статус"
+    )
+    to_status = models.PositiveSmallIntegerField(
+        choices=Ticket.status.field.choices,
+        verbose_name="Новый статус"
+    )
+    executor = models.ForeignKey(
+        User,
+        related_name="+",
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        verbose_name="Назначенный исполнитель"
+    )
+    date = models.DateTimeField(auto_now_add=True, verbose_name="Дата")
+
+    class Meta:
+        # история заявки и все события начиная с момента времени
+        indexes = [
+            models.Index(fields=["ticket", "date"], name="ticket_event_ticket_idx"),
+            models.Index(fields=["date"], name="ticket_event_date_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.ticket_id}: {self.from_status} -> {self.to_status}"
+
+
+class TicketCounter(models.Model):
+    """
+    Количество заявок владельца в статусе. Владелец - создатель,
+    исполнитель или подразделение, в зависимости от kind.
+    Счётчики изменяются вместе с заявками через tickets.counters.
+    """
+    KIND_CREATOR = "creator"
+    KIND_EXECUTOR = "executor"
+    KIND_DEPARTAMENT = "departament"
+
+    kind = models.CharField(
+        max_length=20,
+        choices=[
+            (KIND_CREATOR, "Создатель"),
+            (KIND_EXECUTOR, "Исполнитель"),
+            (KIND_DEPARTAMENT, "Подразделение"),
+        ],
+        verbose_name="Владелец"
+    )
+    owner_id = models.PositiveIntegerField(verbose_name="id владельца")
+    status = models.PositiveSmallIntegerField(choices=Ticket.status.field.choices, verbose_name="Статус")
+    value = models.IntegerField(default=0, verbose_name="Количество заявок")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "owner_id", "status"], name="ticket_counter_key"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.owner_id}, {self.status}: {self.value}"
+
+
+# таблицы подписей и классов CSS для вывода заявок
+STATUS_LABELS = dict(Ticket.status.field.choices)
+PRIORITY_LABELS = dict(Ticket.priority.field.choices)
+
+STATUS_CSS_CLASSES = {
+    Ticket.STATUS_NEW: "ticket_status_new",
+    Ticket.STATUS_DELAYED: "ticket_status_delayed",
+    Ticket.STATUS_DENIED: "ticket_status_denied",
+    Ticket.STATUS_IN_WORK: "ticket_status_in_work",
+    Ticket.STATUS_CONTROL: "ticket_status_control",
+    Ticket.STATUS_COMPLETE: "ticket_status_complete",
+    Ticket.STATUS_CANCELED: "ticket_status_canceled",
+}
+
+PRIORITY_CSS_CLASSES = {
+    Ticket.ORDINARY: "ticket_priority_ordinary",
+    Ticket.MEDIUM: "ticket_priority_medium",
+    Ticket.HIGH: "ticket_priority_high",
+    Ticket.URGENT: "ticket_priority_urgent",
+    Ticket.CRITICAL: "ticket_priority_critical",
+}
+
+DEADLINE_CSS_CLASSES = {
+    Ticket.DEADLINE_OK: "ticket_deadline_ok",
+    Ticket.DEADLINE_LAST_DAY: "ticket_deadline_last_day",
+    Ticket.DEADLINE_CRITICAL: "ticket_deadline_critical",
+    Ticket.DEADLINE_EXPIRED: "ticket_deadline_expired",
+}
+
+# склонение слова "день" по последней цифре числа
+DAYS_PLURAL_DECLENSION = {
+    1: "день",
+    2: "дня", 3: "дня", 4: "дня",
+    5: "дней", 6: "дней", 7: "дней", 8: "дней", 9: "дней", 0: "дней",
+}
+
+
+def get_deadline_bucket(days_left):
+    """
+    Положение заявки относительно срока по количеству оставшихся дней.
+    """
+    if days_left is None:
+        return ""
+    if days_left > 1:
+        return Ticket.DEADLINE_OK
+    elif days_left == 1:
+        return Ticket.DEADLINE_LAST_DAY
+    elif days_left == 0:
+        return Ticket.DEADLINE_CRITICAL
+    else:
+        return Ticket.DEADLINE_EXPIRED
+
+
+def describe_deadline(days_left, deadline):
+    """
+    Словесное описание статуса заявки по срокам исполнения
+    """
+    if days_left is None:
+        return ""
+    if days_left > 0:
+        days_between = days_left - 1
+        if days_between == 0:
+            return "Остался последний день"
+        # склоняем слова "Осталось" и "дней"
+        days_reminder = days_between % 10
+        left_plural = "Остался" if days_reminder == 1 else "Осталось"
+        days_plural = DAYS_PLURAL_DECLENSION[days_reminder]
+        return f"{left_plural} {days_between} {days_plural}"
+    elif days_left == 0:
+        return "Крайний срок"
+    else:
+        formatted_deadline = datetime.strftime(deadline, helpers.RUSSIAN_DATE_FORMAT)
+        return f"Просрочено с {formatted_deadline}"
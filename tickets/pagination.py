@@ -0,0 +1,124 @@
+import base64
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import F, Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class KeysetPage:
+    """
+    Страница списка, полученная по курсору.
+    """
+
+    def __init__(self, object_list, next_cursor, is_first):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.is_first = is_first
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Постраничный вывод по ключу (keyset/seek pagination).
+
+    Вместо OFFSET следующая страница выбирается условием "строго после
+    последней записи предыдущей страницы" по полям сортировки, поэтому
+    стоимость запроса не зависит от того, насколько далеко листает пользователь.
+    Последнее поле сортировки должно быть уникальным (обычно id).
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.fields = [
+            (name.lstrip("-"), name.startswith("-"))
+            for name in self.ordering
+        ]
+
+    def get_page(self, cursor=None):
+        """
+        Отдаёт страницу, следующую за курсором; без курсора - первую страницу.
+        """
+        queryset = self.queryset.order_by(*self._order_by())
+        if cursor:
+            queryset = queryset.filter(self._after(self.decode_cursor(cursor)))
+        rows = list(queryset[:self.per_page + 1])
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            next_cursor = self.encode_cursor(rows[-1])
+        return KeysetPage(rows, next_cursor, is_first=not cursor)
+
+    def encode_cursor(self, row):
+        values = [self._get_value(row, name) for name, _ in self.fields]
+        raw = json.dumps(values, cls=DjangoJSONEncoder).encode()
+        return base64.urlsafe_b64encode(raw).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (ValueError, TypeError):
+            raise InvalidCursor(cursor)
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise InvalidCursor(cursor)
+        model = self.queryset.model
+        try:
+            return [
+                None if value is None else model._meta.get_field(name).to_python(value)
+                for (name, _), value in zip(self.fields, values)
+            ]
+        except Exception:
+            raise InvalidCursor(cursor)
+
+    @staticmethod
+    def _get_value(row, name):
+        if isinstance(row, dict):
+            return row[name]
+        return getattr(row, name)
+
+    def _nulls_largest(self):
+        return connections[self.queryset.db].features.nulls_order_largest
+
+    def _order_by(self):
+        # порядок NULL оставляем родным для СУБД, чтобы сортировку могли
+        # обслуживать обычные индексы; условие _after учитывает этот порядок
+        return [
+            F(name).desc() if descending else F(name).asc()
+            for name, descending in self.fields
+        ]
+
+    def _after(self, values):
+        """
+        Условие "запись идёт строго после курсора":
+        (f1 > v1) OR (f1 = v1 AND f2 > v2) OR ...
+        """
+        nulls_largest = self._nulls_largest()
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (name, descending), value in zip(self.fields, values):
+            # NULL идут в конце, если СУБД считает их наибольшими при ASC
+            # или наименьшими при DESC
+            nulls_after = (nulls_largest != descending)
+            if value is None:
+                if not nulls_after:
+                    condition |= equal & Q(**{f"{name}__isnull": False})
+                equal &= Q(**{f"{name}__isnull": True})
+            else:
+                lookup = "lt" if descending else "gt"
+                after = Q(**{f"{name}__{lookup}": value})
+                if nulls_after:
+                    after |= Q(**{f"{name}__isnull": True})
+                condition |= equal & after
+                equal &= Q(**{name: value})
+        return condition
@@ -0,0 +1,85 @@
+"""
+Профилирование отдельного запроса по требованию сотрудника.
+
+Запрос с параметром ?profile=1 или заголовком X-Profile: 1 от пользователя
+с is_staff выполняется под cProfile. В PROFILE_DIR сохраняются файл pstats
+и текстовая сводка с самыми затратными функциями; имена файлов содержат
+время, имя адреса и число SQL-запросов. Остальные запросы проходят без
+изменений.
+"""
+import cProfile
+import io
+import os
+import pstats
+import re
+import time
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from tickets import metrics
+
+PROFILE_PARAMETER = "profile"
+PROFILE_HEADER = "HTTP_X_PROFILE"
+# сколько функций выводится в текстовой сводке
+SUMMARY_LIMIT = 40
+
+
+def is_requested(request):
+    """
+    Запрошено ли профилирование. Заголовок проверяется первым,
+    чтобы без нужды не разбирать строку запроса.
+    """
+    return (
+        (request.META.get(PROFILE_HEADER) == "1" or request.GET.get(PROFILE_PARAMETER) == "1")
+        and request.user.is_staff
+    )
+
+
+def profile_request(get_response, request):
+    """
+    Выполняет get_response(request) под профилировщиком и сохраняет результат.
+    Возвращает ответ с заголовком X-Profile - именем сохранённых файлов.
+    """
+    measure = metrics.RequestMeasure()
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    with connections["default"].execute_wrapper(measure):
+        profiler.enable()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+    measure.duration = time.perf_counter() - started
+    match = request.resolver_match
+    view = match.view_name if match else metrics.UNRESOLVED
+    name = save_profile(profiler, request, view, measure)
+    response["X-Profile"] = name
+    return response
+
+
+def save_profile(profiler, request, view, measure):
+    """
+    Сохраняет <имя>.prof и <имя>.txt в PROFILE_DIR и возвращает имя.
+    """
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    name = "{}-{}-{}q".format(
+        timezone.now().strftime("%Y%m%d-%H%M%S-%f"),
+        re.sub(r"[^\w-]", "_", view),
+        measure.queries
+    )
+    path = os.path.join(settings.PROFILE_DIR, name)
+    profiler.dump_stats(path + ".prof")
+    summary = io.StringIO()
+    summary.write(
+        f"{request.method} {request.get_full_path()}\n"
+        f"Адрес: {view}\n"
+        f"Пользователь: {request.user.get_username()}\n"
+        f"Время ответа: {measure.duration * 1000:.1f} мс\n"
+        f"SQL-запросов: {measure.queries}, {measure.sql_time * 1000:.1f} мс\n\n"
+    )
+    stats = pstats.Stats(profiler, stream=summary)
+    stats.sort_stats("cumulative").print_stats(SUMMARY_LIMIT)
+    stats.sort_stats("tottime").print_stats(SUMMARY_LIMIT)
+    with open(path + ".txt", "w", encoding="utf-8") as file:
+        file.write(summary.getvalue())
+    return name
@@ -0,0 +1,98 @@
+"""
+Облегчённые строки списков заявок.
+
+Вместо полных экземпляров Ticket (со всеми полями, включая описание,
+и связанными пользователями) списки выбирают из БД только выводимые колонки
+и отдают их компактными объектами TicketRow. Описание в строку не входит:
+таблица подгружает его отдельным запросом при раскрытии строки. Подписи и классы CSS берутся
+из заранее построенных таблиц models.*_LABELS / models.*_CSS_CLASSES,
+поэтому совпадают с одноимёнными свойствами модели.
+"""
+from django.db.models.query import ValuesListIterable
+from django.urls import reverse
+from tickets import models
+
+# атрибут строки -> поле, из которого он выбирается
+ROW_FIELDS = (
+    ("id", "id"),
+    ("title", "title"),
+    ("date_create", "date_create"),
+    ("priority", "priority"),
+    ("deadline", "deadline"),
+    ("status", "status"),
+    ("creator", "creator__username"),
+    ("executor", "executor__username"),
+    ("days_left", "days_left"),
+    ("deadline_bucket", "deadline_bucket"),
+)
+
+
+class TicketRow:
+    """
+    Строка списка заявок; creator и executor - отображаемые имена пользователей.
+    """
+    __slots__ = tuple(name for name, _ in ROW_FIELDS) + ("url", "description_url")
+
+    def __init__(self, url_templates, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+        url_template, description_url_template = url_templates
+        self.url = url_template.format(self.id)
+        self.description_url = description_url_template.format(self.id)
+
+    @property
+    def status_text(self):
+        return models.STATUS_LABELS[self.status]
+
+    @property
+    def priority_text(self):
+        return models.PRIORITY_LABELS[self.priority]
+
+    @property
+    def status_css(self):
+        return models.STATUS_CSS_CLASSES[self.status]
+
+    @property
+    def priority_css(self):
+        return models.PRIORITY_CSS_CLASSES[self.priority]
+
+    @property
+    def deadline_css(self):
+        return models.DEADLINE_CSS_CLASSES.get(self.deadline_bucket, "")
+
+    @property
+    def verbose_deadline_status(self):
+        return models.describe_deadline(self.days_left, self.deadline)
+
+    def get_absolute_url(self):
+        return self.url
+
+
+# число-заглушка, вместо которого в адрес заявки подставляется id
+URL_PLACEHOLDER = 987654321
+
+
+def _url_template(url_name):
+    return reverse(url_name, args=[URL_PLACEHOLDER]).replace(str(URL_PLACEHOLDER), "{}")
+
+
+class TicketRowIterable(ValuesListIterable):
+    """
+    Превращает кортежи values_list() в TicketRow.
+    Адреса заявки вычисляются через reverse() один раз на всю выборку.
+    """
+
+    def __iter__(self):
+        url_templates = (_url_template("ticket-detail"), _url_template("ticket-description"))
+        for values in super().__iter__():
+            yield TicketRow(url_templates, *values)
+
+
+def project_rows(queryset):
+    """
+    Превращает выборку заявок в выборку строк TicketRow.
+    Результат остаётся QuerySet: его можно сортировать, фильтровать и резать.
+    """
+    queryset = queryset.with_deadline_info().values_list(*(field for _, field in ROW_FIELDS))
+    queryset._iterable_class = TicketRowIterable
+    return queryset
@@ -0,0 +1,232 @@
+"""
+Проверка планов запросов списков заявок.
+
+Для каждого списка и набора фильтров (TicketFilter, CreatorTicketFilter,
+ExecutorTicketFilter, SupervisorTicketFilter) с представительными
+значениями строятся запросы, которые выполняет страница: первая страница
+строк в порядке списка и количество строк. По ним выполняется EXPLAIN
+на заполненной базе, и план считается ошибочным, если в нём есть полный
+просмотр tickets_ticket или сортировка: во временном B-дереве (SQLite)
+или узел Sort (PostgreSQL). Неизбежные нарушения перечислены в ALLOWED
+вместе с причиной.
+
+Планы сохраняются в query_plans/<СУБД>.txt рядом с модулем. Файл
+обновляется командой check_query_plans --update и попадает в коммит,
+поэтому изменение индексов или запросов видно в ревью как изменение плана.
+"""
+import os
+import re
+import sqlite3
+from django.db import connection
+from django.http import QueryDict
+from django.test import RequestFactory
+from tickets import benchmark, filters, logic, models, projection, search
+
+# размер базы, на которой снимаются планы: от него зависит статистика
+# планировщика, поэтому тесты и команда используют одни и те же значения
+SEED_TICKETS = 5000
+SEED_DEPARTAMENTS = 10
+SEED_USERS = 200
+PAGE_SIZE = 25
+
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "query_plans")
+
+TICKET_TABLE = models.Ticket._meta.db_table
+# признаки плохого плана: строка плана -> нарушение
+VIOLATIONS = {
+    "sqlite": (
+        (re.compile(rf"^SCAN (TABLE )?{TICKET_TABLE}$"), "полный просмотр таблицы заявок"),
+        (re.compile(r"USE TEMP B-TREE"), "сортировка"),
+    ),
+    "postgresql": (
+        (re.compile(rf"Seq Scan on {TICKET_TABLE}\b"), "полный просмотр таблицы заявок"),
+        (re.compile(r"^(Incremental )?Sort\b"), "сортировка"),
+    ),
+}
+
+# допустимые нарушения: (список, случай, нарушение) -> причина
+ALLOWED = {
+    ("supervision", "search", "сортировка"):
+        "найденные заявки отбираются по таблице поиска и только затем упорядочиваются",
+    ("supervision", "due_within", "сортировка"):
+        "узкий диапазон сроков: заявки отбираются по сроку, сортируется небольшая выборка",
+    ("supervision", "executor", "сортировка"):
+        "сортируются только заявки выбранных исполнителей",
+}
+
+
+def get_filter_inputs(list_name, user):
+    """
+    Представительные значения фильтров списка: случай -> GET-параметры.
+    Значения берутся из заявок списка, чтобы отбор не был пустым.
+    """
+    tickets = logic.get_ticket_list_context(url_name=list_name, current_user=user)["ticket_list"]
+    sample = tickets.exclude(executor=None).order_by("id").values("creator_id", "executor_id", "departament_id")[0]
+    inputs = {
+        "default": {},
+        "priority": {"priority": [models.Ticket.HIGH]},
+        "search": {"search": ["заявка"]},
+    }
+    if list_name in ("inbox", "supervision"):
+        inputs["creator"] = {"creator": [sample["creator_id"]]}
+        inputs["overdue"] = {"overdue": ["true"]}
+        inputs["due_within"] = {"due_within": ["7"]}
+    if list_name == "outbox":
+        inputs["all_statuses"] = {"status": [value for value, _ in models.Ticket.status.field.choices]}
+    if list_name == "supervision":
+        inputs["departament"] = {"departament": [sample["departament_id"]]}
+        inputs["executor"] = {"executor": [sample["executor_id"]]}
+        inputs["closed"] = {"status": [models.Ticket.STATUS_COMPLETE]}
+    return inputs
+
+
+def get_cases():
+    """
+    Случаи проверки: (список, случай, набор фильтров).
+    Базовый TicketFilter проверяется на выборке исходящих.
+    """
+    cases = []
+    for list_name, user in benchmark.get_list_users().items():
+        context = logic.get_ticket_list_context(url_name=list_name, current_user=user)
+        for case, data in get_filter_inputs(list_name, user).items():
+            cases.append((list_name, case, _make_filterset(context["filterset_class"], user, context, data)))
+            if list_name == "outbox" and case in ("default", "priority", "search"):
+                cases.append((
+                    f"{list_name}/TicketFilter", case,
+                    _make_filterset(filters.TicketFilter, user, context, data)
+                ))
+    return cases
+
+
+def _make_filterset(filterset_class, user, context, data):
+    request = RequestFactory().get("/")
+    request.user = user
+    query = QueryDict(mutable=True)
+    for key, values in data.items():
+        query.setlist(key, [str(value) for value in values])
+    filterset = filterset_class(query, request=request, queryset=context["ticket_list"])
+    if not filterset.is_valid():
+        raise ValueError(f"{filterset_class.__name__}: неверные значения фильтров {data}: {filterset.errors}")
+    return filterset
+
+
+def get_queries(filterset):
+    """
+    Запросы страницы списка в том виде, в каком они уходят в БД:
+    первая страница строк и количество. Запросы выполняются,
+    текст и параметры перехватываются обёрткой подключения.
+    """
+    page = projection.project_rows(filterset.qs).order_by(*logic.TICKET_LIST_ORDERING)[:PAGE_SIZE]
+    return {
+        "page": _capture(lambda: list(page)),
+        "count": _capture(filterset.qs.count),
+    }
+
+
+def _capture(function):
+    queries = []
+
+    def wrapper(execute, sql, params, many, context):
+        queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        function()
+    return queries
+
+
+def explain(sql, params):
+    """
+    План запроса в виде строк с отступами по вложенности, без чисел,
+    которые меняются от запуска к запуску.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            depth = {0: -1}
+            lines = []
+            for node_id, parent_id, _, detail in cursor.fetchall():
+                depth[node_id] = depth.get(parent_id, -1) + 1
+                lines.append("  " * depth[node_id] + detail)
+            return lines
+        cursor.execute(f"EXPLAIN (COSTS OFF) {sql}", params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def find_violations(plan):
+    violations = []
+    for line in plan:
+        detail = line.strip().lstrip("-> ").strip()
+        for pattern, violation in VIOLATIONS.get(connection.vendor, ()):
+            if pattern.search(detail) and violation not in violations:
+                violations.append(violation)
+    return violations
+
+
+def check_plans():
+    """
+    Планы всех случаев и найденные в них нарушения.
+    Возвращает пару: {"список: случай (запрос)": план} и список строк
+    с недопустимыми нарушениями.
+    """
+    plans = {}
+    errors = []
+    for list_name, case, filterset in get_cases():
+        for query_name, queries in get_queries(filterset).items():
+            for number, (sql, params) in enumerate(queries, 1):
+                key = f"{list_name}: {case} ({query_name}{'' if len(queries) == 1 else f' {number}'})"
+                plans[key] = explain(sql, params)
+                for violation in find_violations(plans[key]):
+                    if (list_name, case, violation) not in ALLOWED:
+                        errors.append(f"{key}: {violation}")
+    return plans, errors
+
+
+def seed():
+    """
+    Заполняет базу, на которой снимаются планы.
+    """
+    benchmark.seed_tickets(SEED_TICKETS, departaments=SEED_DEPARTAMENTS, users=SEED_USERS)
+    search.rebuild_index()
+
+
+def get_version():
+    if connection.vendor == "sqlite":
+        return f"sqlite {sqlite3.sqlite_version}"
+    if connection.vendor == "postgresql":
+        return f"postgresql {connection.pg_version}"
+    return connection.vendor
+
+
+def format_snapshot(plans):
+    lines = [f"# {get_version()}"]
+    for key, plan in plans.items():
+        lines.append("")
+        lines.append(f"== {key}")
+        lines.extend(plan)
+    return "\n".join(lines) + "\n"
+
+
+def get_snapshot_path():
+    return os.path.join(SNAPSHOT_DIR, f"{connection.vendor}.txt")
+
+
+def read_snapshot():
+    """
+    Сохранённые планы или None, если их нет или они сняты на другой
+    версии СУБД: у другой версии планировщик может выбирать иначе.
+    """
+    try:
+        with open(get_snapshot_path(), encoding="utf-8") as file:
+            snapshot = file.read()
+    except FileNotFoundError:
+        return None
+    if snapshot.splitlines()[0] != f"# {get_version()}":
+        return None
+    return snapshot
+
+
+def write_snapshot(plans):
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    with open(get_snapshot_path(), "w", encoding="utf-8") as file:
+        file.write(format_snapshot(plans))
@@ -0,0 +1,62 @@
+from django.db.models import IntegerField, Value
+from tickets import models
+
+SUPERVISOR = 1
+MEMBER = 2
+
+
+class UserRoles:
+    """
+    Подразделения, которыми руководит пользователь и в которых он работает.
+    """
+
+    def __init__(self, supervised=(), member=()):
+        self.supervised = frozenset(supervised)
+        self.member = frozenset(member)
+
+    @property
+    def is_supervisor(self):
+        return bool(self.supervised)
+
+    def supervises(self, departament_id):
+        return departament_id in self.supervised
+
+
+def load_user_roles(user):
+    """
+    Загружает роли пользователя одним запросом.
+    """
+    if not user.is_authenticated:
+        return UserRoles()
+    supervisors = models.Departament.supervisors.through.objects.filter(
+        user_id=user.id
+    ).annotate(
+        role=Value(SUPERVISOR, output_field=IntegerField())
+    ).values_list("departament_id", "role")
+    employees = models.Departament.employees.through.objects.filter(
+        user_id=user.id
+    ).annotate(
+        role=Value(MEMBER, output_field=IntegerField())
+    ).values_list("departament_id", "role")
+    supervised = set()
+    member = set()
+    for departament_id, role in supervisors.union(employees, all=True):
+        if role == SUPERVISOR:
+            supervised.add(departament_id)
+        else:
+            member.add(departament_id)
+    return UserRoles(supervised, member)
+
+
+def get_user_roles(user):
+    """
+    Роли пользователя, вычисленные один раз за время жизни объекта пользователя.
+
+    Объект request.user живёт ровно один запрос, поэтому внутри запроса
+    все проверки прав обходятся одним запросом к БД.
+    """
+    try:
+        return user._ticket_roles
+    except AttributeError:
+        user._ticket_roles = load_user_roles(user)
+        return user._ticket_roles
@@ -0,0 +1,130 @@
+"""
+Фоновый профилировщик, снимающий стеки рабочих потоков с заданной частотой.
+
+SamplingProfilerMiddleware отмечает, какой поток какой адрес обрабатывает.
+Поток профилировщика SAMPLING_PROFILER_RATE раз в секунду берёт стеки
+отмеченных потоков из sys._current_frames() и считает одинаковые стеки
+по именам адресов. Раз в SAMPLING_PROFILER_FLUSH_INTERVAL секунд накопленные
+счётчики записываются в SAMPLING_PROFILER_DIR/<pid>.collapsed в свёрнутом
+формате: "адрес;функция;...;функция число" - его читают flamegraph.pl,
+speedscope и аналогичные инструменты. Первый элемент стека - имя адреса,
+поэтому график одного адреса получается отбором строк по префиксу.
+
+Поток запускается в каждом рабочем процессе при первом запросе,
+в том числе после fork.
+"""
+import atexit
+from collections import defaultdict
+import os
+import sys
+import threading
+import time
+from django.conf import settings
+
+# адрес, которого ещё нет: запрос до сопоставления с адресом
+UNRESOLVED = "unresolved"
+
+# id потока -> имя адреса запроса, который он обрабатывает
+_active = {}
+# имя адреса -> свёрнутый стек -> число снимков
+_samples = defaultdict(lambda: defaultdict(int))
+_lock = threading.Lock()
+# процесс, в котором запущен поток профилировщика
+_started_pid = None
+# объект кода -> подпись функции в стеке
+_labels = {}
+
+
+def ensure_started():
+    """
+    Запускает поток профилировщика, если в этом процессе он ещё не запущен.
+    """
+    global _started_pid
+    if _started_pid == os.getpid():
+        return
+    with _lock:
+        if _started_pid == os.getpid():
+            return
+        # после fork данные родителя к этому процессу не относятся
+        _active.clear()
+        _samples.clear()
+        thread = threading.Thread(target=_run, name="sampling-profiler", daemon=True)
+        thread.start()
+        _started_pid = os.getpid()
+
+
+def begin(view=UNRESOLVED):
+    _active[threading.get_ident()] = view
+
+
+def end():
+    _active.pop(threading.get_ident(), None)
+
+
+def _label(code, module):
+    label = _labels.get(code)
+    if label is None:
+        label = _labels[code] = f"{module}.{getattr(code, 'co_qualname', code.co_name)}"
+    return label
+
+
+def _collapse(frame):
+    stack = []
+    while frame is not None:
+        stack.append(_label(frame.f_code, frame.f_globals.get("__name__", "?")))
+        frame = frame.f_back
+    stack.reverse()
+    return ";".join(stack)
+
+
+def sample():
+    """
+    Снимает стеки потоков, которые сейчас обрабатывают запросы.
+    """
+    frames = sys._current_frames()
+    for thread_id, view in list(_active.items()):
+        frame = frames.get(thread_id)
+        if frame is not None:
+            stack = _collapse(frame)
+            with _lock:
+                _samples[view][stack] += 1
+
+
+def _run():
+    interval = 1 / settings.SAMPLING_PROFILER_RATE
+    next_flush = time.monotonic() + settings.SAMPLING_PROFILER_FLUSH_INTERVAL
+    while True:
+        time.sleep(interval)
+        sample()
+        if time.monotonic() >= next_flush:
+            flush()
+            next_flush = time.monotonic() + settings.SAMPLING_PROFILER_FLUSH_INTERVAL
+
+
+def get_collapsed():
+    """
+    Строки свёрнутых стеков всех снимков процесса.
+    """
+    with _lock:
+        return [
+            f"{view};{stack} {count}"
+            for view, stacks in sorted(_samples.items())
+            for stack, count in sorted(stacks.items())
+        ]
+
+
+def flush():
+    """
+    Переписывает файл процесса накопленными с его запуска снимками.
+    """
+    if _started_pid != os.getpid():
+        return
+    os.makedirs(settings.SAMPLING_PROFILER_DIR, exist_ok=True)
+    path = os.path.join(settings.SAMPLING_PROFILER_DIR, f"{os.getpid()}.collapsed")
+    with open(path + ".tmp", "w", encoding="utf-8") as file:
+        for line in get_collapsed():
+            file.write(line + "\n")
+    os.replace(path + ".tmp", path)
+
+
+atexit.register(flush)
@@ -0,0 +1,127 @@
+"""
+Полнотекстовый поиск заявок по заголовку и описанию.
+
+PostgreSQL: to_tsvector с русской конфигурацией и GIN-индекс по тому же
+выражению (миграция 0018), результаты упорядочиваются по ts_rank.
+
+SQLite: таблица FTS5 tickets_ticket_search с основами слов заголовка
+и описания (rowid = id заявки). Основы вычисляются в tickets.stemming,
+таблица обновляется при сохранении заявки, результаты упорядочиваются
+по bm25. Миграция 0018 переносит в таблицу имеющиеся заявки; после
+изменения стеммера или загрузки заявок в обход save() таблицу заново
+заполняет команда rebuild_search_index.
+
+На остальных СУБД - поиск подстроки без ранжирования.
+"""
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from tickets import models
+from tickets.stemming import WORD_RE, stem, stem_text
+
+SEARCH_TABLE = "tickets_ticket_search"
+SEARCH_CONFIG = "russian"
+# сколько заявок за раз переносится в таблицу поиска при перестроении
+REBUILD_BATCH_SIZE = 5000
+
+
+def uses_fts():
+    """
+    Ведётся ли отдельная таблица поиска (SQLite).
+    """
+    return connection.vendor == "sqlite"
+
+
+def _ticket_id_column():
+    quote = connection.ops.quote_name
+    return f"{quote(models.Ticket._meta.db_table)}.{quote('id')}"
+
+
+def get_match_query(text):
+    """
+    Запрос FTS5: все основы слов запроса, каждая - как начало слова.
+    Основы берутся в кавычки, поэтому синтаксис FTS5 в запросе не действует.
+    """
+    return " ".join(f'"{stem(word)}"*' for word in WORD_RE.findall(text))
+
+
+def search_tickets(queryset, text):
+    """
+    Отбирает заявки, в заголовке или описании которых есть все слова
+    запроса, и добавляет к ним релевантность search_rank (больше - лучше).
+    """
+    if connection.vendor == "postgresql":
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+        vector = SearchVector("title", "description", config=SEARCH_CONFIG)
+        query = SearchQuery(text, config=SEARCH_CONFIG)
+        return queryset.annotate(
+            search_vector=vector,
+            search_rank=SearchRank(vector, query)
+        ).filter(search_vector=query)
+    if uses_fts():
+        match = get_match_query(text)
+        if not match:
+            return queryset
+        return queryset.filter(
+            id__in=RawSQL(f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s", [match])
+        ).annotate(search_rank=RawSQL(
+            f"SELECT -bm25({SEARCH_TABLE}) FROM {SEARCH_TABLE} "
+            f"WHERE {SEARCH_TABLE} MATCH %s AND rowid = {_ticket_id_column()}",
+            [match],
+            output_field=FloatField()
+        ))
+    condition = Q()
+    for word in WORD_RE.findall(text):
+        condition &= Q(title__icontains=word) | Q(description__icontains=word)
+    return queryset.filter(condition).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def index_tickets(tickets):
+    """
+    Добавляет или заменяет заявки в таблице поиска SQLite.
+    tickets - последовательность (id, title, description).
+    """
+    if not uses_fts():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT OR REPLACE INTO {SEARCH_TABLE} (rowid, title, description) VALUES (%s, %s, %s)",
+            [(ticket_id, stem_text(title), stem_text(description)) for ticket_id, title, description in tickets]
+        )
+
+
+def rebuild_index():
+    """
+    Заново заполняет таблицу поиска SQLite по всем заявкам. Нужна после
+    массовой загрузки заявок в обход save() (bulk_create).
+    """
+    if not uses_fts():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+    tickets = models.Ticket.objects.order_by("id").values_list("id", "title", "description")
+    batch = []
+    for ticket in tickets.iterator(chunk_size=REBUILD_BATCH_SIZE):
+        batch.append(ticket)
+        if len(batch) == REBUILD_BATCH_SIZE:
+            index_tickets(batch)
+            batch = []
+    index_tickets(batch)
+
+
+@receiver(post_save, sender=models.Ticket)
+def update_ticket_index(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {"title", "description"} & set(update_fields):
+        return
+    index_tickets([(instance.id, instance.title, instance.description)])
+
+
+@receiver(post_delete, sender=models.Ticket)
+def delete_ticket_index(sender, instance, **kwargs):
+    if not uses_fts():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [instance.id])
@@ -0,0 +1,151 @@
+"""
+Журнал медленных SQL-запросов.
+
+Каждое новое подключение к БД получает обёртку выполнения запросов
+(connection.execute_wrapper). Запросы дольше SLOW_QUERY_THRESHOLD секунд
+попадают в кольцевой буфер процесса на SLOW_QUERY_LOG_SIZE записей: SQL,
+параметры, время выполнения, имя адреса запроса и функция приложения
+tickets, из которой запрос был выполнен. Буфер не чаще раза в секунду
+записывается в SLOW_QUERY_DIR/<pid>.json, поэтому страница в админке
+и команда dump_slow_queries видят записи всех процессов.
+"""
+import atexit
+from collections import deque
+import json
+import os
+import sys
+import threading
+import time
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils import timezone
+from tickets import metrics
+
+# модули, кадры которых не считаются источником запроса
+SKIP_MODULES = ("tickets.slowlog", "tickets.metrics", "tickets.middleware", "tickets.profiling", "tickets.sampling")
+# сколько кадров приложения сохраняется в записи
+STACK_DEPTH = 5
+# длина, до которой обрезаются параметры и текст запроса
+PARAMS_LENGTH = 500
+SQL_LENGTH = 5000
+FLUSH_INTERVAL = 1
+
+_lock = threading.Lock()
+_entries = deque(maxlen=settings.SLOW_QUERY_LOG_SIZE)
+_last_flush = 0.0
+
+
+def get_app_stack(frame):
+    """
+    Кадры приложения tickets от места выполнения запроса наружу,
+    в виде "модуль.функция:строка" без префикса "tickets.".
+    """
+    stack = []
+    while frame is not None and len(stack) < STACK_DEPTH:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith("tickets.") and module not in SKIP_MODULES:
+            code = frame.f_code
+            name = getattr(code, "co_qualname", code.co_name)
+            stack.append(f"{module[len('tickets.'):]}.{name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return stack
+
+
+def _format_params(params, many):
+    if many:
+        params = list(params)
+        text = f"{len(params)} строк, первая: {params[0]!r}" if params else "0 строк"
+    else:
+        text = repr(params)
+    return text if len(text) <= PARAMS_LENGTH else text[:PARAMS_LENGTH] + "…"
+
+
+def log_slow_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        if duration >= settings.SLOW_QUERY_THRESHOLD:
+            record(sql, params, many, duration, sys._getframe())
+
+
+def record(sql, params, many, duration, frame):
+    measure = metrics.get_current_measure()
+    stack = get_app_stack(frame)
+    entry = {
+        "time": timezone.now().isoformat(),
+        "duration_ms": round(duration * 1000, 3),
+        "sql": sql if len(sql) <= SQL_LENGTH else sql[:SQL_LENGTH] + "…",
+        "params": _format_params(params, many),
+        "view": measure.view if measure else None,
+        "frame": stack[0] if stack else None,
+        "stack": stack,
+        "pid": os.getpid(),
+    }
+    with _lock:
+        _entries.append(entry)
+    if time.monotonic() - _last_flush >= FLUSH_INTERVAL:
+        flush()
+
+
+@receiver(connection_created)
+def install_wrapper(sender, connection, **kwargs):
+    # сигнал приходит при каждом переподключении, обёртка нужна одна
+    if log_slow_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, log_slow_query)
+
+
+def _get_process_path():
+    return os.path.join(settings.SLOW_QUERY_DIR, f"{os.getpid()}.json")
+
+
+def flush():
+    global _last_flush
+    with _lock:
+        if not _entries:
+            return
+        _last_flush = time.monotonic()
+        entries = list(_entries)
+    os.makedirs(settings.SLOW_QUERY_DIR, exist_ok=True)
+    path = _get_process_path()
+    # имя временного файла уникально и для потоков процесса
+    temp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(entries, file, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+atexit.register(flush)
+
+
+def get_entries(limit=None):
+    """
+    Записи всех процессов, сначала новые.
+    """
+    flush()
+    entries = []
+    if os.path.isdir(settings.SLOW_QUERY_DIR):
+        for name in os.listdir(settings.SLOW_QUERY_DIR):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(settings.SLOW_QUERY_DIR, name), encoding="utf-8") as file:
+                    entries.extend(json.load(file))
+            except (OSError, ValueError):
+                continue
+    entries.sort(key=lambda entry: entry["time"], reverse=True)
+    return entries[:limit or settings.SLOW_QUERY_LOG_SIZE]
+
+
+def clear():
+    """
+    Очищает буфер процесса и удаляет файлы всех процессов.
+    """
+    with _lock:
+        _entries.clear()
+    if os.path.isdir(settings.SLOW_QUERY_DIR):
+        for name in os.listdir(settings.SLOW_QUERY_DIR):
+            if name.endswith(".json"):
+                os.remove(os.path.join(settings.SLOW_QUERY_DIR, name))
@@ -0,0 +1,132 @@
+"""
+Стемминг русских слов по алгоритму Snowball
+(https://snowballstem.org/algorithms/russian/stemmer.html).
+
+Нужен полнотекстовому поиску на SQLite: FTS5 не умеет приводить русские
+слова к основе, поэтому текст и запрос приводятся к основам заранее.
+"""
+from functools import lru_cache
+import re
+
+VOWELS = "аеиоуыэюя"
+
+# окончания первой группы допустимы только после "а" или "я"
+PERFECTIVE_GERUND = (("в", "вши", "вшись"), ("ив", "ивши", "ившись", "ыв", "ывши", "ывшись"))
+ADJECTIVE = ((), (
+    "ее", "ие", "ые", "ое", "ими", "ыми", "ей", "ий", "ый", "ой", "ем", "им", "ым", "ом",
+    "его", "ого", "ему", "ому", "их", "ых", "ую", "юю", "ая", "яя", "ою", "ею",
+))
+PARTICIPLE = (("ем", "нн", "вш", "ющ", "щ"), ("ивш", "ывш", "ующ"))
+REFLEXIVE = ((), ("ся", "сь"))
+VERB = (
+    ("ла", "на", "ете", "йте", "ли", "й", "л", "ем", "н", "ло", "но", "ет", "ют", "ны", "ть", "ешь", "нно"),
+    (
+        "ила", "ыла", "ена", "ейте", "уйте", "ите", "или", "ыли", "ей", "уй", "ил", "ыл", "им", "ым",
+        "ен", "ило", "ыло", "ено", "ят", "ует", "уют", "ит", "ыт", "ены", "ить", "ыть", "ишь", "ую", "ю",
+    ),
+)
+NOUN = ((), (
+    "а", "ев", "ов", "ие", "ье", "е", "иями", "ями", "ами", "еи", "ии", "и", "ией", "ей", "ой",
+    "ий", "й", "иям", "ям", "ием", "ем", "ам", "ом", "о", "у", "ах", "иях", "ях", "ы", "ь", "ию",
+    "ью", "ю", "ия", "ья", "я",
+))
+SUPERLATIVE = ((), ("ейш", "ейше"))
+DERIVATIONAL = ((), ("ост", "ость"))
+
+WORD_RE = re.compile(r"\w+")
+
+
+def _sorted_endings(group):
+    after_a, plain = group
+    endings = [(ending, True) for ending in after_a] + [(ending, False) for ending in plain]
+    return sorted(endings, key=lambda item: -len(item[0]))
+
+
+_GROUPS = {
+    name: _sorted_endings(group) for name, group in {
+        "perfective_gerund": PERFECTIVE_GERUND,
+        "adjective": ADJECTIVE,
+        "participle": PARTICIPLE,
+        "reflexive": REFLEXIVE,
+        "verb": VERB,
+        "noun": NOUN,
+        "superlative": SUPERLATIVE,
+        "derivational": DERIVATIONAL,
+    }.items()
+}
+
+
+def _remove_ending(rv, group):
+    """
+    Удаляет самое длинное окончание группы; окончания первой группы
+    удаляются, только если перед ними стоит "а" или "я".
+    Возвращает основу и признак удаления.
+    """
+    for ending, after_a in _GROUPS[group]:
+        if rv.endswith(ending):
+            if after_a and rv[-len(ending) - 1:-len(ending)] not in ("а", "я"):
+                return rv, False
+            return rv[:-len(ending)], True
+    return rv, False
+
+
+def _region_start(word, start=0):
+    """
+    Начало области после первого сочетания "гласная + согласная".
+    """
+    for i in range(start + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            return i + 1
+    return len(word)
+
+
+@lru_cache(maxsize=100000)
+def stem(word):
+    word = word.lower().replace("ё", "е")
+    rv_start = next((i + 1 for i, letter in enumerate(word) if letter in VOWELS), len(word))
+    if rv_start == len(word):
+        # числа, латиница и слова без гласных после первой не изменяются
+        return word
+    r2_start = _region_start(word, _region_start(word))
+    prefix, rv = word[:rv_start], word[rv_start:]
+
+    # шаг 1: деепричастие, иначе возвратная частица и прилагательное,
+    # глагол или существительное
+    rv, removed = _remove_ending(rv, "perfective_gerund")
+    if not removed:
+        rv, _ = _remove_ending(rv, "reflexive")
+        rv, removed = _remove_ending(rv, "adjective")
+        if removed:
+            rv, _ = _remove_ending(rv, "participle")
+        else:
+            rv, removed = _remove_ending(rv, "verb")
+            if not removed:
+                rv, _ = _remove_ending(rv, "noun")
+
+    # шаг 2
+    if rv.endswith("и"):
+        rv = rv[:-1]
+
+    # шаг 3: словообразовательный суффикс, если он целиком в R2
+    r2 = rv[max(r2_start - rv_start, 0):]
+    stripped, removed = _remove_ending(r2, "derivational")
+    if removed:
+        rv = rv[:len(rv) - (len(r2) - len(stripped))]
+
+    # шаг 4
+    if rv.endswith("нн"):
+        rv = rv[:-1]
+    else:
+        rv, removed = _remove_ending(rv, "superlative")
+        if removed and rv.endswith("нн"):
+            rv = rv[:-1]
+        elif rv.endswith("ь"):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+def stem_text(text):
+    """
+    Основы всех слов текста через пробел.
+    """
+    return " ".join(stem(word) for word in WORD_RE.findall(text or ""))
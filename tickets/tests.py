@@ -1,12 +1,32 @@
+from datetime import date, timedelta
+from django.apps import apps as django_apps
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.test import TestCase
-from . import forms, models
+from contextlib import contextmanager
+from io import BytesIO, StringIO
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import Http404
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+import csv
+import importlib
+import json
+import os
+import random
+import tempfile
+import time
+from xml.etree import ElementTree
+import zipfile
+from . import benchmark, counters, dashboard, directory, forms, history, loadtest, logic, metrics, models, profiling, queryplans, sampling, slowlog, projection, search, stemming, views
+from .pagination import KeysetPaginator
+from .roles import get_user_roles
 
 
 class NewTicketTestCase(TestCase):
 
     def setUp(self):
-        self.client = django.test.Client()
+        self.client = Client()
     
     def test_login_required(self):
         response = self.client.get("/new_ticket/")
@@ -14,7 +34,19 @@ class NewTicketTestCase(TestCase):
         self.assertEqual(response.url, "/login/?next=/new_ticket/")
 
     def test_current_user_saved_as_creator(self):
-        self.fail()
+        departament = models.Departament.objects.create(name="Отдел 1")
+        user = User.objects.create_user(username="creator", password="password")
+        other_user = User.objects.create_user(username="other", password="password")
+        self.client.force_login(user)
+        response = self.client.post("/new_ticket/", {
+            "departament": departament.id,
+            "title": "Сломался принтер",
+            "description": "Не печатает",
+            # создатель из данных формы не берётся
+            "creator": other_user.id,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(models.Ticket.objects.get().creator, user)
 
     def test_form_without_title_not_allowed(self):
         form_data = {
@@ -41,3 +73,1145 @@ class NewTicketTestCase(TestCase):
         }
         form = forms.TicketCreateForm(data=form_data)
         self.assertTrue(form.is_valid())
+
+
+class KeysetPaginationTestCase(TestCase):
+
+    def setUp(self):
+        self.departament = models.Departament.objects.create(name="Отдел 1")
+        self.user = User.objects.create_user(username="executor", password="password")
+        today = date.today()
+        deadlines = [None, today, today + timedelta(days=3), None, today - timedelta(days=1)]
+        priorities = [models.Ticket.ORDINARY, models.Ticket.HIGH, models.Ticket.CRITICAL]
+        for i in range(17):
+            models.Ticket.objects.create(
+                departament=self.departament,
+                title=f"Заявка {i}",
+                description="Описание",
+                creator=self.user,
+                executor=self.user,
+                status=models.Ticket.STATUS_IN_WORK,
+                priority=priorities[i % len(priorities)],
+                deadline=deadlines[i % len(deadlines)]
+            )
+
+    def test_pages_follow_full_ordering(self):
+        queryset = models.Ticket.objects.all()
+        expected = list(queryset.order_by(*logic.TICKET_LIST_ORDERING).values_list("id", flat=True))
+        paginator = KeysetPaginator(queryset, logic.TICKET_LIST_ORDERING, per_page=4)
+        collected = []
+        cursor = None
+        while True:
+            page = paginator.get_page(cursor)
+            collected.extend(ticket.id for ticket in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(collected, expected)
+
+    def test_list_view_paginated(self):
+        view = views.TicketList.as_view(paginate_by=10)
+        request = RequestFactory().get("/inbox/")
+        request.user = self.user
+        response = view(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("cursor=", response.content.decode())
+
+    def test_invalid_cursor(self):
+        view = views.TicketList.as_view(paginate_by=10)
+        request = RequestFactory().get("/inbox/", {"cursor": "not-a-cursor"})
+        request.user = self.user
+        with self.assertRaises(Http404):
+            view(request)
+
+    def test_list_view_streamed(self):
+        request = RequestFactory().get("/inbox/all/")
+        request.user = self.user
+        response = views.TicketList.as_view(list_name="inbox", stream=True, stream_chunk_size=4)(request)
+        self.assertTrue(response.streaming)
+        chunks = [chunk.decode() for chunk in response.streaming_content]
+        # шапка, 5 порций строк и окончание страницы
+        self.assertEqual(len(chunks), 7)
+        self.assertIn("filterset_form", chunks[0])
+        self.assertNotIn("<tr data-description-url", chunks[0])
+        streamed = "".join(chunks)
+        self.assertEqual(streamed.count("<tr data-description-url"), 17)
+        plain = views.TicketList.as_view(list_name="inbox")(request).content.decode()
+        self.assertEqual(streamed.split("<tbody>")[0], plain.split("<tbody>")[0])
+        self.assertEqual(streamed.split("</tbody>")[1], plain.split("</tbody>")[1])
+
+    def test_streamed_list_single_query(self):
+        view = views.TicketList.as_view(list_name="inbox", stream=True)
+        request = RequestFactory().get("/inbox/all/")
+        request.user = self.user
+        with CaptureQueriesContext(connection) as queries:
+            b"".join(view(request).streaming_content)
+        self.assertEqual(sum('FROM "tickets_ticket"' in query["sql"] for query in queries), 1)
+        request.user = User.objects.create_user(username="idle", password="password")
+        with CaptureQueriesContext(connection) as queries:
+            response = view(request)
+        self.assertFalse(response.streaming)
+        self.assertIn("Заявок пока нет", response.content.decode())
+        self.assertEqual(sum('FROM "tickets_ticket"' in query["sql"] for query in queries), 1)
+
+
+class TicketListDataTestCase(TestCase):
+
+    def setUp(self):
+        self.departament = models.Departament.objects.create(name="Отдел 1")
+        self.user = User.objects.create_user(username="supervisor", password="password")
+        self.departament.supervisors.add(self.user)
+        for i in range(30):
+            models.Ticket.objects.create(
+                departament=self.departament,
+                title=f"Заявка {i:02}",
+                description="Описание",
+                creator=self.user,
+                priority=models.Ticket.HIGH if i % 2 else models.Ticket.ORDINARY
+            )
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def get_data(self, **params):
+        query = {
+            "draw": 1,
+            "start": 0,
+            "length": 10,
+            "columns[0][name]": "title",
+            "columns[1][name]": "priority",
+        }
+        query.update(params)
+        return self.client.get("/supervision/data/", query).json()
+
+    def test_paging_and_counts(self):
+        data = self.get_data(start=25)
+        self.assertEqual(data["draw"], 1)
+        self.assertEqual(data["recordsTotal"], 30)
+        self.assertEqual(data["recordsFiltered"], 30)
+        self.assertEqual(len(data["data"]), 5)
+
+    def test_pages_by_cursor(self):
+        expected = list(models.Ticket.objects.order_by(*logic.TICKET_LIST_ORDERING).values_list("id", flat=True))
+        collected = []
+        cursor = None
+        for start in range(0, 30, 10):
+            params = {"start": start}
+            if cursor:
+                params["cursor"] = cursor
+            with CaptureQueriesContext(connection) as queries:
+                data = self.get_data(**params)
+            # страница выбирается условием по курсору, а не через OFFSET
+            self.assertFalse(any("OFFSET" in query["sql"] for query in queries))
+            collected.extend(row["DT_RowData"]["descriptionUrl"] for row in data["data"])
+            cursor = data["cursor"]
+        self.assertIsNone(cursor)
+        self.assertEqual(collected, [f"/ticket/{ticket_id}/description" for ticket_id in expected])
+        # без курсора и при сортировке по колонке - через OFFSET
+        self.assertEqual(len(self.get_data(start=25)["data"]), 5)
+        self.assertEqual(len(self.get_data(start=25, cursor="not-a-cursor")["data"]), 5)
+        self.assertIsNone(self.get_data(**{"order[0][column]": 0})["cursor"])
+
+    def test_ordering(self):
+        data = self.get_data(**{"order[0][column]": 0, "order[0][dir]": "desc"})
+        self.assertIn("Заявка 29", data["data"][0]["title"])
+
+    def test_title_search(self):
+        data = self.get_data(**{"search[value]": "Заявка 1"})
+        self.assertEqual(data["recordsFiltered"], 10)
+        self.assertEqual(data["recordsTotal"], 30)
+        # регистр кириллицы не различается
+        self.assertEqual(self.get_data(**{"search[value]": "заявка 1"})["recordsFiltered"], 10)
+        self.assertEqual(self.get_data(**{"search[value]": "ЗАЯВКА 1", "search": "заявка"})["recordsFiltered"], 10)
+
+    def test_filters_applied(self):
+        data = self.get_data(priority=models.Ticket.HIGH)
+        self.assertEqual(data["recordsFiltered"], 15)
+
+    def test_description_loaded_separately(self):
+        row = self.get_data()["data"][0]
+        self.assertNotIn("Описание", str(row))
+        response = self.client.get(row["DT_RowData"]["descriptionUrl"])
+        self.assertEqual(response.json(), {"description": "Описание"})
+        self.assertEqual(self.client.get("/ticket/0/description").status_code, 404)
+        self.assertEqual(Client().get(row["DT_RowData"]["descriptionUrl"]).status_code, 302)
+
+    def test_csv_export(self):
+        response = self.client.get("/supervision/export/csv/", {"priority": models.Ticket.HIGH})
+        self.assertTrue(response.streaming)
+        content = b"".join(response.streaming_content).decode("utf-8-sig")
+        rows = list(csv.reader(StringIO(content), delimiter=";"))
+        self.assertEqual(rows[0][:2], ["Номер", "Заголовок"])
+        self.assertEqual(len(rows), 16)
+        self.assertEqual(rows[1][1], "Заявка 01")
+        self.assertEqual(self.client.get("/supervision/export/pdf/").status_code, 404)
+
+    def test_csv_export_formulas_escaped(self):
+        for title in ("=HYPERLINK(\"http://example.com\")", "+1", "-2", "@SUM(A1)"):
+            models.Ticket.objects.create(
+                departament=self.departament, title=title, description="Описание", creator=self.user
+            )
+        response = self.client.get("/supervision/export/csv/")
+        content = b"".join(response.streaming_content).decode("utf-8-sig")
+        titles = [row[1] for row in csv.reader(StringIO(content), delimiter=";")]
+        for title in ("'=HYPERLINK(\"http://example.com\")", "'+1", "'-2", "'@SUM(A1)", "Заявка 01"):
+            self.assertIn(title, titles)
+
+    def test_xlsx_export(self):
+        response = self.client.get("/supervision/export/xlsx/")
+        archive = zipfile.ZipFile(BytesIO(b"".join(response.streaming_content)))
+        self.assertIsNone(archive.testzip())
+        sheet = archive.read("xl/worksheets/sheet1.xml").decode()
+        self.assertEqual(sheet.count("<row>"), 31)
+        self.assertIn("Заявка 00", sheet)
+
+    def test_xlsx_export_control_characters(self):
+        models.Ticket.objects.create(
+            departament=self.departament,
+            title="Сканер\x00\x0b\x1f\tне\nработает",
+            description="Описание\x02\x1b",
+            creator=self.user
+        )
+        response = self.client.get("/supervision/export/xlsx/")
+        archive = zipfile.ZipFile(BytesIO(b"".join(response.streaming_content)))
+        sheet = ElementTree.fromstring(archive.read("xl/worksheets/sheet1.xml"))
+        texts = [element.text for element in sheet.iter("{http://schemas.openxmlformats.org/spreadsheetml/2006/main}t")]
+        self.assertIn("Сканер\tне\nработает", texts)
+
+
+class QueryBudgetTestCase(TestCase):
+    """
+    Количество запросов при выводе списка не должно зависеть от числа заявок.
+    """
+    ROWS = 1000
+    # бюджет запросов на отдачу данных таблицы и на страницу с полным списком
+    DATA_BUDGET = {"inbox": 5, "outbox": 5, "supervision": 6}
+    PAGE_BUDGET = {"inbox": 2, "outbox": 1, "supervision": 5}
+
+    def setUp(self):
+        self.departament = models.Departament.objects.create(name="Отдел 1")
+        self.user = User.objects.create_user(username="supervisor", password="password")
+        self.departament.supervisors.add(self.user)
+        self.departament.employees.add(self.user)
+        creators = [
+            User.objects.create_user(username=f"creator{i}", password="password")
+            for i in range(5)
+        ] + [self.user]
+        executors = [User.objects.create_user(username=f"executor{i}", password="password") for i in range(5)]
+        executors.append(self.user)
+        models.Ticket.objects.bulk_create([
+            models.Ticket(
+                departament=self.departament,
+                title=f"Заявка {i}",
+                description="Описание",
+                creator=creators[i % len(creators)],
+                executor=executors[i % len(executors)],
+                status=models.Ticket.STATUS_IN_WORK
+            )
+            for i in range(self.ROWS)
+        ])
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    @contextmanager
+    def assertQueryBudget(self, budget):
+        with CaptureQueriesContext(connection) as context:
+            yield
+        self.assertLessEqual(
+            len(context), budget,
+            "Превышен бюджет запросов:\n" + "\n".join(q["sql"] for q in context.captured_queries)
+        )
+
+    def test_data_query_budget(self):
+        for list_name, budget in self.DATA_BUDGET.items():
+            with self.subTest(list_name=list_name), self.assertQueryBudget(budget):
+                response = self.client.get(f"/{list_name}/data/", {"length": 500})
+                self.assertTrue(response.json()["data"])
+
+    def test_page_query_budget(self):
+        view = views.TicketList.as_view()
+        for list_name, budget in self.PAGE_BUDGET.items():
+            request = RequestFactory().get(f"/{list_name}/")
+            request.user = self.user
+            with self.subTest(list_name=list_name), self.assertQueryBudget(budget):
+                response = view(request)
+                self.assertEqual(response.status_code, 200)
+
+
+class UserRolesTestCase(TestCase):
+
+    def setUp(self):
+        self.supervised = models.Departament.objects.create(name="Отдел 1")
+        self.other = models.Departament.objects.create(name="Отдел 2")
+        self.user = User.objects.create_user(username="supervisor", password="password")
+        self.creator = User.objects.create_user(username="creator", password="password")
+        self.supervised.supervisors.add(self.user)
+        self.other.employees.add(self.user)
+        self.ticket = models.Ticket.objects.create(
+            departament=self.supervised,
+            title="Заявка",
+            description="Описание",
+            creator=self.creator
+        )
+
+    def test_roles_loaded_once(self):
+        user = User.objects.get(id=self.user.id)
+        ticket = models.Ticket.objects.get(id=self.ticket.id)
+        with self.assertNumQueries(1):
+            roles = get_user_roles(user)
+            self.assertEqual(roles.supervised, {self.supervised.id})
+            self.assertEqual(roles.member, {self.other.id})
+            self.assertTrue(logic.check_user_is_ticket_supervisor(ticket, user))
+            self.assertTrue(logic.check_user_can_refresh_ticket(ticket, user))
+            self.assertFalse(logic.check_user_is_ticket_creator(ticket, user))
+            self.assertFalse(logic.check_user_is_ticket_executor(ticket, user))
+            logic.get_available_actions_for_ticket(ticket=ticket, current_user=user)
+
+    def test_supervision_link(self):
+        client = Client()
+        client.force_login(self.user)
+        self.assertContains(client.get("/index/"), 'href="/supervision/"')
+        client.force_login(self.creator)
+        self.assertNotContains(client.get("/index/"), 'href="/supervision/"')
+
+
+class DeadlineAnnotationTestCase(TestCase):
+
+    def setUp(self):
+        self.departament = models.Departament.objects.create(name="Отдел 1")
+        self.user = User.objects.create_user(username="supervisor", password="password")
+        self.departament.supervisors.add(self.user)
+        today = date.today()
+        deadlines = [None, today - timedelta(days=3), today, today + timedelta(days=1), today + timedelta(days=5)]
+        statuses = [
+            models.Ticket.STATUS_NEW,
+            models.Ticket.STATUS_IN_WORK,
+            models.Ticket.STATUS_DENIED,
+            models.Ticket.STATUS_COMPLETE,
+        ]
+        for deadline in deadlines:
+            for status in statuses:
+                models.Ticket.objects.create(
+                    departament=self.departament,
+                    title="Заявка",
+                    description="Описание",
+                    creator=self.user,
+                    status=status,
+                    deadline=deadline
+                )
+
+    def test_annotation_matches_properties(self):
+        for ticket in models.Ticket.objects.with_deadline_info():
+            plain = models.Ticket.objects.get(id=ticket.id)
+            self.assertEqual(ticket.days_left, plain.days_left)
+            self.assertEqual(ticket.deadline_bucket, plain.deadline_bucket)
+            self.assertEqual(ticket.deadline_css, plain.deadline_css)
+            self.assertEqual(ticket.verbose_deadline_status, plain.verbose_deadline_status)
+
+    def test_overdue(self):
+        overdue = models.Ticket.objects.overdue()
+        self.assertEqual(overdue.count(), 2)
+        for ticket in overdue.with_deadline_info():
+            self.assertEqual(ticket.deadline_bucket, models.Ticket.DEADLINE_EXPIRED)
+
+    def test_due_within(self):
+        self.assertEqual(models.Ticket.objects.due_within(0).count(), 2)
+        self.assertEqual(models.Ticket.objects.due_within(1).count(), 4)
+
+    def test_supervisor_filters(self):
+        client = Client()
+        client.force_login(self.user)
+        status = [models.Ticket.STATUS_NEW, models.Ticket.STATUS_IN_WORK]
+        data = client.get("/supervision/data/", {"overdue": "true", "status": status}).json()
+        self.assertEqual(data["recordsFiltered"], 2)
+        data = client.get("/supervision/data/", {"due_within": 1, "status": status}).json()
+        self.assertEqual(data["recordsFiltered"], 4)
+
+    def test_rows_match_models(self):
+        rows = {row.id: row for row in projection.project_rows(models.Ticket.objects.all())}
+        self.assertEqual(len(rows), models.Ticket.objects.count())
+        for ticket in models.Ticket.objects.select_related("creator", "executor"):
+            row = rows[ticket.id]
+            self.assertEqual(row.get_absolute_url(), ticket.get_absolute_url())
+            self.assertEqual(row.creator, ticket.creator.username)
+            self.assertEqual(row.executor, None)
+            for name in ("status_text", "priority_text", "status_css", "priority_css",
+                         "deadline_css", "verbose_deadline_status", "days_left"):
+                self.assertEqual(getattr(row, name), getattr(ticket, name), name)
+
+
+class TicketTransitionTestCase(TestCase):
+
+    def setUp(self):
+        self.departament = models.Departament.objects.create(name="Отдел 1")
+        self.supervisor = User.objects.create_user(username="supervisor", password="password")
+        self.other_supervisor = User.objects.create_user(username="other", password="password")
+        self.executor = User.objects.create_user(username="executor", password="password")
+        self.departament.supervisors.add(self.supervisor, self.other_supervisor)
+        self.departament.employees.add(self.executor)
+        self.ticket = models.Ticket.objects.create(
+            departament=self.departament,
+            title="Заявка",
+            description="Описание",
+            creator=self.supervisor
+        )
+
+    def test_only_first_concurrent_action_applied(self):
+        first = models.Ticket.objects.get(id=self.ticket.id)
+        second = models.Ticket.objects.get(id=self.ticket.id)
+        self.assertTrue(logic.deny_ticket(first, self.supervisor))
+        self.assertFalse(logic.delay_ticket(second, self.other_supervisor))
+        self.assertEqual(second.status, models.Ticket.STATUS_NEW)
+        self.assertEqual(models.Ticket.objects.get(id=self.ticket.id).status, models.Ticket.STATUS_DENIED)
+
+    def test_single_update_of_changed_columns(self):
+        get_user_roles(self.supervisor)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(logic.assign_executor_for_ticket(self.ticket, self.supervisor, self.executor))
+        # изменение заявки, запись в журнал и изменение счётчиков
+        # (одним INSERT ... ON CONFLICT, новые счётчики здесь ещё и создаются)
+        sql = [query["sql"] for query in queries if "SAVEPOINT" not in query["sql"]]
+        self.assertTrue(sql[0].startswith('UPDATE "tickets_ticket"'))
+        self.assertNotIn('"title"', sql[0])
+        self.assertIn('"executor_id"', sql[0])
+        self.assertEqual(sum(query.startswith('UPDATE "tickets_ticket"') for query in sql), 1)
+        self.assertEqual(sum(query.startswith('INSERT INTO "tickets_ticketevent"') for query in sql), 1)
+        # executemany попадает в журнал запросов как "1 times: INSERT ..."
+        self.assertEqual(sum('INSERT INTO "tickets_ticketcounter"' in query for query in sql), 1)
+
+    def test_only_first_concurrent_reassignment_applied(self):
+        logic.assign_executor_for_ticket(self.ticket, self.supervisor, self.executor)
+        first = models.Ticket.objects.get(id=self.ticket.id)
+        second = models.Ticket.objects.get(id=self.ticket.id)
+        self.assertTrue(logic.assign_executor_for_ticket(first, self.supervisor, self.other_supervisor))
+        self.assertFalse(logic.assign_executor_for_ticket(second, self.other_supervisor, self.supervisor))
+        self.assertEqual(second.executor_id, self.executor.id)
+        self.assertEqual(models.Ticket.objects.get(id=self.ticket.id).executor, self.other_supervisor)
+
+    def test_replaced_executor_cannot_finish(self):
+        logic.assign_executor_for_ticket(self.ticket, self.supervisor, self.executor)
+        stale = models.Ticket.objects.get(id=self.ticket.id)
+        logic.assign_executor_for_ticket(self.ticket, self.supervisor, self.supervisor)
+        self.assertFalse(logic.set_ticket_done(stale, self.executor))
+
+    def test_view_reports_lost_race(self):
+        logic.deny_ticket(self.ticket, self.supervisor)
+        client = Client()
+        client.force_login(self.other_supervisor)
+        response = client.post(f"/ticket/{self.ticket.id}/delay", follow=True)
+        self.assertRedirects(response, self.ticket.get_absolute_url())
+        self.assertContains(response, "статус заявки уже изменился")
+        self.assertEqual(models.Ticket.objects.get(id=self.ticket.id).status, models.Ticket.STATUS_DENIED)
+
+    def test_bulk_action(self):
+        foreign = models.Departament.objects.create(name="Отдел 2")
+        statuses = [models.Ticket.STATUS_NEW, models.Ticket.STATUS_IN_WORK, models.Ticket.STATUS_COMPLETE]
+        tickets = [
+            models.Ticket.objects.create(
+                departament=departament,
+                title="Заявка",
+                description="Описание",
+                creator=self.supervisor,
+                status=status
+            )
+            for departament in (self.departament, foreign)
+            for status in statuses
+        ]
+        ids = [ticket.id for ticket in tickets] + [0]
+        client = Client()
+        client.force_login(self.supervisor)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post("/supervision/bulk/", {"action": "can_delay", "tickets": ids})
+        data = response.json()
+        self.assertEqual(data["applied"], [tickets[0].id, tickets[1].id])
+        self.assertEqual(data["rejected"], sorted(set(ids) - set(data["applied"])))
+        self.assertEqual(
+            models.Ticket.objects.filter(status=models.Ticket.STATUS_DELAYED).count(), 2
+        )
+        # выборка, изменение и запись в журнал - по одному запросу на всю группу
+        sql = [query["sql"] for query in queries]
+        self.assertEqual(sum('FROM "tickets_ticket"' in query for query in sql), 1)
+        self.assertEqual(sum(query.startswith('UPDATE "tickets_ticket"') for query in sql), 1)
+        self.assertEqual(sum(query.startswith('INSERT INTO "tickets_ticketevent"') for query in sql), 1)
+        self.assertEqual(
+            sorted(history.get_events_since(self.ticket.date_create).values_list("ticket_id", "from_status")),
+            [(tickets[0].id, models.Ticket.STATUS_NEW), (tickets[1].id, models.Ticket.STATUS_IN_WORK)]
+        )
+
+    def test_bulk_assign_requires_employee(self):
+        client = Client()
+        client.force_login(self.supervisor)
+        response = client.post("/supervision/bulk/", {"action": "can_assign_executor", "tickets": self.ticket.id})
+        self.assertEqual(response.status_code, 400)
+        data = client.post("/supervision/bulk/", {
+            "action": "can_assign_executor",
+            "tickets": self.ticket.id,
+            "executor": self.other_supervisor.id
+        }).json()
+        self.assertEqual(data["rejected"], [self.ticket.id])
+        data = client.post("/supervision/bulk/", {
+            "action": "can_assign_executor",
+            "tickets": self.ticket.id,
+            "executor": self.executor.id
+        }).json()
+        self.assertEqual(data["applied"], [self.ticket.id])
+        self.assertEqual(models.Ticket.objects.get(id=self.ticket.id).executor, self.executor)
+
+    def test_history_recorded(self):
+        logic.assign_executor_for_ticket(self.ticket, self.supervisor, self.executor)
+        logic.set_ticket_done(self.ticket, self.executor)
+        self.assertFalse(logic.set_ticket_done(self.ticket, self.executor))
+        events = list(history.get_ticket_history(self.ticket.id).values_list(
+            "actor_id", "from_status", "to_status", "executor_id"
+        ))
+        self.assertEqual(events, [
+            (self.supervisor.id, models.Ticket.STATUS_NEW, models.Ticket.STATUS_IN_WORK, self.executor.id),
+            (self.executor.id, models.Ticket.STATUS_IN_WORK, models.Ticket.STATUS_CONTROL, None),
+        ])
+
+    def test_history_read_only_in_admin(self):
+        admin_user = User.objects.create_superuser(username="admin", password="password")
+        client = Client()
+        client.force_login(admin_user)
+        logic.assign_executor_for_ticket(self.ticket, self.supervisor, self.executor)
+        event = self.ticket.events.get()
+        self.assertEqual(client.get("/admin/tickets/ticketevent/").status_code, 200)
+        self.assertEqual(client.get(f"/admin/tickets/ticketevent/{event.id}/change/").status_code, 200)
+        self.assertEqual(client.get("/admin/tickets/ticketevent/add/").status_code, 403)
+        client.post(f"/admin/tickets/ticketevent/{event.id}/change/", {"to_status": models.Ticket.STATUS_DENIED})
+        client.post(f"/admin/tickets/ticketevent/{event.id}/delete/", {"post": "yes"})
+        event.refresh_from_db()
+        self.assertEqual(event.to_status, models.Ticket.STATUS_IN_WORK)
+
+
+class TicketCountersTestCase(TestCase):
+
+    def setUp(self):
+        self.departament = models.Departament.objects.create(name="Отдел 1")
+        self.supervisor = User.objects.create_user(username="supervisor", password="password")
+        self.executor = User.objects.create_user(username="executor", password="password")
+        self.departament.supervisors.add(self.supervisor)
+        self.departament.employees.add(self.executor)
+        self.client = Client()
+        self.client.force_login(self.supervisor)
+        for i in range(3):
+            self.client.post("/new_ticket/", {
+                "departament": self.departament.id,
+                "title": f"Заявка {i}",
+                "description": "Описание"
+            })
+        self.tickets = list(models.Ticket.objects.order_by("id"))
+
+    def assertCountersConsistent(self):
+        self.assertEqual(counters.get_stored(), counters.compute())
+
+    def test_counters_follow_transitions(self):
+        logic.assign_executor_for_ticket(self.tickets[0], self.supervisor, self.executor)
+        logic.set_ticket_done(self.tickets[0], self.executor)
+        logic.bulk_change_tickets([self.tickets[1].id], self.supervisor, "can_assign_executor", self.executor)
+        logic.bulk_change_tickets([self.tickets[0].id, self.tickets[2].id], self.supervisor, "can_delay")
+        self.assertCountersConsistent()
+        self.assertEqual(
+            counters.get_user_counters(self.executor, get_user_roles(self.executor)),
+            {"inbox": 1, "outbox": 0, "supervision": 0}
+        )
+        self.assertEqual(
+            counters.get_user_counters(self.supervisor, get_user_roles(self.supervisor)),
+            {"inbox": 0, "outbox": 2, "supervision": 3}
+        )
+
+    def test_counters_after_conflicting_reassignment(self):
+        other = User.objects.create_user(username="other", password="password")
+        logic.assign_executor_for_ticket(self.tickets[0], self.supervisor, self.executor)
+        first = models.Ticket.objects.get(id=self.tickets[0].id)
+        second = models.Ticket.objects.get(id=self.tickets[0].id)
+        logic.assign_executor_for_ticket(first, self.supervisor, other)
+        logic.assign_executor_for_ticket(second, self.supervisor, self.supervisor)
+        self.assertCountersConsistent()
+        self.assertEqual(
+            list(history.get_ticket_history(self.tickets[0].id).values_list("executor_id", flat=True)),
+            [None, self.executor.id, other.id]
+        )
+
+    def test_nav_counters_without_ticket_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/index/")
+        self.assertContains(response, '<span class="nav_counter">3</span>', count=2)
+        self.assertFalse(any('FROM "tickets_ticket"' in query["sql"] for query in queries))
+
+    def test_rebuild_command(self):
+        models.Ticket.objects.filter(id=self.tickets[0].id).update(status=models.Ticket.STATUS_COMPLETE)
+        with self.assertRaises(CommandError):
+            call_command("rebuild_ticket_counters", "--check", stdout=StringIO())
+        call_command("rebuild_ticket_counters", stdout=StringIO())
+        self.assertCountersConsistent()
+        call_command("rebuild_ticket_counters", "--check", stdout=StringIO())
+
+    def test_rebuild_many_counters(self):
+        # в SQLite одна вставка не может содержать больше 500 строк
+        benchmark.seed_tickets(2000, departaments=5, users=600)
+        self.assertGreater(len(counters.compute()), 1000)
+        counters.rebuild()
+        self.assertCountersConsistent()
+
+
+class SupervisorDashboardTestCase(TestCase):
+
+    def setUp(self):
+        self.departament = models.Departament.objects.create(name="Отдел 1")
+        self.supervisor = User.objects.create_user(username="supervisor", password="password")
+        self.executor = User.objects.create_user(username="executor", password="password")
+        self.departament.supervisors.add(self.supervisor)
+        today = date.today()
+        tickets = [
+            (self.executor, models.Ticket.STATUS_IN_WORK, models.Ticket.HIGH, today - timedelta(days=1)),
+            (self.executor, models.Ticket.STATUS_IN_WORK, models.Ticket.ORDINARY, None),
+            (self.executor, models.Ticket.STATUS_COMPLETE, models.Ticket.HIGH, today - timedelta(days=1)),
+            (None, models.Ticket.STATUS_NEW, models.Ticket.CRITICAL, today),
+        ]
+        for executor, status, priority, deadline in tickets:
+            models.Ticket.objects.create(
+                departament=self.departament,
+                title="Заявка",
+                description="Описание",
+                creator=self.supervisor,
+                executor=executor,
+                status=status,
+                priority=priority,
+                deadline=deadline
+            )
+
+    def test_dashboard(self):
+        get_user_roles(self.supervisor)
+        with CaptureQueriesContext(connection) as queries:
+            dashboards = dashboard.get_supervisor_dashboard(self.supervisor)
+        self.assertEqual(sum("GROUP BY" in query["sql"] for query in queries), 1)
+        self.assertEqual(len(queries), 3)
+        [result] = dashboards
+        executor, unassigned = result.executors
+        self.assertEqual(executor.name, "executor")
+        self.assertEqual(executor.total, 3)
+        self.assertEqual(executor.statuses[dashboard.STATUSES.index(models.Ticket.STATUS_IN_WORK)], 2)
+        self.assertEqual(executor.priorities[dashboard.PRIORITIES.index(models.Ticket.HIGH)], 1)
+        self.assertEqual(executor.overdue, 1)
+        self.assertEqual(unassigned.name, "Не назначен")
+        self.assertEqual(result.summary.total, 4)
+        self.assertEqual(result.summary.overdue, 1)
+        self.assertEqual(result.summary.oldest_open, models.Ticket.objects.order_by("id")[0].date_create)
+
+    def test_dashboard_view(self):
+        client = Client()
+        client.force_login(self.supervisor)
+        response = client.get("/supervision/dashboard/")
+        self.assertContains(response, "Отдел 1")
+        self.assertContains(response, "Не назначен")
+
+
+class TicketSearchTestCase(TestCase):
+
+    def setUp(self):
+        self.departament = models.Departament.objects.create(name="Отдел 1")
+        self.other_departament = models.Departament.objects.create(name="Отдел 2")
+        self.user = User.objects.create_user(username="supervisor", password="password")
+        self.departament.supervisors.add(self.user)
+        tickets = [
+            (self.departament, "Не печатает принтер", "Принтер в бухгалтерии сломался"),
+            (self.departament, "Замена картриджа", "Нужен новый картридж для принтеров"),
+            (self.departament, "Не работает почта", "Почтовый клиент не запускается"),
+            (self.other_departament, "Принтер", "Чужой принтер"),
+        ]
+        self.tickets = [
+            models.Ticket.objects.create(
+                departament=departament,
+                title=title,
+                description=description,
+                creator=self.user
+            )
+            for departament, title, description in tickets
+        ]
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_stemming(self):
+        self.assertEqual(stemming.stem("принтеров"), stemming.stem("принтер"))
+        self.assertEqual(stemming.stem("сломался"), stemming.stem("сломан"))
+        self.assertEqual(stemming.stem("ответственность"), "ответствен")
+
+    def test_search_ranked(self):
+        found = search.search_tickets(models.Ticket.objects.all(), "принтеры").order_by("-search_rank", "id")
+        found = [ticket.id for ticket in found]
+        # принтер упомянут в заголовке и описании - выше, чем только в описании
+        self.assertEqual(set(found[:2]), {self.tickets[0].id, self.tickets[3].id})
+        self.assertEqual(found[2], self.tickets[1].id)
+        found = search.search_tickets(models.Ticket.objects.all(), "сломанный принтер")
+        self.assertEqual([ticket.id for ticket in found], [self.tickets[0].id])
+
+    def test_index_follows_save(self):
+        ticket = self.tickets[2]
+        ticket.title = "Не работает сканер"
+        ticket.save()
+        self.assertEqual(search.search_tickets(models.Ticket.objects.all(), "сканеры").get(), ticket)
+        ticket.delete()
+        self.assertFalse(search.search_tickets(models.Ticket.objects.all(), "сканер").exists())
+
+    def test_migration_fills_index(self):
+        migration = importlib.import_module("tickets.migrations.0018_ticket_search")
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {search.SEARCH_TABLE}")
+        self.assertFalse(search.search_tickets(models.Ticket.objects.all(), "принтеры").exists())
+        migration.fill_search_table(django_apps, connection)
+        found = search.search_tickets(models.Ticket.objects.all(), "сломанные принтеры")
+        self.assertEqual([ticket.id for ticket in found], [self.tickets[0].id])
+        self.assertEqual(migration._stem_text("Принтеры сломались", {}), stemming.stem_text("Принтеры сломались"))
+
+    def test_search_filter_with_role_filters(self):
+        data = self.client.get("/supervision/data/", {"search": "принтер", "draw": 1}).json()
+        self.assertEqual(data["recordsFiltered"], 2)
+        self.assertIn("Не печатает принтер", data["data"][0]["title"])
+
+    def test_full_list_and_export_ranked(self):
+        # без поиска заявка с высоким приоритетом шла бы первой
+        models.Ticket.objects.filter(id=self.tickets[1].id).update(priority=models.Ticket.HIGH)
+        response = self.client.get("/supervision/export/csv/", {"search": "принтер"})
+        content = b"".join(response.streaming_content).decode("utf-8-sig")
+        rows = list(csv.reader(StringIO(content), delimiter=";"))
+        self.assertEqual([row[0] for row in rows[1:]], [str(self.tickets[0].id), str(self.tickets[1].id)])
+        response = self.client.get("/supervision/all/", {"search": "принтер"})
+        page = b"".join(response.streaming_content).decode()
+        self.assertLess(page.index("Не печатает принтер"), page.index("Замена картриджа"))
+
+
+class TicketImportTestCase(TestCase):
+
+    def setUp(self):
+        self.departament = models.Departament.objects.create(name="Отдел 1")
+        self.creator = User.objects.create_user(username="creator", password="password")
+        self.executor = User.objects.create_user(username="executor", password="password")
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(content)
+        return path
+
+    def run_import(self, path, *args):
+        output = StringIO()
+        call_command("import_tickets", path, *args, stdout=output)
+        return output.getvalue()
+
+    def test_csv_import(self):
+        path = self.write("tickets.csv", (
+            "Подразделение;Заголовок;Описание проблемы;От кого;Исполнитель;Статус;Приоритет;Срок\n"
+            "Отдел 1;Сломался принтер;Не печатает;creator;executor;В работе;Срочный;31.12.2030\n"
+            "Отдел 1;Нет сети;Пропал интернет;creator\n"
+            "Отдел 2;Без отдела;Описание;nobody;;Неизвестный;;вчера\n"
+        ))
+        rejected = os.path.join(self.directory.name, "rejected.jsonl")
+        output = self.run_import(path, "--rejected", rejected)
+        self.assertIn("Загружено заявок: 2, отклонено строк: 1", output)
+        ticket = models.Ticket.objects.get(title="Сломался принтер")
+        self.assertEqual(
+            (ticket.creator, ticket.executor, ticket.status, ticket.priority, ticket.deadline),
+            (self.creator, self.executor, models.Ticket.STATUS_IN_WORK, models.Ticket.URGENT, date(2030, 12, 31))
+        )
+        self.assertIsNotNone(ticket.date_create)
+        ticket = models.Ticket.objects.get(title="Нет сети")
+        self.assertEqual((ticket.status, ticket.priority, ticket.executor), (models.Ticket.STATUS_NEW, models.Ticket.ORDINARY, None))
+        with open(rejected, encoding="utf-8") as file:
+            error = json.loads(file.readline())
+        self.assertEqual(error["line"], 4)
+        self.assertEqual(error["row"]["departament"], "Отдел 2")
+        for message in ("Подразделение", "От кого", "Статус", "Срок"):
+            self.assertIn(message, error["error"])
+        self.assertEqual(counters.get_stored(), counters.compute())
+        self.assertEqual(search.search_tickets(models.Ticket.objects.all(), "принтеры").get().title, "Сломался принтер")
+
+    def test_jsonl_import_in_batches(self):
+        lines = [
+            json.dumps({"departament": "Отдел 1", "title": f"Заявка {i}", "description": "Описание", "creator": "creator", "status": 0})
+            for i in range(5)
+        ]
+        path = self.write("tickets.jsonl", "\n".join(lines + ["[1, 2]", "{"]))
+        output = self.run_import(path, "--batch-size", "2")
+        self.assertIn("Пакет 3:", output)
+        self.assertIn("Загружено заявок: 5, отклонено строк: 2", output)
+        self.assertEqual(models.Ticket.objects.count(), 5)
+
+    def test_dry_run(self):
+        path = self.write("tickets.csv", "departament,title,description,creator\nОтдел 1,Заявка,Описание,creator\n")
+        self.assertIn("Проверено заявок: 1", self.run_import(path, "--dry-run"))
+        self.assertFalse(models.Ticket.objects.exists())
+        with self.assertRaises(CommandError):
+            self.run_import(self.write("tickets.xml", ""))
+
+    def test_old_sqlite_rejected(self):
+        path = self.write("tickets.csv", "departament,title,description,creator\nОтдел 1,Заявка,Описание,creator\n")
+        self.addCleanup(setattr, connection.Database, "sqlite_version_info", connection.Database.sqlite_version_info)
+        connection.Database.sqlite_version_info = (3, 31, 1)
+        with self.assertRaisesMessage(CommandError, "SQLite 3.35"):
+            self.run_import(path)
+        self.assertIn("Проверено заявок: 1", self.run_import(path, "--dry-run"))
+
+
+class BenchmarkTestCase(TestCase):
+
+    def setUp(self):
+        benchmark.seed_tickets(300, departaments=3, users=12, supervisors=2, seed=1, password="password")
+
+    def test_seed(self):
+        self.assertEqual(models.Ticket.objects.count(), 300)
+        for departament in models.Departament.objects.all():
+            self.assertEqual(departament.supervisors.count(), 2)
+            employees = set(departament.employees.values_list("id", flat=True))
+            executors = set(departament.incoming_tickets.exclude(executor=None).values_list("executor_id", flat=True))
+            self.assertLessEqual(executors, employees)
+        self.assertFalse(models.Ticket.objects.filter(status=models.Ticket.STATUS_NEW).exclude(executor=None).exists())
+        self.assertTrue(self.client.login(username="user0", password="password"))
+
+    def test_seed_deterministic(self):
+        tickets = list(models.Ticket.objects.order_by("id").values_list(
+            "departament__name", "creator__username", "executor__username", "status", "priority", "deadline"
+        ))
+        models.Ticket.objects.all().delete()
+        models.Departament.objects.all().delete()
+        User.objects.all().delete()
+        benchmark.seed_tickets(300, departaments=3, users=12, supervisors=2, seed=1)
+        self.assertEqual(list(models.Ticket.objects.order_by("id").values_list(
+            "departament__name", "creator__username", "executor__username", "status", "priority", "deadline"
+        )), tickets)
+
+    def test_suite_report(self):
+        report = benchmark.run_suite(repeat=1, page_size=10)
+        self.assertEqual(set(report["lists"]), {"inbox", "outbox", "supervision"})
+        self.assertEqual(set(report["transitions"]), set(benchmark.TRANSITIONS))
+        self.assertEqual(report["actions"]["supervisor"]["runs"], 1)
+        old = {"lists": {"inbox": {"median_ms": 2.0}}}
+        self.assertEqual(list(benchmark.compare_reports(old, report)), [
+            ("lists/inbox", 2.0, report["lists"]["inbox"]["median_ms"])
+        ])
+
+
+class LoadTestTestCase(TestCase):
+    """
+    Сценарии нагрузочного прогона в одном потоке: в тестовой базе
+    данные не видны другим потокам до конца транзакции теста.
+    """
+
+    def setUp(self):
+        benchmark.seed_tickets(200, departaments=2, users=10)
+        self.plan = loadtest.LoadPlan(users_per_role=3)
+        self.recorder = loadtest.Recorder()
+
+    def get_client(self, role):
+        user = self.plan.users[role][0]
+        return loadtest.VirtualUser(user, self.plan.get_session_key(user), self.recorder)
+
+    def test_scenarios(self):
+        rng = random.Random(0)
+        tickets = models.Ticket.objects.count()
+        for role in loadtest.SCENARIOS:
+            loadtest.SCENARIO_FUNCTIONS[role](self.get_client(role), self.plan, rng)
+        self.assertEqual(models.Ticket.objects.count(), tickets + 1)
+        report = self.recorder.report(elapsed=1.0)
+        self.assertEqual(report["errors"], 0)
+        self.assertEqual(report["urls"]["new_ticket"]["statuses"], {"200": 1, "302": 1})
+        self.assertEqual(report["urls"]["ticket-assign"]["statuses"], {"302": 1})
+        self.assertEqual(set(report["urls"]), {"inbox", "inbox-data", "new_ticket", "ticket-detail", "ticket-assign"})
+
+    def test_new_ticket_detail_for_supervisor(self):
+        ticket = models.Ticket.objects.filter(status=models.Ticket.STATUS_NEW).first()
+        supervisor = ticket.departament.supervisors.first()
+        client = loadtest.VirtualUser(supervisor, self.plan.get_session_key(supervisor), self.recorder)
+        status, content = client.get(f"/ticket/{ticket.id}")
+        self.assertEqual(status, 200)
+        self.assertIn("Исполнитель".encode(), content)
+
+    def test_percentiles_and_mix(self):
+        values = list(range(1, 101))
+        self.assertEqual([loadtest.percentile(values, rank) for rank in (50, 95, 99)], [50, 95, 99])
+        self.assertEqual(loadtest.parse_mix("executor=1,supervisor=3"), {"executor": 1, "supervisor": 3})
+        with self.assertRaises(ValueError):
+            loadtest.parse_mix("guest=1")
+
+
+class MetricsTestCase(TestCase):
+
+    def setUp(self):
+        self.departament = models.Departament.objects.create(name="Отдел 1")
+        self.user = User.objects.create_user(username="supervisor", password="password")
+        self.departament.supervisors.add(self.user)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def get_stats(self, view):
+        return metrics.get_process_stats().get(view, metrics._empty_stats())
+
+    def test_request_measured(self):
+        before = self.get_stats("supervision")
+        self.client.get("/supervision/")
+        after = self.get_stats("supervision")
+        self.assertEqual(after["requests"].get("2xx", 0), before["requests"].get("2xx", 0) + 1)
+        self.assertEqual(sum(after["buckets"]), sum(before["buckets"]) + 1)
+        self.assertGreater(after["queries"], before["queries"])
+        self.assertGreater(after["template_time"], before["template_time"])
+
+    def test_prometheus_output(self):
+        self.client.get("/supervision/")
+        with override_settings(METRICS_TOKEN="secret"):
+            content = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret").content.decode()
+        self.assertIn("# TYPE tickets_request_duration_seconds histogram", content)
+        self.assertIn('tickets_request_duration_seconds_bucket{view="supervision",le="+Inf"}', content)
+        self.assertIn('tickets_db_queries_total{view="supervision"}', content)
+
+    def test_access(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        # адрес клиента не даёт доступа: за прокси все запросы идут с 127.0.0.1
+        self.assertEqual(Client(REMOTE_ADDR="127.0.0.1").get("/metrics").status_code, 403)
+        with override_settings(METRICS_TOKEN="secret"):
+            self.assertEqual(Client().get("/metrics", HTTP_AUTHORIZATION="Bearer secret").status_code, 200)
+            self.assertEqual(Client().get("/metrics", HTTP_AUTHORIZATION="Bearer other").status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.client.get("/metrics").status_code, 200)
+
+    def test_processes_merged(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            other = metrics._empty_stats()
+            other["requests"]["2xx"] = 5
+            other["buckets"][0] = 5
+            with open(os.path.join(directory, "1.json"), "w") as file:
+                json.dump({"metrics-test": other}, file)
+            # файл завершившегося процесса
+            expired = os.path.join(directory, "2-dead.json")
+            with open(expired, "w") as file:
+                json.dump({"metrics-expired": other}, file)
+            old = time.time() - settings.METRICS_MAX_AGE - 1
+            os.utime(expired, (old, old))
+            self.client.get("/supervision/")
+            stats = metrics.collect()
+            self.assertTrue(os.path.exists(metrics._get_process_path()))
+            self.assertTrue(os.path.basename(metrics._get_process_path()).startswith(f"{os.getpid()}-"))
+            self.assertFalse(os.path.exists(expired))
+        self.assertNotIn("metrics-expired", stats)
+        self.assertEqual(stats["metrics-test"]["requests"], {"2xx": 5})
+        self.assertEqual(stats["supervision"], self.get_stats("supervision"))
+
+
+class ProfilingTestCase(TestCase):
+
+    def setUp(self):
+        self.departament = models.Departament.objects.create(name="Отдел 1")
+        self.user = User.objects.create_user(username="supervisor", password="password")
+        self.departament.supervisors.add(self.user)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_profile_saved_for_staff(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(PROFILE_DIR=directory):
+            response = self.client.get("/supervision/", {profiling.PROFILE_PARAMETER: 1})
+            self.assertNotIn("X-Profile", response)
+            self.assertEqual(os.listdir(directory), [])
+            self.user.is_staff = True
+            self.user.save()
+            response = self.client.get("/supervision/", HTTP_X_PROFILE="1")
+            name = response["X-Profile"]
+            self.assertIn("-supervision-", name)
+            self.assertEqual(sorted(os.listdir(directory)), [name + ".prof", name + ".txt"])
+            with open(os.path.join(directory, name + ".txt"), encoding="utf-8") as file:
+                summary = file.read()
+        self.assertIn("Адрес: supervision", summary)
+        self.assertIn("tickets/views.py", summary)
+
+    def test_is_requested(self):
+        factory = RequestFactory()
+        requests = [
+            factory.get("/supervision/", {profiling.PROFILE_PARAMETER: 1}),
+            factory.get("/supervision/", HTTP_X_PROFILE="1"),
+            factory.get("/supervision/", {profiling.PROFILE_PARAMETER: 0}),
+        ]
+        for request in requests:
+            request.user = self.user
+        self.assertEqual([profiling.is_requested(request) for request in requests], [False, False, False])
+        self.user.is_staff = True
+        self.assertEqual([profiling.is_requested(request) for request in requests], [True, True, False])
+
+
+class SamplingProfilerTestCase(TestCase):
+
+    def test_stacks_collapsed_by_view(self):
+        sampling.begin("supervision")
+        try:
+            sampling.sample()
+        finally:
+            sampling.end()
+        lines = [line for line in sampling.get_collapsed() if line.startswith("supervision;")]
+        self.assertTrue(lines)
+        stack, count = lines[0].rsplit(" ", 1)
+        self.assertGreaterEqual(int(count), 1)
+        self.assertTrue(stack.endswith("tickets.sampling.sample"))
+        self.assertIn("tickets.tests.SamplingProfilerTestCase.test_stacks_collapsed_by_view", stack)
+
+
+class SlowQueryLogTestCase(TestCase):
+
+    def setUp(self):
+        self.departament = models.Departament.objects.create(name="Отдел 1")
+        self.user = User.objects.create_user(username="supervisor", password="password", is_staff=True)
+        self.departament.supervisors.add(self.user)
+        self.client = Client()
+        self.client.force_login(self.user)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(SLOW_QUERY_THRESHOLD=0, SLOW_QUERY_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        slowlog.clear()
+        self.addCleanup(slowlog.clear)
+
+    def test_queries_attributed(self):
+        self.client.get("/supervision/")
+        entries = [entry for entry in slowlog.get_entries() if entry["view"] == "supervision"]
+        self.assertTrue(entries)
+        frames = {entry["frame"] for entry in entries}
+        self.assertTrue(any(frame.startswith("views.TicketList.get:") for frame in frames), frames)
+        self.assertTrue(any(frame.startswith("roles.load_user_roles:") for frame in frames), frames)
+        self.assertTrue(all(entry["stack"] for entry in entries))
+
+    def test_admin_page_and_command(self):
+        models.Ticket.objects.count()
+        response = self.client.get("/admin/slow-queries/")
+        self.assertContains(response, "tests.SlowQueryLogTestCase.test_admin_page_and_command")
+        output = StringIO()
+        call_command("dump_slow_queries", "--clear", stdout=output)
+        self.assertIn('FROM "tickets_ticket"', output.getvalue())
+        self.assertEqual(slowlog.get_entries(), [])
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(self.client.get("/admin/slow-queries/").status_code, 302)
+
+
+class QueryPlanTestCase(TestCase):
+    """
+    Планы запросов списков на синтетической базе. При изменении индексов
+    или запросов сохранённые планы обновляются командой check_query_plans --update.
+    """
+
+    def setUp(self):
+        queryplans.seed()
+
+    def test_list_plans(self):
+        plans, errors = queryplans.check_plans()
+        self.assertEqual(errors, [])
+        snapshot = queryplans.read_snapshot()
+        if snapshot is not None:
+            self.assertEqual(
+                queryplans.format_snapshot(plans), snapshot,
+                "Планы изменились; если так и задумано, запустите check_query_plans --update"
+            )
+
+    def test_missing_index_detected(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DROP INDEX ticket_supervision_idx")
+        benchmark.analyze()
+        plans, errors = queryplans.check_plans()
+        self.assertIn("supervision: default (page): сортировка", errors)
+
+
+class UserAutocompleteTestCase(TestCase):
+    """
+    Подсказки при выборе пользователя вместо списков всех пользователей.
+    """
+
+    def setUp(self):
+        directory.invalidate()
+        self.departament = models.Departament.objects.create(name="Отдел 1")
+        self.other_departament = models.Departament.objects.create(name="Отдел 2")
+        self.user = User.objects.create_user(username="supervisor", password="password")
+        self.departament.supervisors.add(self.user)
+        self.ivanov = User.objects.create_user(
+            username="ivanov", first_name="Иван", last_name="Иванов", password="password"
+        )
+        self.ivanova = User.objects.create_user(
+            username="ivanova", first_name="Ольга", last_name="Иванова", password="password"
+        )
+        self.petrov = User.objects.create_user(
+            username="petrov", first_name="Пётр", last_name="Петров", password="password"
+        )
+        self.departament.employees.add(self.ivanov, self.petrov)
+        self.other_departament.employees.add(self.ivanova)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def get_results(self, **params):
+        response = self.client.get("/users/autocomplete/", params)
+        self.assertEqual(response.status_code, 200)
+        return [item["id"] for item in response.json()["results"]]
+
+    def test_prefix_search(self):
+        self.assertEqual(self.get_results(q="иван"), [self.ivanov.id, self.ivanova.id])
+        self.assertEqual(self.get_results(q="Иванова"), [self.ivanova.id])
+        self.assertEqual(self.get_results(q="иванов ол"), [self.ivanova.id])
+        self.assertEqual(self.get_results(q="петр"), [self.petrov.id])
+        self.assertEqual(self.get_results(q="сидоров"), [])
+        self.assertEqual(len(self.get_results(limit=2)), 2)
+
+    def test_departament_scope(self):
+        self.assertEqual(self.get_results(q="иван", departament=self.departament.id), [self.ivanov.id])
+        self.assertEqual(self.get_results(supervised=1), [self.ivanov.id, self.petrov.id])
+        response = self.client.get("/users/autocomplete/", {"departament": "x"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_directory_invalidated(self):
+        self.assertEqual(self.get_results(q="сидоров"), [])
+        self.petrov.last_name = "Сидоров"
+        self.petrov.save()
+        self.assertEqual(self.get_results(q="сидоров"), [self.petrov.id])
+        self.other_departament.employees.add(self.petrov)
+        self.assertEqual(
+            self.get_results(q="сидоров", departament=self.other_departament.id), [self.petrov.id]
+        )
+
+    def test_directory_kept_on_login(self):
+        self.get_results(q="петр")
+        loaded = directory._directory
+        self.assertIsNotNone(loaded)
+        self.assertTrue(Client().login(username="petrov", password="password"))
+        self.petrov.refresh_from_db()
+        self.petrov.email = "petrov@example.com"
+        self.petrov.save()
+        self.assertIs(directory._directory, loaded)
+        self.petrov.userprofile.first_name = "Пётр"
+        self.petrov.userprofile.save()
+        self.assertIsNone(directory._directory)
+
+    def test_pages_do_not_list_users(self):
+        response = self.client.get("/supervision/", {"creator": self.ivanova.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "petrov")
+        self.assertContains(response, "Иванова Ольга (ivanova)")
+        ticket = models.Ticket.objects.create(
+            departament=self.departament, title="Заявка", description="Описание", creator=self.ivanova
+        )
+        response = self.client.get(f"/ticket/{ticket.id}")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "petrov")
+        self.assertContains(response, f'data-departament="{self.departament.id}"')
+
+    def test_assignment_limited_to_employees(self):
+        form = forms.ExecutorAssignmentForm({"executor": self.ivanova.id}, departament=self.departament)
+        self.assertFalse(form.is_valid())
+        form = forms.ExecutorAssignmentForm({"executor": self.ivanov.id}, departament=self.departament)
+        self.assertTrue(form.is_valid())
+
+    def test_assign_view_rejects_other_departament(self):
+        ticket = models.Ticket.objects.create(
+            departament=self.departament, title="Заявка", description="Описание", creator=self.ivanova
+        )
+        self.client.post(f"/ticket/{ticket.id}/assign", {"executor": self.ivanova.id})
+        ticket.refresh_from_db()
+        self.assertIsNone(ticket.executor)
+        self.assertEqual(ticket.status, models.Ticket.STATUS_NEW)
+        self.client.post(f"/ticket/{ticket.id}/assign", {"executor": self.ivanov.id})
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.executor, self.ivanov)
@@ -1,3 +1,4 @@
+from django.contrib import admin
 from django.urls import path
 from django.contrib.auth import views as auth_views
 from . import forms
@@ -7,12 +8,27 @@ urlpatterns = [
     path("", views.index, name="index"),
     path("index/", views.index, name="index"),
     path("login/", auth_views.LoginView.as_view(authentication_form=forms.LoginForm), name="login"),
+    path("metrics", views.metrics_view, name="metrics"),
+    path("admin/slow-queries/", admin.site.admin_view(views.slow_query_log), name="slow-query-log"),
     path("logout/", auth_views.LogoutView.as_view(), name="logout"),
+    path("users/autocomplete/", views.UserAutocomplete.as_view(), name="user-autocomplete"),
     path("new_ticket/", views.CreateTicketView.as_view(), name="new_ticket"),
-    path("inbox/", views.TicketList.as_view(), name="inbox"),
-    path("outbox/", views.TicketList.as_view(), name="outbox"),
-    path("supervision/", views.TicketList.as_view(), name="supervision"),
+    path("inbox/", views.TicketList.as_view(server_side=True), name="inbox"),
+    path("inbox/data/", views.TicketListData.as_view(list_name="inbox"), name="inbox-data"),
+    path("inbox/all/", views.TicketList.as_view(list_name="inbox", stream=True), name="inbox-all"),
+    path("inbox/export/<str:file_format>/", views.TicketListExport.as_view(list_name="inbox"), name="inbox-export"),
+    path("outbox/", views.TicketList.as_view(server_side=True), name="outbox"),
+    path("outbox/data/", views.TicketListData.as_view(list_name="outbox"), name="outbox-data"),
+    path("outbox/all/", views.TicketList.as_view(list_name="outbox", stream=True), name="outbox-all"),
+    path("outbox/export/<str:file_format>/", views.TicketListExport.as_view(list_name="outbox"), name="outbox-export"),
+    path("supervision/", views.TicketList.as_view(server_side=True), name="supervision"),
+    path("supervision/data/", views.TicketListData.as_view(list_name="supervision"), name="supervision-data"),
+    path("supervision/all/", views.TicketList.as_view(list_name="supervision", stream=True), name="supervision-all"),
+    path("supervision/export/<str:file_format>/", views.TicketListExport.as_view(list_name="supervision"), name="supervision-export"),
+    path("supervision/dashboard/", views.SupervisorDashboard.as_view(), name="supervision-dashboard"),
+    path("supervision/bulk/", views.BulkTicketActionView.as_view(), name="supervision-bulk"),
     path("ticket/<int:pk>", views.TicketDetail.as_view(), name="ticket-detail"),
+    path("ticket/<int:pk>/description", views.TicketDescription.as_view(), name="ticket-description"),
     path("ticket/<int:pk>/assign", views.AssignExecutorView.as_view(), name="ticket-assign"),
     path("ticket/<int:pk>/delay", views.DelayTicketView.as_view(), name="ticket-delay"),
     path("ticket/<int:pk>/deny", views.DenyTicketView.as_view(), name="ticket-deny"),
@@ -1,18 +1,51 @@
+from django.contrib import admin, messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import PermissionDenied
-from django.http import HttpResponseRedirect
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.template.loader import get_template, render_to_string
 from django.urls import reverse, resolve
+from django.utils.safestring import mark_safe
 from django.views.generic.edit import CreateView
 from django.views.generic.detail import DetailView
 from django.views import View
-from tickets import forms, logic, models
+from tickets import dashboard, datatables, directory, export, forms, history, logic, metrics, models, projection, slowlog
+from tickets.pagination import InvalidCursor, KeysetPaginator
 
 
 def index(request):
     return render(request, "index.html")
 
 
+def metrics_view(request):
+    """
+    Метрики запросов в текстовом формате Prometheus.
+    Доступны по токену METRICS_TOKEN и сотрудникам с правом входа в админку;
+    адрес клиента не проверяется: за обратным прокси все запросы приходят
+    с его адреса.
+    """
+    if not request.user.is_staff and not metrics.is_authorized(request):
+        raise PermissionDenied
+    return HttpResponse(
+        metrics.render(metrics.collect()),
+        content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+def slow_query_log(request):
+    """
+    Журнал медленных SQL-запросов в админке, сначала новые.
+    Доступ проверяет admin.site.admin_view.
+    """
+    return render(request, "admin/slow_query_log.html", {
+        **admin.site.each_context(request),
+        "title": "Медленные запросы",
+        "entries": slowlog.get_entries(),
+        "threshold_ms": settings.SLOW_QUERY_THRESHOLD * 1000,
+    })
+
+
 class CreateTicketView(LoginRequiredMixin, CreateView):
     template_name_suffix = "_create_form"
     form_class = forms.TicketCreateForm
@@ -24,7 +57,9 @@ class CreateTicketView(LoginRequiredMixin, CreateView):
         """
         new_ticket = form.save(commit=False)
         new_ticket.creator = self.request.user
-        new_ticket.save()
+        with history.collect():
+            new_ticket.save()
+            history.record(new_ticket, self.request.user, None, new_ticket.status)
         return HttpResponseRedirect(self.get_success_url())
 
     def get_success_url(self):
@@ -33,19 +68,195 @@ class CreateTicketView(LoginRequiredMixin, CreateView):
 
 class TicketList(LoginRequiredMixin, View):
     template_name = "tickets/ticket_list.html"
+    # если задано, список выводится постранично по курсору
+    paginate_by = None
+    cursor_kwarg = "cursor"
+    # строки таблицы подгружаются из TicketListData, страница содержит только фильтры
+    server_side = False
+    # страница отдаётся потоком: сначала шапка и фильтры, затем строки порциями
+    stream = False
+    stream_chunk_size = 500
+    rows_template_name = "tickets/ticket_list_rows.html"
+    # место в шаблоне, куда при потоковой отдаче вставляются строки таблицы
+    stream_marker = mark_safe("<!-- ticket rows -->")
+    # тип списка; если не задан, берётся из имени адреса
+    list_name = None
 
     def get(self, request):
-        url_name = resolve(self.request.path_info).url_name
+        url_name = self.list_name or resolve(self.request.path_info).url_name
         context = logic.get_ticket_list_context(url_name=url_name, current_user=request.user)
         filterset_class, column_list, queryset = context.values()
         filterset = filterset_class(self.request.GET, request=self.request, queryset=queryset)
+        # выбираем только выводимые колонки, сроки исполнения считаются в БД
+        ticket_list = projection.project_rows(filterset.qs)
         template_context = {
-            "ticket_list": filterset.qs,
+            "ticket_list": ticket_list,
             "column_list": column_list,
             "filterset": filterset
         }
+        if self.server_side:
+            template_context["ticket_list"] = None
+            template_context["data_url"] = self.get_data_url(url_name)
+            template_context["all_url"] = self.get_all_url(url_name)
+            template_context["export_urls"] = {
+                file_format: self.get_list_url(f"{url_name}-export", file_format) for file_format in export.WRITERS
+            }
+        elif self.stream:
+            response = self.stream_response(ticket_list, template_context)
+            if response is not None:
+                return response
+        elif self.paginate_by:
+            page = self.paginate(ticket_list)
+            template_context["ticket_list"] = page.object_list
+            template_context["page"] = page
+            template_context["next_page_url"] = self.get_page_url(page.next_cursor)
+            template_context["first_page_url"] = self.get_page_url(None)
         return render(request, self.template_name, template_context)
 
+    def paginate(self, queryset):
+        paginator = KeysetPaginator(queryset, logic.TICKET_LIST_ORDERING, self.paginate_by)
+        try:
+            return paginator.get_page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor:
+            raise Http404("Неверный курсор страницы")
+
+    def get_page_url(self, cursor):
+        """
+        Ссылка на страницу с тем же набором фильтров, но другим курсором.
+        """
+        params = self.request.GET.copy()
+        params.pop(self.cursor_kwarg, None)
+        if cursor:
+            params[self.cursor_kwarg] = cursor
+        query = params.urlencode()
+        return f"{self.request.path}?{query}" if query else self.request.path
+
+    def get_data_url(self, url_name):
+        """
+        Адрес источника данных для таблицы с теми же фильтрами, что у страницы.
+        """
+        return self.get_list_url(f"{url_name}-data")
+
+    def get_all_url(self, url_name):
+        """
+        Адрес полного списка с теми же фильтрами, что у страницы.
+        """
+        return self.get_list_url(f"{url_name}-all")
+
+    def get_list_url(self, url_name, *args):
+        query = self.request.GET.urlencode()
+        url = reverse(url_name, args=args)
+        return f"{url}?{query}" if query else url
+
+    def stream_response(self, ticket_list, template_context):
+        """
+        Отдаёт страницу списка потоком.
+
+        Шапка страницы с формой фильтров уходит сразу, строки таблицы читаются
+        из БД через iterator() и выводятся порциями по stream_chunk_size,
+        поэтому время до первого байта и расход памяти не зависят от длины списка.
+        Если строк нет, возвращает None, а в контексте оставляет пустой список:
+        такая страница выводится обычным образом, без лишнего запроса.
+        """
+        ordering = logic.get_list_ordering(ticket_list)
+        rows = ticket_list.order_by(*ordering).iterator(chunk_size=self.stream_chunk_size)
+        # первая строка читается до отдачи шапки тем же запросом, что и остальные
+        first_row = next(rows, None)
+        if first_row is None:
+            template_context["ticket_list"] = []
+            return None
+        template_context["ticket_list"] = None
+        template_context["stream_marker"] = self.stream_marker
+        page = render_to_string(self.template_name, template_context, self.request)
+        head, tail = page.split(self.stream_marker, 1)
+        rows_template = get_template(self.rows_template_name)
+        column_list = template_context["column_list"]
+
+        def render_page():
+            yield head
+            chunk = [first_row]
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) == self.stream_chunk_size:
+                    yield rows_template.render({"ticket_list": chunk, "column_list": column_list})
+                    chunk = []
+            if chunk:
+                yield rows_template.render({"ticket_list": chunk, "column_list": column_list})
+            yield tail
+
+        return StreamingHttpResponse(render_page())
+
+
+class TicketListData(LoginRequiredMixin, View):
+    """
+    Источник данных для таблицы заявок в режиме серверной обработки DataTables.
+    Фильтры берутся из тех же GET-параметров, что и у страницы списка.
+    """
+    list_name = None
+
+    def get(self, request):
+        context = logic.get_ticket_list_context(url_name=self.list_name, current_user=request.user)
+        filterset_class, column_list, queryset = context.values()
+        filterset = filterset_class(request.GET, request=request, queryset=queryset)
+        data = datatables.get_response_data(request.GET, queryset, filterset.qs)
+        return JsonResponse(data)
+
+
+class UserAutocomplete(LoginRequiredMixin, View):
+    """
+    Подсказки для полей выбора пользователя: пользователи, фамилия, имя
+    или логин которых начинаются со слов запроса q. Параметр departament
+    ограничивает подсказки сотрудниками подразделения, supervised=1 -
+    сотрудниками подразделений текущего руководителя, limit - их число.
+    Ответ строится по справочнику в памяти, без запросов к БД.
+    """
+
+    def get(self, request):
+        try:
+            limit = min(max(int(request.GET.get("limit", directory.DEFAULT_LIMIT)), 1), directory.MAX_LIMIT)
+            departament_ids = {int(request.GET["departament"])} if request.GET.get("departament") else None
+        except ValueError:
+            return JsonResponse({"error": "Неверные параметры запроса"}, status=400)
+        if request.GET.get("supervised") == "1":
+            supervised = request.user_roles.supervised
+            departament_ids = supervised if departament_ids is None else departament_ids & supervised
+        results = directory.get_directory().search(request.GET.get("q", ""), departament_ids, limit)
+        return JsonResponse({"results": [{"id": user_id, "text": label} for user_id, label in results]})
+
+
+class TicketListExport(LoginRequiredMixin, View):
+    """
+    Выгрузка списка заявок в файл CSV или XLSX.
+    Фильтры берутся из тех же GET-параметров, что и у страницы списка;
+    файл отдаётся потоком, строки читаются из БД порциями.
+    """
+    list_name = None
+
+    def get(self, request, file_format):
+        if file_format not in export.WRITERS:
+            raise Http404("Неизвестный формат выгрузки")
+        context = logic.get_ticket_list_context(url_name=self.list_name, current_user=request.user)
+        filterset_class, column_list, queryset = context.values()
+        filterset = filterset_class(request.GET, request=request, queryset=queryset)
+        rows = projection.project_rows(filterset.qs).order_by(*logic.get_list_ordering(filterset.qs))
+        response = StreamingHttpResponse(export.WRITERS[file_format](rows), content_type=export.CONTENT_TYPES[file_format])
+        response["Content-Disposition"] = f'attachment; filename="{self.list_name}.{file_format}"'
+        return response
+
+
+class SupervisorDashboard(LoginRequiredMixin, View):
+    """
+    Сводка по нагрузке подразделений, которыми руководит пользователь.
+    """
+    template_name = "tickets/supervisor_dashboard.html"
+
+    def get(self, request):
+        return render(request, self.template_name, {
+            "dashboards": dashboard.get_supervisor_dashboard(request.user),
+            "status_titles": dashboard.STATUS_TITLES,
+            "priority_titles": dashboard.PRIORITY_TITLES,
+        })
+
 
 class TicketDetail(LoginRequiredMixin, DetailView):
     model = models.Ticket
@@ -60,12 +271,47 @@ class TicketDetail(LoginRequiredMixin, DetailView):
         return context
 
 
+class TicketDescription(LoginRequiredMixin, View):
+    """
+    Описание заявки для раскрываемой строки списка.
+    Доступно тем же пользователям, что и страница заявки.
+    """
+
+    def get(self, request, pk):
+        try:
+            description = models.Ticket.objects.values_list("description", flat=True).get(id=pk)
+        except models.Ticket.DoesNotExist:
+            raise Http404("Заявка не найдена")
+        return JsonResponse({"description": description})
+
+
+class BulkTicketActionView(LoginRequiredMixin, View):
+    """
+    Действие руководителя над группой заявок.
+    В ответе - id заявок, к которым действие применено и которые отклонены.
+    """
+
+    def post(self, request):
+        form = forms.BulkTicketActionForm(request.POST)
+        if not form.is_valid():
+            return JsonResponse({"errors": form.errors}, status=400)
+        applied, rejected = logic.bulk_change_tickets(
+            form.cleaned_data["tickets"],
+            request.user,
+            form.cleaned_data["action"],
+            executor=form.cleaned_data["executor"]
+        )
+        return JsonResponse({"applied": applied, "rejected": rejected})
+
+
 class TicketChangeView(LoginRequiredMixin, View):
+    # поля, нужные для проверки прав; статус - ожидаемое значение для изменения
+    permission_fields = ("id", "departament_id", "creator_id", "executor_id", "status")
 
     def get_changed_ticket(self):
         ticket_id = self.kwargs["pk"]
         try:
-            return models.Ticket.objects.get(id=ticket_id)
+            return models.Ticket.objects.only(*self.permission_fields).get(id=ticket_id)
         except models.Ticket.DoesNotExist:
             raise RuntimeError(f"Попытка изменить несуществующую заявку, id={ticket_id}")
 
@@ -76,6 +322,10 @@ class TicketChangeView(LoginRequiredMixin, View):
         return reverse("index")
 
     def apply_changes(self):
+        """
+        Применяет действие; возвращает False, если заявку уже перевели
+        в статус, из которого действие невозможно.
+        """
         raise NotImplementedError("Действие не определено")
 
     def check_action_available(self):
@@ -85,7 +335,9 @@ class TicketChangeView(LoginRequiredMixin, View):
         self.ticket = self.get_changed_ticket()
         self.check_permission()
         self.check_action_available()
-        self.apply_changes()
+        if not self.apply_changes():
+            messages.warning(request, "Действие не выполнено - статус заявки уже изменился")
+            return HttpResponseRedirect(self.ticket.get_absolute_url())
         redirect_url = self.calculate_redirect_url()
         return HttpResponseRedirect(redirect_url)
 
@@ -93,7 +345,7 @@ class TicketChangeView(LoginRequiredMixin, View):
 class RefreshTicketView(TicketChangeView):
 
     def check_permission(self):
-        if not logic.check_user_can_refresh_ticket:
+        if not logic.check_user_can_refresh_ticket(self.ticket, self.request.user):
             raise PermissionDenied("Действие невозможно - вы должны либо быть создателем заявки, либо иметь права на управление")
 
     def calculate_redirect_url(self):
@@ -106,7 +358,7 @@ class RefreshTicketView(TicketChangeView):
             return reverse("outbox")
 
     def apply_changes(self):
-        logic.refresh_ticket(self.ticket)
+        return logic.refresh_ticket(self.ticket, self.request.user)
 
 
 class CancelTicketView(TicketChangeView):
@@ -116,7 +368,7 @@ class CancelTicketView(TicketChangeView):
             raise PermissionDenied("Действие невозможно - вы не являетесь создателем заявки")
 
     def apply_changes(self):
-        logic.cancel_ticket(self.ticket)
+        return logic.cancel_ticket(self.ticket, self.request.user)
 
     def calculate_redirect_url(self):
         return reverse("outbox")
@@ -129,7 +381,7 @@ class SetTicketDoneView(TicketChangeView):
             raise PermissionDenied("Действие невозможно - вы не назначены исполнителем заявки")
 
     def apply_changes(self):
-        logic.set_ticket_done(self.ticket)
+        return logic.set_ticket_done(self.ticket, self.request.user)
 
     def calculate_redirect_url(self):
         return reverse("inbox")
@@ -148,25 +400,27 @@ class TicketChangeViewSupervisor(TicketChangeView):
 class DenyTicketView(TicketChangeViewSupervisor):
 
     def apply_changes(self):
-        logic.deny_ticket(self.ticket)
+        return logic.deny_ticket(self.ticket, self.request.user)
 
 
 class DelayTicketView(TicketChangeViewSupervisor):
 
     def apply_changes(self):
-        logic.delay_ticket(self.ticket)
+        return logic.delay_ticket(self.ticket, self.request.user)
 
 
 class CompleteTicketView(TicketChangeViewSupervisor):
 
     def apply_changes(self):
-        logic.complete_ticket(self.ticket)
+        return logic.complete_ticket(self.ticket, self.request.user)
 
 
 class AssignExecutorView(TicketChangeViewSupervisor):
 
     def apply_changes(self):
-        form = forms.ExecutorAssignmentForm(self.request.POST)
-        if form.is_valid():
-            executor = form.cleaned_data["executor"]
-            logic.assign_executor_for_ticket(self.ticket, executor)
+        form = forms.ExecutorAssignmentForm(self.request.POST, departament=self.ticket.departament)
+        if not form.is_valid():
+            # некорректную форму, как и раньше, просто игнорируем
+            return True
+        executor = form.cleaned_data["executor"]
+        return logic.assign_executor_for_ticket(self.ticket, self.request.user, executor)